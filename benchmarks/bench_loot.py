@@ -0,0 +1,91 @@
+"""Micro-benchmark de generate_loot sur un catalogue synthétique.
+
+Compare l'ancienne implémentation (listes de poids reconstruites et scan
+complet de items_db à chaque tirage) au moteur indexé par rareté.
+
+Utilisation : python benchmarks/bench_loot.py [nb_items] [nb_ouvertures]
+"""
+import os
+import random
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import ROOT, prepare_workdir  # noqa: E402
+
+
+def generate_loot_naive(herobot, items_db, chest):
+    """Implémentation d'origine, conservée ici comme référence"""
+    ItemRarity = herobot.ItemRarity
+    loot = herobot.LootResult()
+    for _ in range(chest.loot_amount):
+        rarities = list(chest.rarity_distribution.keys())
+        weights = list(chest.rarity_distribution.values())
+        selected_rarity = random.choices(rarities, weights=weights, k=1)[0]
+        try:
+            rarity_enum = ItemRarity[selected_rarity.upper()]
+            available_items = [item for item in items_db.values() if item.rarity == rarity_enum]
+            if available_items:
+                loot.items.append(random.choice(available_items).id)
+        except KeyError:
+            continue
+    loot.gold = random.randint(50, 200)
+    return loot
+
+
+def synthetic_items(count):
+    # Import tardif : le bot doit déjà avoir été importé depuis un répertoire de travail jetable
+    from bot import Item, ItemRarity
+
+    rarities = list(ItemRarity)
+    return {
+        i: Item(
+            id=i,
+            name=f"Item {i}",
+            rarity=rarities[i % len(rarities)],
+            compatible_classes=[],
+            price=10,
+            image="",
+            stats={"attaque": i % 50},
+        )
+        for i in range(1, count + 1)
+    }
+
+
+def timed(func, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        func()
+    return (time.perf_counter() - start) / runs * 1e6  # µs par ouverture
+
+
+def main():
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    openings = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+
+    # Le bot réécrit items_du_jour.json à son import : il travaille sur une copie des données
+    workdir = prepare_workdir()
+    try:
+        import bot as herobot
+
+        bot = herobot.bot
+        bot.install_catalog(herobot.Catalog(bot.catalog.heroes, synthetic_items(item_count), bot.catalog.chests))
+        chest = bot.chests_db["Coffre Epique"]
+
+        naive_us = timed(lambda: generate_loot_naive(herobot, bot.items_db, chest), openings)
+        indexed_us = timed(lambda: bot.generate_loot(chest), openings)
+        bot.storage.close()
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Catalogue: {item_count} items — {chest.name} ({chest.loot_amount} tirages) x {openings}")
+    print(f"  ancien  : {naive_us:10.1f} µs / ouverture")
+    print(f"  indexé  : {indexed_us:10.1f} µs / ouverture")
+    print(f"  gain    : x{naive_us / indexed_us:.0f}")
+
+
+if __name__ == "__main__":
+    main()
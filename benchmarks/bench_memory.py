@@ -0,0 +1,124 @@
+"""Mémoire occupée par les profils joueurs, sur des joueurs synthétiques.
+
+Compare l'ancienne représentation (dataclasses sans slots, listes avec
+une entrée par exemplaire d'item ou de coffre) à la représentation
+compacte (slots, items en ItemBag sur array('I'), coffres en Counter de
+noms internés), et mesure le test de possession utilisé par buy/equip.
+
+Utilisation : python benchmarks/bench_memory.py [nb_joueurs ...]
+"""
+import atexit
+import os
+import random
+import shutil
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import ROOT, prepare_workdir  # noqa: E402
+
+# Le bot réécrit items_du_jour.json à son import : il est importé depuis une copie jetable des données
+WORKDIR = prepare_workdir()
+atexit.register(shutil.rmtree, WORKDIR, True)
+atexit.register(os.chdir, ROOT)
+
+from bot import HeroInstance, HeroLevel, PlayerData  # noqa: E402
+
+CHEST_NAMES = ["Coffre Commun", "Coffre Rare", "Coffre Epique", "Coffre Journalier"]
+
+
+@dataclass
+class LegacyHeroInstance:
+    """Représentation d'origine, conservée ici comme référence"""
+    hero_id: int
+    level: HeroLevel = field(default_factory=HeroLevel)
+    loadout: List[Optional[int]] = field(default_factory=list)
+    _puissance: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+
+
+@dataclass
+class LegacyPlayerData:
+    user_id: int
+    gold: int = 1000
+    emblems: int = 0
+    heroes: Dict[int, LegacyHeroInstance] = None
+    items: List[int] = None
+    chests: List[str] = None
+    last_daily_claim: Optional[str] = None
+
+
+ITEM_CATALOG = range(1, 61)
+
+
+def synthetic_inventory(rng):
+    """Même contenu pour les deux représentations : 3 héros, 10 à 150 items de loot, 2 à 10 coffres"""
+    heroes = rng.sample(range(1, 40), 3)
+    # Le loot retombe souvent sur les mêmes items d'un catalogue de quelques dizaines
+    items = rng.choices(ITEM_CATALOG, k=rng.randint(10, 150))
+    # Noms reconstruits comme à la lecture d'un fichier JSON : une chaîne par exemplaire
+    chests = ["".join(rng.choice(CHEST_NAMES)) for _ in range(rng.randint(2, 10))]
+    return heroes, items, chests
+
+
+def build_legacy(user_id, heroes, items, chests):
+    return LegacyPlayerData(
+        user_id,
+        heroes={hero_id: LegacyHeroInstance(hero_id, loadout=[None] * 6) for hero_id in heroes},
+        items=list(items),
+        chests=list(chests),
+        last_daily_claim="2024-01-01T00:00:00+00:00",
+    )
+
+
+def build_compact(user_id, heroes, items, chests):
+    return PlayerData(
+        user_id,
+        heroes={hero_id: HeroInstance(hero_id, loadout=[None] * 6) for hero_id in heroes},
+        items=items,
+        chests=chests,
+        last_daily_claim="2024-01-01T00:00:00+00:00",
+    )
+
+
+def measure(builder, count):
+    """Octets alloués par joueur (tracemalloc) et temps de construction"""
+    rng = random.Random(42)
+    tracemalloc.start()
+    start = time.perf_counter()
+    players = [builder(user_id, *synthetic_inventory(rng)) for user_id in range(count)]
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return players, current / count, elapsed
+
+
+def ownership_us(players, runs=200_000):
+    """Coût moyen d'un test « item_id in player.items » (µs)"""
+    rng = random.Random(7)
+    sample = [(rng.choice(players), rng.randint(1, 200)) for _ in range(runs)]
+    start = time.perf_counter()
+    for player, item_id in sample:
+        item_id in player.items
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]
+    for count in counts:
+        print(f"{count} joueurs synthétiques")
+        for label, builder in (("ancien ", build_legacy), ("compact", build_compact)):
+            players, per_player, elapsed = measure(builder, count)
+            total_mb = per_player * count / 1e6
+            print(
+                f"  {label} : {per_player:8.0f} octets / joueur ({total_mb:8.1f} Mo), "
+                f"construit en {elapsed:5.1f} s, possession {ownership_us(players):.3f} µs"
+            )
+            del players
+
+
+if __name__ == "__main__":
+    main()
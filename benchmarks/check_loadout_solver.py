@@ -0,0 +1,136 @@
+"""Vérifie LoadoutSolver contre une recherche exhaustive sur de petits cas aléatoires.
+
+Chaque cas tire quelques héros de classes variées et un petit stock d'items
+(typés ou sans type, compatibles avec des classes au hasard). La recherche
+exhaustive essaie toutes les affectations emplacement par emplacement ; le
+solveur doit atteindre la même puissance totale, sans dépasser le stock ni
+poser un item sur un emplacement ou un héros qui ne l'accepte pas. Les cas
+sont aussi résolus avec des loadouts actuels au hasard, pour vérifier que la
+préférence pour les items déjà portés ne coûte pas de puissance.
+
+Utilisation : python benchmarks/check_loadout_solver.py [nb_cas] [graine]
+"""
+import atexit
+import os
+import random
+import shutil
+import sys
+from functools import lru_cache
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import ROOT, prepare_workdir  # noqa: E402
+
+# Le bot réécrit items_du_jour.json à son import : il est importé depuis une copie jetable des données
+WORKDIR = prepare_workdir()
+atexit.register(shutil.rmtree, WORKDIR, True)
+atexit.register(os.chdir, ROOT)
+
+from bot import EQUIPMENT_SLOTS_BY_CLASS, Hero, HeroClass, HeroRarity, Item, ItemRarity, LoadoutSolver  # noqa: E402
+
+SLOT_TYPES = sorted({slot for slots in EQUIPMENT_SLOTS_BY_CLASS.values() for slot in slots})
+
+
+def random_case(rng):
+    """Un à deux héros, jusqu'à sept items distincts en un à trois exemplaires"""
+    classes = list(HeroClass)
+    heroes = [
+        Hero(index + 1, f"Héros {index + 1}", rng.choice(list(HeroRarity)), rng.choice(classes), "", 0)
+        for index in range(rng.randint(1, 2))
+    ]
+    hero_slots = sorted({slot for hero in heroes for slot in EQUIPMENT_SLOTS_BY_CLASS[hero.hero_class]})
+    items_db = {}
+    for item_id in range(1, rng.randint(2, 7) + 1):
+        # Surtout des emplacements que les héros possèdent, pour que les items se disputent les places
+        slot = rng.choice(hero_slots + hero_slots + SLOT_TYPES + [""])
+        compatible = rng.sample(classes, rng.randint(1, 3))
+        if rng.random() < 0.7:
+            compatible.append(rng.choice(heroes).hero_class)
+        items_db[item_id] = Item(item_id, f"Item {item_id}", rng.choice(list(ItemRarity)),
+                                 compatible, 0, "", {}, slot=slot)
+    stock = {item_id: rng.randint(1, 3) for item_id in items_db}
+    return heroes, items_db, stock
+
+
+def fits(item, hero, slot):
+    return hero.hero_class in item.compatible_classes and item.slot in ("", slot)
+
+
+def exhaustive_power(heroes, items_db, stock):
+    """Meilleure puissance d'items posable, en essayant chaque item (ou rien) sur chaque emplacement"""
+    slots = [(hero, slot) for hero in heroes for slot in EQUIPMENT_SLOTS_BY_CLASS[hero.hero_class]]
+    item_ids = sorted(stock)
+
+    @lru_cache(maxsize=None)
+    def best(index, remaining):
+        if index == len(slots):
+            return 0
+        hero, slot = slots[index]
+        result = best(index + 1, remaining)
+        for position, item_id in enumerate(item_ids):
+            item = items_db[item_id]
+            if remaining[position] and fits(item, hero, slot):
+                left = remaining[:position] + (remaining[position] - 1,) + remaining[position + 1:]
+                result = max(result, item.get_puissance() + best(index + 1, left))
+        return result
+
+    return best(0, tuple(stock[item_id] for item_id in item_ids))
+
+
+def check_solution(heroes, items_db, stock, loadouts):
+    """Puissance des loadouts renvoyés, ou message d'erreur s'ils ne sont pas valides"""
+    used = {}
+    power = 0
+    for hero in heroes:
+        slots = EQUIPMENT_SLOTS_BY_CLASS[hero.hero_class]
+        loadout = loadouts.get(hero.id)
+        if loadout is None or len(loadout) != len(slots):
+            return None, f"loadout manquant ou de mauvaise taille pour le héros {hero.id}"
+        for slot, item_id in zip(slots, loadout):
+            if item_id is None:
+                continue
+            item = items_db[item_id]
+            if not fits(item, hero, slot):
+                return None, f"item {item_id} ({item.slot or 'sans type'}) posé sur {slot} du héros {hero.id}"
+            used[item_id] = used.get(item_id, 0) + 1
+            power += item.get_puissance()
+    for item_id, count in used.items():
+        if count > stock.get(item_id, 0):
+            return None, f"item {item_id} porté {count} fois pour {stock.get(item_id, 0)} exemplaire(s)"
+    return power, None
+
+
+def random_current(rng, heroes, items_db):
+    """Loadouts actuels quelconques (pas forcément valides), comme après un changement de catalogue"""
+    item_ids = list(items_db) + [None]
+    return {
+        hero.id: [rng.choice(item_ids) for _ in EQUIPMENT_SLOTS_BY_CLASS[hero.hero_class]]
+        for hero in heroes
+    }
+
+
+def main():
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    rng = random.Random(seed)
+    failures = 0
+    for case in range(cases):
+        heroes, items_db, stock = random_case(rng)
+        expected = exhaustive_power(heroes, items_db, stock)
+        solver = LoadoutSolver(heroes, items_db)
+        for label, current in (("sans loadout", None), ("avec loadout", random_current(rng, heroes, items_db))):
+            power, error = check_solution(heroes, items_db, stock, solver.solve(stock, current))
+            if error is None and power != expected:
+                error = f"puissance {power} au lieu de {expected}"
+            if error:
+                failures += 1
+                print(f"Cas {case} ({label}) : {error}")
+                print(f"  héros : {[(hero.id, hero.hero_class.name) for hero in heroes]}")
+                print(f"  items : {[(i.id, i.slot, i.rarity.name, [c.name for c in i.compatible_classes]) for i in items_db.values()]}")
+                print(f"  stock : {stock}")
+    print(f"{cases} cas vérifiés (graine {seed}) : {failures} écart(s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
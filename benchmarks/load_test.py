@@ -0,0 +1,350 @@
+"""Test de charge hors ligne : les vrais handlers de commandes, un faux Discord.
+
+Instancie HeroBot dans un répertoire temporaire (copie des catalogues et
+des joueurs, les fichiers du dépôt ne sont jamais modifiés), remplace
+ctx/Interaction par des doublures qui comptent les messages, puis fait
+jouer des utilisateurs virtuels selon un mélange de commandes (buy, open,
+daily, leaderboard, shop avec pagination). La sauvegarde différée tourne
+comme en production.
+
+Rapporte la latence p50/p99 par commande, le retard de la boucle
+d'événements et le débit.
+
+Utilisation : python benchmarks/load_test.py [--users 2000] [--duration 30]
+              [--mix buy=20,open=30,daily=10,leaderboard=15,shop=25]
+              [--animations 0] [--send-latency 0] [--fetch-latency 50] [--json resultats.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import types
+from collections import defaultdict
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_FILES = ("heroes.json", "items.json", "chests.json", "players.json", "items_du_jour.json")
+DEFAULT_MIX = "buy=20,open=30,daily=10,leaderboard=15,shop=25"
+
+
+# ---------- Doublures Discord ----------
+
+class MessageSink:
+    """Reçoit tout ce que les commandes envoient, avec une latence réseau simulée"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sends = 0
+        self.edits = 0
+
+    async def round_trip(self):
+        # Même à latence nulle, on rend la main comme le ferait un appel HTTP
+        await asyncio.sleep(self.latency)
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = f"joueur{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+
+
+class FakeMessage:
+    def __init__(self, sink: MessageSink):
+        self.sink = sink
+
+    async def edit(self, **kwargs):
+        await self.sink.round_trip()
+        self.sink.edits += 1
+
+
+class FakeContext:
+    """ctx minimal : auteur, send() ; garde la dernière vue envoyée (boutique)"""
+
+    def __init__(self, user: FakeUser, sink: MessageSink):
+        self.author = user
+        self.sink = sink
+        self.last_view = None
+
+    async def send(self, content=None, **kwargs):
+        await self.sink.round_trip()
+        self.sink.sends += 1
+        if kwargs.get("view") is not None:
+            self.last_view = kwargs["view"]
+        return FakeMessage(self.sink)
+
+
+class FakeResponse:
+    def __init__(self, sink: MessageSink):
+        self.sink = sink
+
+    async def send_message(self, *args, **kwargs):
+        await self.sink.round_trip()
+        self.sink.sends += 1
+
+    async def edit_message(self, **kwargs):
+        await self.sink.round_trip()
+        self.sink.edits += 1
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser, sink: MessageSink):
+        self.user = user
+        self.response = FakeResponse(sink)
+
+
+# ---------- Préparation ----------
+
+def prepare_workdir() -> str:
+    """Copie les données dans un répertoire jetable et s'y place avant d'importer le bot"""
+    workdir = tempfile.mkdtemp(prefix="herobot-charge-")
+    for name in DATA_FILES:
+        path = os.path.join(ROOT, name)
+        if os.path.exists(path):
+            shutil.copy(path, workdir)
+    os.chdir(workdir)
+    return workdir
+
+
+def scale_animations(herobot, factor: float):
+    """Les animations (asyncio.sleep dans open/daily) durent `factor` fois leur durée réelle.
+
+    Seule la référence à asyncio du module bot est remplacée : la boucle et
+    la mesure de son retard gardent le vrai asyncio.sleep.
+    """
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, result=None):
+        return await real_sleep(delay * factor, result)
+
+    shim = types.SimpleNamespace(**{name: getattr(asyncio, name) for name in dir(asyncio) if not name.startswith("__")})
+    shim.sleep = sleep
+    herobot.asyncio = shim
+
+
+def install_fake_fetch_user(bot, latency: float):
+    """fetch_user sans réseau, avec la latence d'un appel REST"""
+    async def fetch_user(user_id):
+        await asyncio.sleep(latency)
+        return FakeUser(user_id)
+    bot.fetch_user = fetch_user
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Commandes inconnues dans --mix : {', '.join(sorted(unknown))}")
+    return mix
+
+
+async def seed_players(herobot, user_ids, chest_names):
+    """Chaque utilisateur virtuel démarre avec de l'or et des coffres à ouvrir"""
+    bot = herobot.bot
+    for user_id in user_ids:
+        async with bot.transaction(user_id) as tx:
+            tx.player.gold += 1_000_000
+            for name in chest_names:
+                tx.player.add_chests(name, 50)
+
+
+# ---------- Scénarios ----------
+
+async def scenario_buy(herobot, ctx, rng):
+    bot = herobot.bot
+    if rng.random() < 0.7 and bot.heroes_db:
+        await herobot.buy.callback(ctx, rng.choice(list(bot.heroes_db.values())).name)
+    elif bot.items_db:
+        await herobot.buy.callback(ctx, None, rng.choice(list(bot.items_db.values())).name)
+
+
+async def scenario_open(herobot, ctx, rng):
+    owned = [name for name in herobot.bot.get_player(ctx.author.id).chests if name in herobot.bot.chests_db]
+    if not owned:
+        await herobot.open_chest.callback(ctx, chest_name="Coffre introuvable")
+        return
+    name = rng.choice(owned)
+    # Un cinquième des ouvertures sont groupées
+    await herobot.open_chest.callback(ctx, chest_name=f"{name} x10" if rng.random() < 0.2 else name)
+
+
+async def scenario_daily(herobot, ctx, rng):
+    await herobot.daily.callback(ctx)
+
+
+async def scenario_leaderboard(herobot, ctx, rng):
+    await herobot.leaderboard.callback(ctx, rng.randint(1, 3))
+
+
+async def scenario_shop(herobot, ctx, rng):
+    await herobot.shop.callback(ctx)
+    view = ctx.last_view
+    # Quelques clics : changement d'onglet et pagination
+    for _ in range(3):
+        buttons = [child for child in view.children if hasattr(child, "callback")]
+        await rng.choice(buttons).callback(FakeInteraction(ctx.author, ctx.sink))
+
+
+SCENARIOS = {
+    "buy": scenario_buy,
+    "open": scenario_open,
+    "daily": scenario_daily,
+    "leaderboard": scenario_leaderboard,
+    "shop": scenario_shop,
+}
+
+
+# ---------- Mesure ----------
+
+async def monitor_loop_lag(interval: float, samples: list, stop: asyncio.Event):
+    """Retard entre le réveil prévu et le réveil effectif d'une tâche"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def virtual_user(herobot, user_id, sink, mix, think_time, deadline, latencies, errors, seed):
+    rng = random.Random(seed)
+    ctx = FakeContext(FakeUser(user_id), sink)
+    names, weights = list(mix), list(mix.values())
+    # Départs étalés pour ne pas frapper tous en même temps
+    await asyncio.sleep(rng.uniform(0, think_time))
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            await SCENARIOS[name](herobot, ctx, rng)
+        except Exception as e:
+            errors[name] += 1
+            if errors[name] == 1:
+                print(f"Erreur dans {name}: {e!r}")
+        latencies[name].append(time.perf_counter() - start)
+        await asyncio.sleep(rng.expovariate(1 / think_time))
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    ms = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+async def run(args):
+    workdir = prepare_workdir()
+    import bot as herobot
+
+    bot = herobot.bot
+    scale_animations(herobot, args.animations)
+    install_fake_fetch_user(bot, args.fetch_latency / 1000)
+    mix = parse_mix(args.mix)
+
+    user_ids = list(range(10_000_000, 10_000_000 + args.users))
+    chest_names = [chest.name for chest in bot.chests_db.values() if not chest.hidden]
+    await seed_players(herobot, user_ids, chest_names)
+
+    sink = MessageSink(args.send_latency / 1000)
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lag_samples = []
+    stop = asyncio.Event()
+
+    # Seule la sauvegarde différée est démarrée (pas la rotation de la boutique)
+    bot.saver.start()
+    lag_task = asyncio.create_task(monitor_loop_lag(0.01, lag_samples, stop))
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(
+        virtual_user(herobot, user_id, sink, mix, args.think_time, deadline, latencies, errors, args.seed + index)
+        for index, user_id in enumerate(user_ids)
+    ))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    await bot.saver.stop()
+    bot.storage.close()
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "users": args.users,
+        "duration_s": elapsed,
+        "throughput_per_s": total / elapsed,
+        "commands": {name: {**summarize(latencies[name]), "errors": errors[name]} for name in mix},
+        "loop_lag": summarize(lag_samples),
+        "messages": {"sends": sink.sends, "edits": sink.edits},
+        "saver": {
+            "flushes": bot.saver.flush_count,
+            "errors": bot.saver.error_count,
+            "avg_flush_ms": bot.saver.avg_flush_ms,
+            "max_flush_ms": bot.saver.max_flush_ms,
+        },
+        "workdir": workdir if args.keep else None,
+    }
+
+
+def print_report(results):
+    print(f"{results['users']} utilisateurs virtuels pendant {results['duration_s']:.1f} s")
+    print(f"{'commande':<12} {'nb':>8} {'erreurs':>8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, stats in results["commands"].items():
+        if not stats["count"]:
+            print(f"{name:<12} {0:>8} {stats['errors']:>8}")
+            continue
+        print(
+            f"{name:<12} {stats['count']:>8} {stats['errors']:>8} "
+            f"{stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}"
+        )
+    lag = results["loop_lag"]
+    if lag["count"]:
+        print(f"Retard de boucle : p50 {lag['p50_ms']:.2f} ms, p99 {lag['p99_ms']:.2f} ms, max {lag['max_ms']:.2f} ms")
+    print(f"Débit : {results['throughput_per_s']:.0f} commandes/s")
+    print(f"Messages : {results['messages']['sends']} envoyés, {results['messages']['edits']} modifiés")
+    saver = results["saver"]
+    print(f"Sauvegarde : {saver['flushes']} écritures (erreurs {saver['errors']}), "
+          f"moyenne {saver['avg_flush_ms']:.1f} ms, max {saver['max_flush_ms']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge hors ligne de HeroBot")
+    parser.add_argument("--users", type=int, default=2000, help="utilisateurs virtuels simultanés")
+    parser.add_argument("--duration", type=float, default=30, help="durée du test (s)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="poids des commandes, ex. buy=20,open=30")
+    parser.add_argument("--think-time", type=float, default=1.0, help="pause moyenne entre deux commandes d'un utilisateur (s)")
+    parser.add_argument("--animations", type=float, default=0.0, help="facteur de durée des animations (1 = réel)")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="latence simulée d'un envoi/édition de message (ms)")
+    parser.add_argument("--fetch-latency", type=float, default=50.0, help="latence simulée de fetch_user (ms)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="écrit aussi les résultats dans ce fichier")
+    parser.add_argument("--keep", action="store_true", help="conserve le répertoire de travail temporaire")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    results = asyncio.run(run(args))
+    print_report(results)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
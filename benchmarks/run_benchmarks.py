@@ -0,0 +1,416 @@
+"""Suite de benchmarks des chemins chauds du moteur de jeu.
+
+Mesure generate_loot (simple et groupé), Hero.calculer_puissance, le
+solveur d'équipement automatique, les vues paginées de !items,
+HeroLevel.add_experience, save_data/chargement à différents nombres de
+joueurs, le classement (mise à jour, page, rang, commande !leaderboard),
+BoutiqueView.create_page_embed et le simulateur de combats (combats par
+seconde), sur des catalogues synthétiques de taille réglable. Tourne dans
+un répertoire temporaire : les données du dépôt ne sont pas modifiées.
+
+Les résultats peuvent être écrits en JSON puis comparés à une exécution
+précédente pour repérer les régressions entre deux versions :
+
+    python benchmarks/run_benchmarks.py --json avant.json
+    python benchmarks/run_benchmarks.py --json apres.json --compare avant.json
+
+Utilisation : python benchmarks/run_benchmarks.py [--items 100,10000] [--players 1000,10000]
+              [--only loot,classement] [--min-time 0.2] [--repeat 5] [--json FICHIER]
+              [--compare FICHIER] [--threshold 0.10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import FakeContext, FakeUser, MessageSink, install_fake_fetch_user, prepare_workdir  # noqa: E402
+
+
+class Benchmark:
+    """Un cas mesuré : setup() prépare l'état et renvoie l'opération à chronométrer.
+
+    unit / per_call : si l'opération traite per_call éléments, le débit est aussi affiché.
+    """
+
+    def __init__(self, group, name, params, setup, is_async=False, unit=None, per_call=1):
+        self.group = group
+        self.name = name
+        self.params = params
+        self.setup = setup
+        self.is_async = is_async
+        self.unit = unit
+        self.per_call = per_call
+
+    @property
+    def key(self):
+        suffix = ",".join(f"{k}={v}" for k, v in self.params.items())
+        return f"{self.name}[{suffix}]" if suffix else self.name
+
+
+async def call(op, number, is_async):
+    start = time.perf_counter()
+    if is_async:
+        for _ in range(number):
+            await op()
+    else:
+        for _ in range(number):
+            op()
+    return time.perf_counter() - start
+
+
+async def measure(benchmark, min_time, repeat):
+    """Comme timeit : nombre d'appels calibré pour durer min_time, puis `repeat` séries"""
+    op = benchmark.setup()
+    number = 1
+    while True:
+        elapsed = await call(op, number, benchmark.is_async)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    timings = []
+    for _ in range(repeat):
+        op = benchmark.setup()
+        timings.append(await call(op, number, benchmark.is_async) / number * 1e6)
+    result = {
+        "params": benchmark.params,
+        "number": number,
+        "min_us": min(timings),
+        "median_us": float(np.median(timings)),
+    }
+    if benchmark.unit:
+        result["per_second"] = benchmark.per_call / (result["median_us"] / 1e6)
+        result["unit"] = benchmark.unit
+    return result
+
+
+# ---------- Données synthétiques ----------
+
+def synthetic_players(herobot, count, item_ids, seed=3):
+    """Joueurs avec 3 héros équipés, des items et des coffres"""
+    rng = random.Random(seed)
+    bot = herobot.bot
+    heroes = list(bot.heroes_db.values())
+    chests = [chest.name for chest in bot.chests_db.values()]
+    players = []
+    for index in range(count):
+        player = herobot.PlayerData(20_000_000 + index, gold=rng.randint(0, 50_000))
+        for hero in rng.sample(heroes, min(3, len(heroes))):
+            instance = player.add_hero(hero)
+            for slot_index in range(len(instance.loadout)):
+                instance.equip(slot_index, rng.choice(item_ids))
+        player.add_items(rng.choices(item_ids, k=rng.randint(10, 100)))
+        for name in rng.sample(chests, min(2, len(chests))):
+            player.add_chests(name, rng.randint(1, 5))
+        players.append(player)
+    return players
+
+
+def install_catalog(herobot, item_count):
+    # Import tardif : bench_loot importe le bot, qui doit l'être depuis le répertoire temporaire
+    from bench_loot import synthetic_items
+
+    bot = herobot.bot
+    bot.install_catalog(herobot.Catalog(bot.catalog.heroes, synthetic_items(item_count), bot.catalog.chests))
+    return list(bot.items_db)
+
+
+def reset_storage(herobot):
+    """Nouveau stockage (selon STORAGE_BACKEND), sans cache hérité de la série précédente"""
+    bot = herobot.bot
+    bot.storage.close()
+    bot.storage = herobot.create_storage()
+
+
+def install_players(herobot, players):
+    bot = herobot.bot
+    bot.players = herobot.PlayerCache(max_size=len(players) + 1)
+    bot.leaderboard = herobot.PowerLeaderboard()
+    for player in players:
+        bot.players.put(player)
+        bot.leaderboard.update(player.user_id, bot.compute_player_power(player))
+
+
+# ---------- Suite ----------
+
+def build_suite(herobot, args):
+    bot = herobot.bot
+    chest = next(chest for chest in bot.chests_db.values() if not chest.hidden)
+    hero = next(iter(bot.heroes_db.values()))
+    suite = []
+
+    for item_count in args.items:
+        def loot_setup(item_count=item_count):
+            install_catalog(herobot, item_count)
+            return lambda: bot.generate_loot(chest)
+
+        def bulk_setup(item_count=item_count):
+            install_catalog(herobot, item_count)
+            return lambda: bot.generate_bulk_loot(chest, 100)
+
+        def power_setup(item_count=item_count):
+            item_ids = install_catalog(herobot, item_count)
+            equipped = random.Random(5).sample(item_ids, min(6, len(item_ids)))
+            return lambda: hero.calculer_puissance(bot.items_db, equipped)
+
+        def autoequip_setup(item_count=item_count):
+            item_ids = install_catalog(herobot, item_count)
+            classes = list(herobot.HeroClass)
+            rng = random.Random(7)
+            for item_id in item_ids:
+                item = bot.items_db[item_id]
+                item.compatible_classes = rng.sample(classes, 3)
+                item.slot = rng.choice(herobot.EQUIPMENT_SLOTS_BY_CLASS[item.compatible_classes[0]])
+            heroes = list(bot.heroes_db.values())
+            stock = {item_id: rng.randint(1, 3) for item_id in item_ids}
+            return lambda: herobot.LoadoutSolver(heroes, bot.items_db).solve(stock)
+
+        def inventory_player(item_count):
+            item_ids = install_catalog(herobot, item_count)
+            player = herobot.PlayerData(30_000_000)
+            player.add_items({item_id: random.Random(item_id).randint(1, 5) for item_id in item_ids})
+            bot.players.put(player)
+            return herobot.InventoryView(FakeUser(player.user_id), "items", herobot.InventoryQuery())
+
+        def inventory_build_setup(item_count=item_count):
+            view = inventory_player(item_count)
+
+            def build():
+                bot.inventory_indexes.invalidate(view.user.id)
+                view.create_page_embed()
+            return build
+
+        def inventory_page_setup(item_count=item_count):
+            view = inventory_player(item_count)
+
+            def turn_page():
+                view.page = (view.page + 1) % view.pages
+                view.create_page_embed()
+            return turn_page
+
+        suite += [
+            Benchmark("loot", "generate_loot", {"items": item_count}, loot_setup),
+            Benchmark("loot", "generate_bulk_loot_x100", {"items": item_count}, bulk_setup),
+            Benchmark("puissance", "calculer_puissance", {"items": item_count}, power_setup),
+            Benchmark("equipement", "autoequip_tous_heros", {"items": item_count}, autoequip_setup),
+            Benchmark("inventaire", "index+page_items", {"items": item_count}, inventory_build_setup),
+            Benchmark("inventaire", "page_items_en_cache", {"items": item_count}, inventory_page_setup),
+        ]
+
+    def experience_setup():
+        level = herobot.HeroLevel()
+        return lambda: level.add_experience(50)
+
+    def experience_batch_setup():
+        levels = [herobot.HeroLevel() for _ in range(10_000)]
+        return lambda: herobot.grant_experience_batch(levels, 50)
+
+    suite.append(Benchmark("experience", "add_experience", {}, experience_setup))
+    suite.append(Benchmark("experience", "grant_experience_batch", {"heros": 10_000}, experience_batch_setup))
+
+    for battle_count in (1_000, 10_000):
+        def battle_setup(battle_count=battle_count):
+            # Équipes 5 contre 5 de héros du catalogue équipés au hasard, niveaux 1 à 30
+            rng = random.Random(17)
+            heroes = list(bot.heroes_db.values())
+            item_ids = list(bot.items_db)
+
+            def random_team():
+                return np.array([
+                    herobot.fighter_stats(hero, rng.randint(1, 30), rng.sample(item_ids, min(6, len(item_ids))), bot.items_db)
+                    for hero in rng.choices(heroes, k=herobot.COMBAT_TEAM_SIZE)
+                ])
+            side_a = herobot.pack_teams([random_team() for _ in range(battle_count)])
+            side_b = herobot.pack_teams([random_team() for _ in range(battle_count)])
+            return lambda: herobot.simulate_battles(side_a, side_b, seed=1)
+
+        suite.append(Benchmark("combat", "simulate_battles", {"combats": battle_count}, battle_setup,
+                               unit="combats", per_call=battle_count))
+
+    for player_count in args.players:
+        def save_setup(player_count=player_count):
+            item_ids = install_catalog(herobot, 200)
+            install_players(herobot, synthetic_players(herobot, player_count, item_ids))
+            # Le stockage JSON garde la forme sérialisée : on repart d'un cache vide à chaque série
+            reset_storage(herobot)
+            return bot.save_data
+
+        def load_setup(player_count=player_count):
+            save_setup(player_count)()
+
+            def load():
+                reset_storage(herobot)
+                bot.rebuild_leaderboard(bot.storage.load_index())
+            return load
+
+        def leaderboard_update_setup(player_count=player_count):
+            rng = random.Random(9)
+            board = herobot.PowerLeaderboard()
+            for user_id in range(player_count):
+                board.update(user_id, rng.randint(0, 10_000))
+            return lambda: board.update(rng.randrange(player_count), rng.randint(0, 10_000))
+
+        def leaderboard_query_setup(player_count=player_count):
+            rng = random.Random(11)
+            board = herobot.PowerLeaderboard()
+            for user_id in range(player_count):
+                board.update(user_id, rng.randint(0, 10_000))
+
+            def query():
+                board.page(rng.randrange(max(1, player_count - 10)), 10)
+                board.rank(rng.randrange(player_count))
+            return query
+
+        def leaderboard_command_setup(player_count=player_count):
+            rng = random.Random(13)
+            bot.leaderboard = herobot.PowerLeaderboard()
+            for user_id in range(player_count):
+                bot.leaderboard.update(user_id, rng.randint(0, 10_000))
+                bot.usernames.put(user_id, f"joueur{user_id}")
+            ctx = FakeContext(FakeUser(1), MessageSink(0))
+            pages = max(1, player_count // herobot.LEADERBOARD_PAGE_SIZE)
+            return lambda: herobot.leaderboard.callback(ctx, rng.randint(1, pages))
+
+        suite += [
+            Benchmark("persistance", "save_data", {"players": player_count}, save_setup),
+            Benchmark("persistance", "load_index+classement", {"players": player_count}, load_setup),
+            Benchmark("classement", "update", {"players": player_count}, leaderboard_update_setup),
+            Benchmark("classement", "page+rank", {"players": player_count}, leaderboard_query_setup),
+            Benchmark("classement", "commande_leaderboard", {"players": player_count},
+                      leaderboard_command_setup, is_async=True),
+        ]
+
+    for page in ("heros", "coffres", "items"):
+        def shop_setup(page=page):
+            view = herobot.BoutiqueView(FakeUser(1))
+            view.current_page = page
+
+            async def render():
+                view.hero_index += 1
+                view.chest_index += 1
+                await view.create_page_embed()
+            return render
+
+        suite.append(Benchmark("boutique", "create_page_embed", {"page": page}, shop_setup, is_async=True))
+
+    if args.only:
+        suite = [benchmark for benchmark in suite if benchmark.group in args.only]
+    return suite
+
+
+# ---------- Rapport ----------
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_us(value):
+    if value >= 1e6:
+        return f"{value / 1e6:.2f} s"
+    if value >= 1e3:
+        return f"{value / 1e3:.2f} ms"
+    return f"{value:.2f} µs"
+
+
+def compare(results, baseline, threshold):
+    """Affiche l'écart avec une exécution précédente ; renvoie les régressions"""
+    regressions = []
+    print(f"\nComparaison avec {baseline['meta'].get('revision') or 'la référence'} (seuil {threshold:.0%})")
+    for key, result in results.items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            continue
+        ratio = result["median_us"] / previous["median_us"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  ⚠️ régression"
+            regressions.append(key)
+        elif ratio < 1 - threshold:
+            flag = "  ✅ amélioration"
+        print(f"  {key:<52} {format_us(previous['median_us']):>11} -> {format_us(result['median_us']):>11}  x{ratio:.2f}{flag}")
+    return regressions
+
+
+async def run(args):
+    workdir = prepare_workdir()
+    import bot as herobot
+
+    install_fake_fetch_user(herobot.bot, 0)
+    results = {}
+    try:
+        for benchmark in build_suite(herobot, args):
+            result = await measure(benchmark, args.min_time, args.repeat)
+            results[benchmark.key] = result
+            throughput = f", {result['per_second']:,.0f} {result['unit']}/s" if "per_second" in result else ""
+            print(f"{benchmark.key:<52} {format_us(result['median_us']):>11}  "
+                  f"(min {format_us(result['min_us'])}, x{result['number']}{throughput})")
+    finally:
+        herobot.bot.storage.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def parse_sizes(text):
+    return [int(value) for value in text.split(",") if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks des chemins chauds de HeroBot")
+    parser.add_argument("--items", type=parse_sizes, default=[100, 10_000], help="tailles de catalogue synthétique")
+    parser.add_argument("--players", type=parse_sizes, default=[1_000, 10_000], help="nombres de joueurs synthétiques")
+    parser.add_argument("--only", type=lambda text: set(text.split(",")),
+                        help="groupes à lancer : loot, puissance, equipement, inventaire, experience, combat, persistance, classement, boutique")
+    parser.add_argument("--min-time", type=float, default=0.2, help="durée minimale d'une série (s)")
+    parser.add_argument("--repeat", type=int, default=5, help="nombre de séries par mesure")
+    parser.add_argument("--json", help="écrit les résultats dans ce fichier")
+    parser.add_argument("--compare", help="résultats JSON d'une exécution précédente")
+    parser.add_argument("--threshold", type=float, default=0.10, help="écart relatif signalé comme régression")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = asyncio.run(run(args))
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "storage": os.getenv("STORAGE_BACKEND", "json"),
+            "items": args.items,
+            "players": args.players,
+        },
+        "results": results,
+    }
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if baseline is not None and compare(results, baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
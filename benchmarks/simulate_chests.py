@@ -0,0 +1,189 @@
+"""Simulateur Monte-Carlo des coffres et validation de l'économie des drops.
+
+Ouvre des millions de coffres de chaque type, en tirages vectorisés NumPy,
+contre le vrai catalogue (heroes.json, items.json, chests.json), avec les
+mêmes probabilités que le moteur (LootTable) et la même loi d'or que
+generate_loot. Pour chaque coffre :
+
+- taux effectif par rareté comparé au taux configuré (intervalle à 95 %) ;
+- items obtenus par ouverture et part des ouvertures qui ne donnent rien ;
+- or rendu par ouverture, puissance obtenue par ouverture et pour 1000 pièces
+  dépensées (prix brut et prix net de l'or rendu).
+
+Signale les tirages qui ne peuvent jamais produire d'item (rareté inconnue,
+rareté sans aucun item dans items.json) et les raretés sans puissance.
+
+Utilisation : python benchmarks/simulate_chests.py [--openings 1000000] [--chest NOM ...]
+              [--catalog DOSSIER] [--seed 1] [--json FICHIER] [--strict]
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import ROOT, prepare_workdir  # noqa: E402
+
+CHUNK = 250_000  # ouvertures simulées par lot, pour borner la mémoire
+GOLD_RANGE = (50, 201)  # generate_loot : random.randint(50, 200)
+
+
+def rarity_power(catalog, rarity):
+    """Puissance moyenne d'un item de cette rareté dans le catalogue (0 s'il n'y en a pas)"""
+    item_ids = catalog.items_by_rarity.get(rarity)
+    if not item_ids:
+        return 0.0
+    return float(np.mean([catalog.items[item_id].get_puissance() for item_id in item_ids]))
+
+
+def simulate_chest(catalog, chest, openings, rng):
+    table = catalog.loot_tables[chest.name]
+    names = list(chest.rarity_distribution)
+    weights = np.array(list(chest.rarity_distribution.values()), dtype=float)
+    configured = weights / weights.sum() if weights.sum() > 0 else np.zeros(len(names))
+
+    stocked = np.array([bool(rarity and catalog.items_by_rarity.get(rarity)) for rarity in table.rarities])
+    power = np.array([rarity_power(catalog, rarity) if rarity else 0.0 for rarity in table.rarities])
+
+    draws_per_rarity = np.zeros(len(names), dtype=np.int64)
+    items_histogram = np.zeros(chest.loot_amount + 1, dtype=np.int64)
+    power_sum = power_sq_sum = 0.0
+    gold_sum = 0
+
+    start = time.perf_counter()
+    remaining = openings
+    while remaining > 0 and table.probabilities is not None:
+        n = min(CHUNK, remaining)
+        remaining -= n
+        draws = rng.choice(len(names), size=(n, chest.loot_amount), p=table.probabilities)
+        draws_per_rarity += np.bincount(draws.ravel(), minlength=len(names))
+        items_histogram += np.bincount(stocked[draws].sum(axis=1), minlength=chest.loot_amount + 1)
+        opening_power = power[draws].sum(axis=1)
+        power_sum += float(opening_power.sum())
+        power_sq_sum += float(np.square(opening_power).sum())
+        gold_sum += int(rng.integers(*GOLD_RANGE, size=n).sum())
+    elapsed = time.perf_counter() - start
+
+    total_draws = openings * chest.loot_amount
+    rarities = []
+    for index, name in enumerate(names):
+        rate = draws_per_rarity[index] / total_draws if total_draws else 0.0
+        rarities.append({
+            "name": name,
+            "rarity": table.rarities[index].name if table.rarities[index] else None,
+            "configured": float(configured[index]),
+            "effective": float(rate),
+            "ci95": 1.96 * math.sqrt(rate * (1 - rate) / total_draws) if total_draws else 0.0,
+            "produces_items": bool(stocked[index]),
+            "item_power": float(power[index]),
+        })
+
+    mean_power = power_sum / openings
+    power_std = math.sqrt(max(0.0, power_sq_sum / openings - mean_power ** 2))
+    mean_gold = gold_sum / openings
+    net_price = chest.price - mean_gold
+    items_per_opening = float(np.dot(np.arange(chest.loot_amount + 1), items_histogram) / openings)
+
+    flags = []
+    for entry in rarities:
+        if entry["rarity"] is None:
+            flags.append(f"rareté inconnue « {entry['name']} » : {entry['configured']:.1%} des tirages ne donnent jamais d'item")
+        elif not entry["produces_items"] and entry["configured"] > 0:
+            flags.append(f"aucun item {entry['name']} dans le catalogue : {entry['configured']:.1%} des tirages à vide")
+        elif entry["item_power"] == 0 and entry["configured"] > 0:
+            flags.append(f"les items {entry['name']} n'ont aucune puissance (absents de PUISSANCE_ITEM)")
+    if table.probabilities is None:
+        flags.append("distribution vide : le coffre ne donne jamais d'item")
+
+    return {
+        "chest": chest.name,
+        "price": chest.price,
+        "hidden": chest.hidden,
+        "loot_amount": chest.loot_amount,
+        "openings": openings,
+        "rarities": rarities,
+        "items_per_opening": items_per_opening,
+        "empty_opening_rate": float(items_histogram[0] / openings),
+        "gold_per_opening": mean_gold,
+        "power_per_opening": mean_power,
+        "power_ci95": 1.96 * power_std / math.sqrt(openings),
+        "power_per_1000_gold": 1000 * mean_power / chest.price if chest.price > 0 else None,
+        "power_per_1000_net_gold": 1000 * mean_power / net_price if net_price > 0 else None,
+        "flags": flags,
+        "seconds": elapsed,
+    }
+
+
+def print_report(result):
+    status = " (caché, non vendu)" if result["hidden"] else ""
+    openings = f"{result['openings']:,}".replace(",", " ")
+    print(f"\n{result['chest']}{status} — prix {result['price']}, {result['loot_amount']} tirage(s), "
+          f"{openings} ouvertures en {result['seconds']:.1f} s")
+    print(f"  {'rareté':<12} {'configuré':>10} {'effectif':>18}  items  puissance")
+    for entry in result["rarities"]:
+        marker = "oui" if entry["produces_items"] else "NON"
+        print(f"  {entry['name']:<12} {entry['configured']:>10.2%} {entry['effective']:>9.3%} ±{entry['ci95']:.3%}  "
+              f"{marker:>5}  {entry['item_power']:>9.0f}")
+    print(f"  Items par ouverture : {result['items_per_opening']:.3f} "
+          f"(ouvertures sans item : {result['empty_opening_rate']:.2%})")
+    print(f"  Or rendu par ouverture : {result['gold_per_opening']:.1f}")
+    line = f"  Puissance par ouverture : {result['power_per_opening']:.1f} ±{result['power_ci95']:.1f}"
+    if result["power_per_1000_gold"] is not None:
+        line += f" — pour 1000 pièces : {result['power_per_1000_gold']:.1f}"
+        if result["power_per_1000_net_gold"] is not None:
+            line += f" (net de l'or rendu : {result['power_per_1000_net_gold']:.1f})"
+        else:
+            line += " (l'or rendu couvre le prix)"
+    print(line)
+    for flag in result["flags"]:
+        print(f"  ⚠️ {flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation Monte-Carlo des coffres de HeroBot")
+    parser.add_argument("--openings", type=int, default=1_000_000, help="ouvertures simulées par coffre")
+    parser.add_argument("--chest", action="append", help="coffre à simuler (répétable, tous par défaut)")
+    parser.add_argument("--catalog", default=ROOT, help="dossier contenant heroes.json, items.json et chests.json")
+    parser.add_argument("--seed", type=int, help="graine du générateur")
+    parser.add_argument("--json", help="écrit les résultats dans ce fichier")
+    parser.add_argument("--strict", action="store_true", help="code de sortie 1 si un problème est signalé")
+    args = parser.parse_args()
+
+    catalog_dir = os.path.abspath(args.catalog)
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = prepare_workdir()
+    try:
+        import bot as herobot
+
+        catalog = herobot.Catalog.from_files(catalog_dir)
+        for error in catalog.errors:
+            print(f"❌ {error}")
+        chests = [catalog.chests[name] for name in args.chest] if args.chest else list(catalog.chests.values())
+        rng = np.random.default_rng(args.seed)
+        results = []
+        for chest in chests:
+            result = simulate_chest(catalog, chest, args.openings, rng)
+            print_report(result)
+            results.append(result)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    flagged = [result for result in results if result["flags"]]
+    print(f"\n{len(flagged)} coffre(s) sur {len(results)} avec des tirages qui ne peuvent pas produire d'item"
+          if flagged else "\nTous les tirages peuvent produire un item")
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"openings": args.openings, "seed": args.seed, "results": results}, f, ensure_ascii=False, indent=2)
+    if args.strict and (flagged or catalog.errors):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,39 @@ import discord
 from discord.ext import commands
 import asyncio
 import json
+import math
+import copy
+import hashlib
+import pickle
+import cProfile
+import pstats
 import random
+import sqlite3
+import sys
+import time
+import unicodedata
+import difflib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
 from enum import Enum
-from dataclasses import dataclass, asdict, field
+from functools import lru_cache
+from itertools import accumulate, islice
+from collections import Counter
+from dataclasses import dataclass, field, fields
+from contextlib import asynccontextmanager
 from typing import Dict, List, Optional
 import os
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+import numpy as np
 from dotenv import load_dotenv
+from sortedcontainers import SortedList
 from discord.ui import View, Select, Button
+from discord import app_commands
 from datetime import datetime, timedelta, timezone
 load_dotenv("secrets.env")  # Charge les variables depuis secrets.env
 
@@ -121,6 +147,88 @@ def get_color_from_hex(hex_color):
         hex_color = hex_color[1:]
     return discord.Color(int(hex_color, 16))
 
+def strip_accents(text: str) -> str:
+    """Retire les accents (« Légendaire » -> « Legendaire »)"""
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+def parse_item_rarity(name: str) -> Optional[ItemRarity]:
+    """Convertit un nom de rareté des fichiers JSON en ItemRarity (accents ignorés)"""
+    return ItemRarity.__members__.get(strip_accents(name).upper())
+
+def normalize_name(text: str) -> str:
+    """Clé de recherche : sans accents, sans casse, espaces normalisés"""
+    return " ".join(strip_accents(text).casefold().split())
+
+class NameIndex:
+    """Index des noms d'un catalogue (héros, items ou coffres).
+
+    - recherche exacte en O(1) sur le nom normalisé ;
+    - recherche par préfixe via une liste triée de clés (bisect), qui joue le
+      rôle d'un trie compact : chaque mot du nom est aussi un point d'entrée,
+      « leg » trouve donc « Coffre Légendaire » ;
+    - suggestions approchantes (difflib) quand rien ne correspond.
+    """
+
+    def __init__(self, entries):
+        self._exact: Dict[str, object] = {}
+        self._display: Dict[str, str] = {}
+        prefix_keys = set()
+        for name, value in entries:
+            key = normalize_name(name)
+            self._exact.setdefault(key, value)
+            self._display.setdefault(key, name)
+            words = key.split(" ")
+            for start in range(len(words)):
+                prefix_keys.add((" ".join(words[start:]), key))
+        self._prefix_keys: List[tuple] = sorted(prefix_keys)
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def get(self, name: str):
+        """Valeur associée au nom (accents et casse ignorés), None si inconnu"""
+        return self._exact.get(normalize_name(name))
+
+    def resolve(self, name: str):
+        """Comme get, mais accepte aussi un préfixe qui ne désigne qu'un seul nom"""
+        value = self.get(name)
+        if value is None:
+            matches = self.prefix(name, limit=2)
+            if len(matches) == 1:
+                value = self._exact[normalize_name(matches[0])]
+        return value
+
+    def display_name(self, name: str) -> Optional[str]:
+        return self._display.get(normalize_name(name))
+
+    def prefix(self, text: str, limit: int = 25) -> List[str]:
+        """Noms dont un mot commence par text, dans l'ordre alphabétique"""
+        query = normalize_name(text)
+        if not query:
+            return [self._display[key] for key in islice(sorted(self._display), limit)]
+        results = []
+        seen = set()
+        index = bisect_left(self._prefix_keys, (query,))
+        while index < len(self._prefix_keys) and len(results) < limit:
+            suffix, key = self._prefix_keys[index]
+            if not suffix.startswith(query):
+                break
+            if key not in seen:
+                seen.add(key)
+                results.append(self._display[key])
+            index += 1
+        return results
+
+    def suggest(self, text: str, limit: int = 25) -> List[str]:
+        """Préfixes d'abord, puis noms approchants pour les fautes de frappe"""
+        results = self.prefix(text, limit)
+        if len(results) < limit:
+            for key in difflib.get_close_matches(normalize_name(text), list(self._display), n=limit, cutoff=0.6):
+                name = self._display[key]
+                if name not in results:
+                    results.append(name)
+        return results[:limit]
+
 @dataclass
 class Item:
     id: int
@@ -131,6 +239,7 @@ class Item:
     image: str
     stats: Dict[str, int]
     description: str = ""
+    slot: str = ""
     def get_puissance(self) -> int:
         return PUISSANCE_ITEM.get(self.rarity, 0)
 @dataclass
@@ -144,9 +253,12 @@ class Hero:
     description: str = ""
     equipped_items: List[int] = None
     color: str = "#5865F2"
-    def calculer_puissance(self, items_db: Dict[int, Item]) -> int:
+    def calculer_puissance(self, items_db: Dict[int, Item], equipped_items: Optional[List[int]] = None) -> int:
+        """Puissance du héros avec l'équipement donné (par défaut celui du catalogue)"""
         puissance = PUISSANCE_HEROS.get(self.rarity, 0)
-        for item_id in self.equipped_items:
+        if equipped_items is None:
+            equipped_items = self.equipped_items
+        for item_id in equipped_items:
             item = items_db.get(item_id)
             if item:
                 puissance += PUISSANCE_ITEM.get(item.rarity, 0)
@@ -155,26 +267,142 @@ class Hero:
     def __post_init__(self):
         if self.equipped_items is None:
             self.equipped_items = []
-@dataclass
+class ItemBag:
+    """Inventaire d'items compact : ids triés et quantités dans deux array('I').
+
+    Environ 8 octets par item distinct, là où une liste coûte 8 octets par
+    exemplaire et un dict une quarantaine par clé. Possession et quantité
+    se lisent par bisection.
+    """
+    __slots__ = ('_ids', '_counts')
+
+    def __init__(self, items=()):
+        counts = items if hasattr(items, 'items') else Counter(items)
+        ids = sorted(item_id for item_id, count in counts.items() if count > 0)
+        self._ids = array('I', ids)
+        self._counts = array('I', [counts[item_id] for item_id in ids])
+
+    @staticmethod
+    def _pairs(items):
+        """(id, quantité) depuis un mapping ou un itérable d'ids (un par exemplaire)"""
+        if hasattr(items, 'items'):
+            return items.items()
+        return Counter(items).items()
+
+    def _index(self, item_id: int) -> int:
+        index = bisect_left(self._ids, item_id)
+        return index if index < len(self._ids) and self._ids[index] == item_id else -1
+
+    def __contains__(self, item_id: int) -> bool:
+        ids = self._ids
+        index = bisect_left(ids, item_id)
+        return index < len(ids) and ids[index] == item_id
+
+    def __getitem__(self, item_id: int) -> int:
+        index = self._index(item_id)
+        return self._counts[index] if index >= 0 else 0
+
+    def __len__(self) -> int:
+        """Nombre d'items distincts"""
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ItemBag) and self._ids == other._ids and self._counts == other._counts
+
+    def __repr__(self) -> str:
+        return f"ItemBag({dict(self.items())})"
+
+    def items(self):
+        return zip(self._ids, self._counts)
+
+    def elements(self):
+        for item_id, count in self.items():
+            for _ in range(count):
+                yield item_id
+
+    def total(self) -> int:
+        return sum(self._counts)
+
+    def counter(self) -> Counter:
+        return Counter(dict(self.items()))
+
+    def add(self, item_id: int, count: int = 1):
+        index = bisect_left(self._ids, item_id)
+        if index < len(self._ids) and self._ids[index] == item_id:
+            self._counts[index] += count
+        else:
+            self._ids.insert(index, item_id)
+            self._counts.insert(index, count)
+
+    def update(self, items):
+        for item_id, count in self._pairs(items):
+            self.add(item_id, count)
+
+    def remove(self, item_id: int, count: int = 1):
+        index = self._index(item_id)
+        owned = self._counts[index] if index >= 0 else 0
+        if owned < count:
+            raise ValueError(f"item {item_id} : {count} exemplaire(s) demandés, {owned} possédé(s)")
+        if owned == count:
+            del self._ids[index]
+            del self._counts[index]
+        else:
+            self._counts[index] = owned - count
+
+@dataclass(slots=True)
 class PlayerData:
     user_id: int
     gold: int = 1000
     emblems: int = 0
-    heroes: List[int] = None
-    items: List[int] = None
-    chests: List[str] = None
-    hero_levels: Dict[int, 'HeroLevel'] = None  
+    heroes: Dict[int, 'HeroInstance'] = field(default_factory=dict)  # id du héros -> instance propre au joueur
+    items: ItemBag = field(default_factory=ItemBag)   # id d'item -> nombre d'exemplaires
+    chests: Counter = field(default_factory=Counter)  # nom de coffre (interné) -> nombre
     last_daily_claim: Optional[str] = None
 
     def __post_init__(self):
-        if self.heroes is None:
-            self.heroes = []
-        if self.items is None:
-            self.items = []
-        if self.chests is None:
-            self.chests = []
-        if self.hero_levels is None:
-            self.hero_levels = {}
+        # Accepte aussi l'ancienne forme en listes (une entrée par exemplaire)
+        if not isinstance(self.items, ItemBag):
+            self.items = ItemBag(self.items)
+        self.chests = Counter({sys.intern(name): count for name, count in Counter(self.chests).items() if count > 0})
+
+    @property
+    def item_count(self) -> int:
+        return self.items.total()
+
+    @property
+    def chest_count(self) -> int:
+        return self.chests.total()
+
+    def add_items(self, item_ids):
+        """Ajoute des items : itérable d'ids (un par exemplaire) ou mapping id -> nombre"""
+        self.items.update(item_ids)
+
+    def remove_item(self, item_id: int, count: int = 1):
+        self.items.remove(item_id, count)
+
+    def add_chests(self, chest_name: str, count: int = 1):
+        self.chests[sys.intern(chest_name)] += count
+
+    def remove_chests(self, chest_name: str, count: int = 1):
+        remaining = self.chests[chest_name] - count
+        if remaining < 0:
+            raise ValueError(f"{chest_name} : {count} coffre(s) demandés, {self.chests[chest_name]} possédé(s)")
+        if remaining:
+            self.chests[chest_name] = remaining
+        else:
+            del self.chests[chest_name]
+
+    def add_hero(self, hero: Hero) -> 'HeroInstance':
+        instance = HeroInstance(hero.id, loadout=[None] * len(EQUIPMENT_SLOTS_BY_CLASS[hero.hero_class]))
+        self.heroes[hero.id] = instance
+        return instance
+
+    def equipped_count(self, item_id: int) -> int:
+        """Nombre d'exemplaires d'un item actuellement portés par les héros du joueur"""
+        return sum(instance.loadout.count(item_id) for instance in self.heroes.values())
 @dataclass
 class ChestType:
     name: str
@@ -185,260 +413,3199 @@ class ChestType:
     price: int = 0
     color: str = "#5865F2"
     hidden: bool = False
+# Générateur NumPy pour les ouvertures en masse
+LOOT_RNG = np.random.default_rng()
+
+class LootTable:
+    """Distribution de raretés d'un coffre, compilée une seule fois.
+
+    Les poids cumulés permettent de tirer toutes les raretés d'une ouverture
+    en un seul appel à random.choices. Une rareté inconnue reste dans la
+    table (valeur None) pour conserver la probabilité de tirage à vide.
+    """
+
+    def __init__(self, chest: 'ChestType'):
+        self.rarities: List[Optional[ItemRarity]] = [
+            parse_item_rarity(name) for name in chest.rarity_distribution
+        ]
+        self.cum_weights: List[int] = list(accumulate(chest.rarity_distribution.values()))
+        total = self.cum_weights[-1] if self.cum_weights else 0
+        self.probabilities = (
+            np.array(list(chest.rarity_distribution.values()), dtype=float) / total if total > 0 else None
+        )
+
+    def roll(self, k: int) -> List[Optional[ItemRarity]]:
+        if not self.rarities or self.cum_weights[-1] <= 0:
+            return []
+        return random.choices(self.rarities, cum_weights=self.cum_weights, k=k)
+
+    def roll_counts(self, k: int) -> np.ndarray:
+        """Tire k raretés d'un coup et renvoie le nombre de tirages par rareté"""
+        if self.probabilities is None:
+            return np.zeros(len(self.rarities), dtype=np.int64)
+        return LOOT_RNG.multinomial(k, self.probabilities)
+
 @dataclass
 class LootResult:
     items: List[int] = field(default_factory=list)
     gold: int = 0
     emblems: int = 0
 @dataclass
+class BulkLootResult:
+    chests_opened: int = 0
+    items: Counter = field(default_factory=Counter)  # id d'item -> quantité
+    gold: int = 0
+    emblems: int = 0
+def build_experience_tables(first_level: int = 100, growth: float = 1.5, cap: int = 2 ** 62) -> tuple:
+    """XP requise par niveau (100, puis x1.5 arrondi à l'entier inférieur) et XP totale pour l'atteindre"""
+    requirements = []
+    thresholds = [0]  # thresholds[n - 1] : XP totale à partir de laquelle on est niveau n
+    requirement = first_level
+    while True:
+        requirements.append(requirement)
+        if thresholds[-1] + requirement > cap:
+            break
+        thresholds.append(thresholds[-1] + requirement)
+        requirement = int(requirement * growth)
+    return requirements, thresholds
+
+XP_REQUIREMENTS, XP_THRESHOLDS = build_experience_tables()
+XP_THRESHOLDS_NP = np.array(XP_THRESHOLDS, dtype=np.int64)
+XP_MAX = XP_THRESHOLDS[-1] + XP_REQUIREMENTS[-1] - 1  # Au-delà, l'XP n'est plus comptée
+
+@dataclass(slots=True)
 class HeroLevel:
-    level: int = 1
-    experience: int = 0
-    max_experience: int = 100
-    
+    """Progression d'un héros, stockée en XP totale.
+
+    Le niveau, l'XP dans le niveau et l'XP requise pour le suivant se lisent dans
+    la table cumulée (recherche dichotomique) : un gain d'XP, même énorme, est une
+    simple addition.
+    """
+    total_experience: int = 0
+
+    @classmethod
+    def from_progress(cls, level: int, experience: int = 0) -> 'HeroLevel':
+        """Depuis l'ancien format (niveau, XP dans le niveau)"""
+        level = max(1, min(level, len(XP_THRESHOLDS)))
+        return cls(min(XP_THRESHOLDS[level - 1] + experience, XP_MAX))
+
+    @property
+    def level(self) -> int:
+        return bisect_right(XP_THRESHOLDS, self.total_experience)
+
+    @property
+    def experience(self) -> int:
+        return self.total_experience - XP_THRESHOLDS[self.level - 1]
+
+    @property
+    def max_experience(self) -> int:
+        return XP_REQUIREMENTS[self.level - 1]
+
     def add_experience(self, amount: int) -> bool:
         """Ajoute de l'expérience et retourne True si level up"""
-        self.experience += amount
-        leveled_up = False
-        
-        while self.experience >= self.max_experience:
-            self.experience -= self.max_experience
-            self.level += 1
-            self.max_experience = int(self.max_experience * 1.5)  # Augmente les requis d'XP
-            leveled_up = True
-        
-        return leveled_up    
+        level = self.level
+        self.total_experience = min(self.total_experience + amount, XP_MAX)
+        return self.level > level
+
+def grant_experience_batch(levels: List[HeroLevel], amounts) -> int:
+    """Ajoute de l'XP à plusieurs héros en un seul calcul vectorisé ; renvoie le nombre de niveaux gagnés.
+
+    amounts est un montant commun ou un montant par héros (entiers positifs, sans limite :
+    le gain est plafonné à XP_MAX avant tout calcul en int64).
+    """
+    if not levels:
+        return 0
+    amounts = np.asarray(amounts, dtype=object)
+    if (amounts < 0).any():
+        raise ValueError("un gain d'XP ne peut pas être négatif")
+    before = np.fromiter((level.total_experience for level in levels), dtype=np.int64, count=len(levels))
+    after = before + np.minimum(np.asarray(np.minimum(amounts, XP_MAX), dtype=np.int64), XP_MAX - before)
+    gained = np.searchsorted(XP_THRESHOLDS_NP, after, side='right') - np.searchsorted(XP_THRESHOLDS_NP, before, side='right')
+    for level, total in zip(levels, after.tolist()):
+        level.total_experience = total
+    return int(gained.sum())
+
+@dataclass(slots=True)
+class HeroInstance:
+    """Héros possédé par un joueur : niveau, équipement par emplacement et puissance en cache.
+
+    loadout suit l'ordre de EQUIPMENT_SLOTS_BY_CLASS pour la classe du héros
+    (None = emplacement libre). La puissance n'est recalculée que lorsque
+    l'équipement de cette instance change.
+    """
+    hero_id: int
+    level: HeroLevel = field(default_factory=HeroLevel)
+    loadout: List[Optional[int]] = field(default_factory=list)
+    _puissance: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def equipped_items(self) -> List[int]:
+        return [item_id for item_id in self.loadout if item_id is not None]
+
+    def fit_loadout(self, slot_count: int):
+        """Ajuste le nombre d'emplacements à la classe du héros"""
+        if len(self.loadout) < slot_count:
+            self.loadout.extend([None] * (slot_count - len(self.loadout)))
+        elif len(self.loadout) > slot_count:
+            del self.loadout[slot_count:]
+            self._puissance = None
+
+    def free_slot(self, hero: Hero, item: Item) -> Optional[int]:
+        """Premier emplacement libre compatible avec l'item, None s'il n'y en a pas"""
+        slots = EQUIPMENT_SLOTS_BY_CLASS[hero.hero_class]
+        for index, item_id in enumerate(self.loadout):
+            if item_id is None and (not item.slot or slots[index] == item.slot):
+                return index
+        return None
+
+    def equip(self, slot_index: int, item_id: int):
+        self.loadout[slot_index] = item_id
+        self._puissance = None
+
+    def unequip(self, item_id: int) -> bool:
+        if item_id not in self.loadout:
+            return False
+        self.loadout[self.loadout.index(item_id)] = None
+        self._puissance = None
+        return True
+
+    def invalidate(self):
+        self._puissance = None
+
+    def puissance(self, hero: Hero, items_db: Dict[int, Item]) -> int:
+        if self._puissance is None:
+            self._puissance = hero.calculer_puissance(items_db, self.equipped_items)
+        return self._puissance
+
+ITEMS_DU_JOUR_PATH = "items_du_jour.json"
+
+class DailyShopRotation:
+    """Items du jour gardés en mémoire avec leur date d'expiration.
+
+    Le fichier n'est lu qu'au démarrage et écrit qu'à chaque rotation ;
+    la rotation elle-même est déclenchée par une tâche planifiée à l'échéance.
+    """
+
+    def __init__(self, path: str = ITEMS_DU_JOUR_PATH, period: timedelta = timedelta(hours=24), size: int = 5):
+        self.path = path
+        self.period = period
+        self.size = size
+        self.items: List[Item] = []
+        self.updated_at: Optional[datetime] = None
+
+    @property
+    def expires_at(self) -> Optional[datetime]:
+        return self.updated_at + self.period if self.updated_at else None
+
+    def is_expired(self) -> bool:
+        return self.updated_at is None or datetime.now(timezone.utc) >= self.expires_at
+
+    def load(self, items_db: Dict[int, Item]):
+        """Reprend la rotation sauvegardée si elle est encore valable, sinon en tire une nouvelle"""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding='utf-8') as f:
+                    data = json.load(f)
+
+                timestamp = data.get("derniere_maj")
+                if timestamp:
+                    self.updated_at = datetime.fromisoformat(timestamp)
+                    item_ids = data.get("items_ids", [])
+                    self.items = [items_db[i] for i in item_ids if i in items_db]
+            except Exception as e:
+                print(f"Erreur lors du chargement des items du jour: {e}")
+
+        if self.is_expired():
+            self.rotate(items_db)
+
+    def rotate(self, items_db: Dict[int, Item]):
+        """Tire de nouveaux items du jour et sauvegarde la rotation"""
+        items_disponibles = list(items_db.values())
+        k = min(self.size, len(items_disponibles))
+        self.items = random.sample(items_disponibles, k=k) if k > 0 else []
+        self.updated_at = datetime.now(timezone.utc)
+        self.save()
+
+    def ensure_fresh(self, items_db: Dict[int, Item]):
+        """Filet de sécurité en mémoire si la tâche planifiée n'a pas encore tourné"""
+        if self.is_expired():
+            self.rotate(items_db)
+
+    def save(self):
+        """Sauvegarde les items du jour dans le fichier JSON"""
+        try:
+            data = {
+                'items_ids': [item.id for item in self.items],
+                'derniere_maj': self.updated_at.isoformat() if self.updated_at else None
+            }
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde des items du jour: {e}")
+
+    async def run(self, bot: 'HeroBot'):
+        """Tâche planifiée : dort jusqu'à l'échéance puis fait tourner la boutique"""
+        while True:
+            delay = (self.expires_at - datetime.now(timezone.utc)).total_seconds() if self.expires_at else 0
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.ensure_fresh(bot.items_db)
+
+# ========== CATALOGUE ==========
+
+CATALOG_FORMAT = 1  # À incrémenter si Hero, Item, ChestType ou les index changent de forme
+CATALOG_SOURCES = {"heroes": "heroes.json", "items": "items.json", "chests": "chests.json"}
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT", "catalogue.pickle")
+
+# Emplacements connus : ceux de EquipSlot et ceux réellement utilisés par les classes
+KNOWN_SLOTS = frozenset(slot.value for slot in EquipSlot) | frozenset(
+    slot for slots in EQUIPMENT_SLOTS_BY_CLASS.values() for slot in slots
+)
+
+def parse_hero_rarity(name: str) -> Optional[HeroRarity]:
+    return HeroRarity.__members__.get(strip_accents(name).upper())
+
+def parse_hero_class(name: str) -> Optional[HeroClass]:
+    """« Maître Méca », « MAITRE_MECA » et « général » désignent tous une classe connue"""
+    return HeroClass.__members__.get(strip_accents(name).upper().replace(" ", "_"))
+
+class CatalogError(Exception):
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__(f"{len(errors)} erreur(s) dans le catalogue")
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _check_fields(record, where: str, required: Dict[str, type], errors: List[str]) -> bool:
+    """Champs obligatoires présents et du bon type ; chaque problème est ajouté à errors"""
+    if not isinstance(record, dict):
+        errors.append(f"{where} : objet attendu")
+        return False
+    valid = True
+    for key, expected in required.items():
+        value = record.get(key)
+        if value is None:
+            errors.append(f"{where} : champ « {key} » manquant")
+            valid = False
+        elif not (_is_int(value) if expected is int else isinstance(value, expected)):
+            errors.append(f"{where} : « {key} » doit être de type {expected.__name__}")
+            valid = False
+    return valid
+
+class Catalog:
+    """Héros, items et coffres validés, avec tous leurs index dérivés.
+
+    Un catalogue est immuable une fois construit : le bot l'installe d'un bloc,
+    et une copie compilée (voir save_snapshot) se recharge en une seule lecture.
+    """
+
+    def __init__(self, heroes: Dict[int, Hero], items: Dict[int, Item], chests: Dict[str, ChestType],
+                 errors: List[str] = (), warnings: List[str] = ()):
+        self.heroes = heroes
+        self.items = items
+        self.chests = chests
+        self.errors = list(errors)
+        self.warnings = list(warnings)
+
+        self.items_by_rarity: Dict[ItemRarity, List[int]] = {}
+        self.items_by_class: Dict[HeroClass, List[int]] = {}
+        self.items_by_slot: Dict[str, List[int]] = {}
+        for item in items.values():
+            self.items_by_rarity.setdefault(item.rarity, []).append(item.id)
+            self.items_by_slot.setdefault(item.slot, []).append(item.id)
+            for hero_class in item.compatible_classes:
+                self.items_by_class.setdefault(hero_class, []).append(item.id)
+
+        self.heroes_by_rarity: Dict[HeroRarity, List[int]] = {}
+        self.heroes_by_class: Dict[HeroClass, List[int]] = {}
+        for hero in heroes.values():
+            self.heroes_by_rarity.setdefault(hero.rarity, []).append(hero.id)
+            self.heroes_by_class.setdefault(hero.hero_class, []).append(hero.id)
+
+        self.loot_tables = {name: LootTable(chest) for name, chest in chests.items()}
+        self.hero_names = NameIndex((hero.name, hero.id) for hero in heroes.values())
+        self.item_names = NameIndex((item.name, item.id) for item in items.values())
+        self.chest_names = NameIndex((chest.name, chest.name) for chest in chests.values())
+
+    # ---------- Compilation depuis le JSON ----------
+
+    @classmethod
+    def from_data(cls, heroes_data, items_data, chests_data) -> 'Catalog':
+        """Valide les enregistrements ; les invalides sont écartés et signalés dans errors"""
+        errors: List[str] = []
+        warnings: List[str] = []
+        items = cls._compile_items(items_data, errors, warnings)
+        heroes = cls._compile_heroes(heroes_data, items, errors, warnings)
+        chests = cls._compile_chests(chests_data, items, errors, warnings)
+        return cls(heroes, items, chests, errors, warnings)
+
+    @classmethod
+    def from_files(cls, directory: str = ".") -> 'Catalog':
+        data = {}
+        read_errors = []
+        for key, filename in CATALOG_SOURCES.items():
+            try:
+                with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+                    data[key] = json.load(f)
+            except FileNotFoundError:
+                read_errors.append(f"Fichier {filename} non trouvé")
+                data[key] = []
+            except json.JSONDecodeError as e:
+                read_errors.append(f"{filename} : JSON invalide ({e})")
+                data[key] = []
+        catalog = cls.from_data(data["heroes"], data["items"], data["chests"])
+        catalog.errors[:0] = read_errors
+        return catalog
+
+    @staticmethod
+    def _compile_items(data, errors: List[str], warnings: List[str]) -> Dict[int, Item]:
+        items: Dict[int, Item] = {}
+        if not isinstance(data, list):
+            errors.append("items.json : une liste d'items est attendue")
+            return items
+        required = {'id': int, 'name': str, 'rarity': str, 'compatible_classes': list,
+                    'image': str, 'price': int, 'stats': dict}
+        for position, record in enumerate(data):
+            where = f"items.json[{position}]"
+            if not _check_fields(record, where, required, errors):
+                continue
+            where = f"{where} (id {record['id']}, {record['name']})"
+            valid = True
+
+            rarity = parse_item_rarity(record['rarity'])
+            if rarity is None:
+                errors.append(f"{where} : rareté inconnue « {record['rarity']} »")
+                valid = False
+            classes = []
+            for class_name in record['compatible_classes']:
+                hero_class = parse_hero_class(class_name) if isinstance(class_name, str) else None
+                if hero_class is None:
+                    errors.append(f"{where} : classe inconnue « {class_name} »")
+                    valid = False
+                else:
+                    classes.append(hero_class)
+            if not record['compatible_classes']:
+                errors.append(f"{where} : aucune classe compatible")
+                valid = False
+            # Emplacement vide : item sans type, qui se place dans n'importe quel emplacement
+            slot = record.get('slot') or ''
+            if slot and slot not in KNOWN_SLOTS:
+                errors.append(f"{where} : emplacement inconnu « {slot} »")
+                valid = False
+            if record['price'] < 0:
+                errors.append(f"{where} : prix négatif")
+                valid = False
+            if not all(isinstance(value, (int, float)) for value in record['stats'].values()):
+                errors.append(f"{where} : les stats doivent être numériques")
+                valid = False
+            if record['id'] in items:
+                errors.append(f"{where} : id en double (déjà utilisé par « {items[record['id']].name} »)")
+            if not valid:
+                continue
+
+            if classes and not any(slot in EQUIPMENT_SLOTS_BY_CLASS[hero_class] for hero_class in classes):
+                warnings.append(f"{where} : aucune classe compatible n'a d'emplacement « {slot} »")
+            # Comme avant : en cas de doublon, le dernier enregistrement l'emporte
+            items[record['id']] = Item(
+                id=record['id'],
+                name=record['name'],
+                rarity=rarity,
+                compatible_classes=classes,
+                image=record['image'],
+                price=record['price'],
+                stats=record['stats'],
+                description=record.get('description', ''),
+                slot=slot
+            )
+        return items
+
+    @staticmethod
+    def _compile_heroes(data, items: Dict[int, Item], errors: List[str], warnings: List[str]) -> Dict[int, Hero]:
+        heroes: Dict[int, Hero] = {}
+        if not isinstance(data, list):
+            errors.append("heroes.json : une liste de héros est attendue")
+            return heroes
+        required = {'id': int, 'name': str, 'rarity': str, 'hero_class': str, 'image': str, 'price': int}
+        for position, record in enumerate(data):
+            where = f"heroes.json[{position}]"
+            if not _check_fields(record, where, required, errors):
+                continue
+            where = f"{where} (id {record['id']}, {record['name']})"
+            valid = True
+
+            rarity = parse_hero_rarity(record['rarity'])
+            if rarity is None:
+                errors.append(f"{where} : rareté inconnue « {record['rarity']} »")
+                valid = False
+            hero_class = parse_hero_class(record['hero_class'])
+            if hero_class is None:
+                errors.append(f"{where} : classe inconnue « {record['hero_class']} »")
+                valid = False
+            if record['price'] < 0:
+                errors.append(f"{where} : prix négatif")
+                valid = False
+            if record['id'] in heroes:
+                errors.append(f"{where} : id en double (déjà utilisé par « {heroes[record['id']].name} »)")
+            if not valid:
+                continue
+
+            equipped_items = record.get('equipped_items') or []
+            unknown = [item_id for item_id in equipped_items if item_id not in items]
+            if unknown:
+                warnings.append(f"{where} : équipement par défaut inconnu {unknown}")
+            heroes[record['id']] = Hero(
+                id=record['id'],
+                name=record['name'],
+                rarity=rarity,
+                hero_class=hero_class,
+                image=record['image'],
+                price=record['price'],
+                description=record.get('description', ''),
+                equipped_items=equipped_items,
+                color=record.get('color', '#5865F2')
+            )
+        return heroes
+
+    @staticmethod
+    def _compile_chests(data, items: Dict[int, Item], errors: List[str], warnings: List[str]) -> Dict[str, ChestType]:
+        chests: Dict[str, ChestType] = {}
+        if not isinstance(data, list):
+            errors.append("chests.json : une liste de coffres est attendue")
+            return chests
+        stocked = {item.rarity for item in items.values()}
+        required = {'name': str, 'rarity_distribution': dict, 'loot_amount': int, 'image': str, 'description': str}
+        for position, record in enumerate(data):
+            where = f"chests.json[{position}]"
+            if not _check_fields(record, where, required, errors):
+                continue
+            where = f"{where} ({record['name']})"
+            valid = True
+
+            distribution = record['rarity_distribution']
+            empty = []
+            for rarity_name, weight in distribution.items():
+                rarity = parse_item_rarity(rarity_name)
+                if rarity is None:
+                    errors.append(f"{where} : rareté inconnue « {rarity_name} »")
+                    valid = False
+                elif rarity not in stocked and weight:
+                    empty.append(rarity.display_name)
+                if not isinstance(weight, (int, float)) or isinstance(weight, bool) or weight < 0:
+                    errors.append(f"{where} : poids invalide pour « {rarity_name} »")
+                    valid = False
+            if valid and sum(distribution.values()) <= 0:
+                errors.append(f"{where} : distribution vide")
+                valid = False
+            if record['loot_amount'] < 1:
+                errors.append(f"{where} : loot_amount doit être au moins 1")
+                valid = False
+            price = record.get('price', 300)
+            if not _is_int(price) or price < 0:
+                errors.append(f"{where} : prix invalide")
+                valid = False
+            if record['name'] in chests:
+                errors.append(f"{where} : nom en double")
+            if not valid:
+                continue
+
+            if empty:
+                warnings.append(f"{where} : aucun item de rareté {', '.join(empty)} (tirages à vide)")
+
+            chests[record['name']] = ChestType(
+                name=record['name'],
+                rarity_distribution=distribution,
+                loot_amount=record['loot_amount'],
+                image=record['image'],
+                description=record['description'],
+                price=price,
+                color=record.get('color', '#5865F2'),
+                hidden=record.get('hidden', False)
+            )
+        return chests
+
+    # ---------- Instantané compilé ----------
+
+    def save_snapshot(self, path: str = CATALOG_SNAPSHOT_PATH, directory: str = "."):
+        """Écrit le catalogue compilé avec les empreintes des fichiers JSON dont il est issu"""
+        payload = {'format': CATALOG_FORMAT, 'sources': catalog_digests(directory), 'catalog': self}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_snapshot(cls, path: str = CATALOG_SNAPSHOT_PATH, directory: str = ".") -> Optional['Catalog']:
+        """Catalogue compilé s'il existe et correspond aux fichiers JSON actuels, sinon None"""
+        try:
+            with open(path, 'rb') as f:
+                payload = CatalogUnpickler(f).load()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Erreur lors de la lecture du catalogue compilé: {e}")
+            return None
+        if payload.get('format') != CATALOG_FORMAT or payload.get('sources') != catalog_digests(directory):
+            return None
+        return payload['catalog']
+
+def catalog_digests(directory: str = ".") -> Dict[str, Optional[str]]:
+    digests = {}
+    for filename in CATALOG_SOURCES.values():
+        try:
+            with open(os.path.join(directory, filename), 'rb') as f:
+                digests[filename] = hashlib.sha256(f.read()).hexdigest()
+        except FileNotFoundError:
+            digests[filename] = None
+    return digests
+
+def catalog_signature(directory: str = ".") -> tuple:
+    """Taille et date de modification des fichiers sources, pour détecter un changement sans les lire"""
+    signature = []
+    for filename in CATALOG_SOURCES.values():
+        try:
+            stat = os.stat(os.path.join(directory, filename))
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+class CatalogWatcher:
+    """Surveille les fichiers JSON du catalogue et déclenche un rechargement quand ils changent.
+
+    Un changement n'est pris en compte qu'une fois les fichiers stables pendant un
+    intervalle complet, pour ne pas recharger un fichier à moitié écrit.
+    """
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self.reload_count = 0
+        self.error_count = 0
+
+    async def run(self, bot: 'HeroBot'):
+        current = catalog_signature()
+        while True:
+            await asyncio.sleep(self.interval)
+            signature = catalog_signature()
+            if signature == current:
+                continue
+            await asyncio.sleep(self.interval)
+            if catalog_signature() != signature:
+                continue
+            current = signature
+            try:
+                catalog = await bot.reload_catalog()
+                self.reload_count += 1
+                print(f"🔄 Catalogue rechargé : {len(catalog.heroes)} héros, {len(catalog.items)} items, {len(catalog.chests)} coffres")
+            except CatalogError as e:
+                self.error_count += 1
+                print(f"Erreur lors du rechargement du catalogue: {e}")
+                for error in e.errors:
+                    print(f"  {error}")
+            except Exception as e:
+                self.error_count += 1
+                print(f"Erreur lors du rechargement du catalogue: {e}")
+
+class CatalogUnpickler(pickle.Unpickler):
+    """N'accepte que les classes du catalogue.
+
+    Les classes sont résolues dans ce module, qu'il ait été chargé comme « bot »
+    (compilateur, benchmarks) ou comme « __main__ » (python bot.py).
+    """
+
+    CLASSES = {'Catalog', 'Hero', 'Item', 'ChestType', 'LootTable', 'NameIndex',
+               'HeroRarity', 'ItemRarity', 'HeroClass'}
+    NUMPY = {('numpy.core.multiarray', '_reconstruct'), ('numpy._core.multiarray', '_reconstruct'),
+             ('numpy.core.numeric', '_frombuffer'), ('numpy._core.numeric', '_frombuffer'),
+             ('numpy', 'ndarray'), ('numpy', 'dtype')}
+
+    def find_class(self, module: str, name: str):
+        if module in ('bot', '__main__', __name__) and name in self.CLASSES:
+            return globals()[name]
+        if (module, name) in self.NUMPY:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"classe refusée dans le catalogue compilé: {module}.{name}")
+
+# ========== PERSISTANCE ==========
+
+PLAYERS_PATH = "players.json"
+USERNAMES_PATH = "usernames.json"
+
+def player_to_dict(player: PlayerData, power: Optional[int] = None) -> dict:
+    """Convertit un joueur en dict sérialisable en JSON (avec sa puissance si connue)"""
+    return {
+        'user_id': player.user_id,
+        'gold': player.gold,
+        'emblems': player.emblems,
+        'heroes': [
+            {
+                'hero_id': instance.hero_id,
+                'total_experience': instance.level.total_experience,
+                'loadout': list(instance.loadout)
+            }
+            for instance in player.heroes.values()
+        ],
+        'items': dict(player.items.items()),
+        'chests': dict(player.chests),
+        'last_daily_claim': player.last_daily_claim,
+        'power': power
+    }
+
+def player_from_dict(player_data: dict) -> PlayerData:
+    """Reconstruit un joueur depuis sa forme JSON"""
+    heroes = {}
+    # Ancien format : liste d'ids + dict hero_levels séparé, équipement sur le catalogue
+    legacy_levels = player_data.get('hero_levels', {})
+    for hero_data in player_data['heroes']:
+        if isinstance(hero_data, int):
+            level_data = legacy_levels.get(str(hero_data)) or legacy_levels.get(hero_data)
+            level = HeroLevel.from_progress(level_data['level'], level_data['experience']) if level_data else HeroLevel()
+            heroes[hero_data] = HeroInstance(hero_data, level=level)
+        else:
+            if 'total_experience' in hero_data:
+                level = HeroLevel(hero_data['total_experience'])
+            else:
+                # Format (niveau, XP, XP max) d'avant la table cumulée
+                level = HeroLevel.from_progress(hero_data['level'], hero_data['experience'])
+            heroes[hero_data['hero_id']] = HeroInstance(
+                hero_data['hero_id'],
+                level=level,
+                loadout=list(hero_data.get('loadout', []))
+            )
+    # Inventaire en {id: nombre} ; l'ancien format est une liste avec un id par exemplaire
+    items = player_data['items']
+    if isinstance(items, dict):
+        items = Counter({int(item_id): count for item_id, count in items.items()})
+    return PlayerData(
+        user_id=player_data['user_id'],
+        gold=player_data['gold'],
+        emblems=player_data.get('emblems', 0),
+        heroes=heroes,
+        items=items,
+        chests=player_data.get('chests', {}),
+        last_daily_claim=player_data.get('last_daily_claim', None)
+    )
+
+class StorageBackend:
+    """Interface commune des stockages de joueurs.
+
+    write_players est appelé depuis un thread d'écriture (jamais deux à la fois)
+    avec des dicts déjà détachés des objets PlayerData vivants.
+    """
+
+    def load_players(self) -> Dict[int, PlayerData]:
+        raise NotImplementedError
+
+    def load_index(self) -> Dict[int, Optional[int]]:
+        """Prépare l'accès par joueur : {user_id: puissance stockée, None si inconnue}"""
+        raise NotImplementedError
+
+    def load_player(self, user_id: int) -> Optional[PlayerData]:
+        """Charge un seul profil (appelé sur la boucle, doit rester rapide)"""
+        raise NotImplementedError
+
+    def write_players(self, rows: List[dict]):
+        raise NotImplementedError
+
+    def load_usernames(self) -> Dict[int, tuple]:
+        """Cache des pseudos : {user_id: (pseudo, expiration en timestamp)}"""
+        return {}
+
+    def write_usernames(self, entries: Dict[int, tuple]):
+        pass
+
+    # Stockages événementiels (LedgerStorage) : journal au lieu de réécrire les joueurs
+    records_events = False
+
+    def close(self):
+        pass
+
+class JsonStorage(StorageBackend):
+    """Stockage historique : un seul document players.json"""
+
+    def __init__(self, path: str = PLAYERS_PATH, usernames_path: str = USERNAMES_PATH):
+        self.path = path
+        self.usernames_path = usernames_path
+        self._serialized: Dict[int, str] = {}  # JSON déjà sérialisé par joueur
+
+    def load_players(self) -> Dict[int, PlayerData]:
+        players = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            players_data = json.load(f)
+        for player_data in players_data:
+            player = player_from_dict(player_data)
+            players[player.user_id] = player
+            self._serialized[player.user_id] = json.dumps(player_data, ensure_ascii=False)
+        return players
+
+    def _load_rows(self, rows: List[dict]) -> Dict[int, Optional[int]]:
+        powers = {}
+        for row in rows:
+            self._serialized[row['user_id']] = json.dumps(row, ensure_ascii=False)
+            powers[row['user_id']] = row.get('power')
+        return powers
+
+    def load_index(self) -> Dict[int, Optional[int]]:
+        # Le document reste unique : les profils sont gardés sérialisés, et désérialisés à la demande
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return self._load_rows(json.load(f))
+
+    def load_player(self, user_id: int) -> Optional[PlayerData]:
+        serialized = self._serialized.get(user_id)
+        return player_from_dict(json.loads(serialized)) if serialized is not None else None
+
+    def update_rows(self, rows: List[dict]):
+        """Remplace la forme sérialisée des joueurs modifiés"""
+        for row in rows:
+            self._serialized[row['user_id']] = json.dumps(row, ensure_ascii=False)
+
+    def write_players(self, rows: List[dict]):
+        # Seuls les joueurs modifiés sont re-sérialisés, le document est ensuite réécrit
+        self.update_rows(rows)
+
+        # Écriture atomique (fichier temporaire puis remplacement)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("[\n")
+            f.write(",\n".join(list(self._serialized.values())))
+            f.write("\n]\n")
+        os.replace(tmp_path, self.path)
+
+    def load_usernames(self) -> Dict[int, tuple]:
+        if not os.path.exists(self.usernames_path):
+            return {}
+        with open(self.usernames_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return {int(user_id): (entry['name'], entry['expires']) for user_id, entry in data.items()}
+
+    def write_usernames(self, entries: Dict[int, tuple]):
+        data = {str(user_id): {'name': name, 'expires': expires} for user_id, (name, expires) in entries.items()}
+        tmp_path = f"{self.usernames_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.usernames_path)
+
+class SQLiteStorage(StorageBackend):
+    """Stockage SQLite en mode WAL : une écriture ne touche que les lignes du joueur concerné"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS players (
+            user_id INTEGER PRIMARY KEY,
+            gold INTEGER NOT NULL,
+            emblems INTEGER NOT NULL DEFAULT 0,
+            last_daily_claim TEXT,
+            power INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS player_heroes (
+            user_id INTEGER NOT NULL,
+            hero_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, hero_id)
+        );
+        CREATE TABLE IF NOT EXISTS player_items (
+            user_id INTEGER NOT NULL,
+            item_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (user_id, item_id)
+        );
+        CREATE TABLE IF NOT EXISTS player_chests (
+            user_id INTEGER NOT NULL,
+            chest_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (user_id, chest_name)
+        );
+        CREATE TABLE IF NOT EXISTS hero_levels (
+            user_id INTEGER NOT NULL,
+            hero_id INTEGER NOT NULL,
+            total_experience INTEGER NOT NULL,
+            PRIMARY KEY (user_id, hero_id)
+        );
+        CREATE TABLE IF NOT EXISTS hero_loadouts (
+            user_id INTEGER NOT NULL,
+            hero_id INTEGER NOT NULL,
+            slot_index INTEGER NOT NULL,
+            item_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, hero_id, slot_index)
+        );
+        CREATE TABLE IF NOT EXISTS usernames (
+            user_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            expires REAL NOT NULL
+        );
+    """
+
+    CHILD_TABLES = ("player_heroes", "player_items", "player_chests", "hero_levels", "hero_loadouts")
+
+    def __init__(self, path: str = "players.db"):
+        self.path = path
+        # La connexion est partagée avec le thread d'écriture (un seul à la fois)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        # Bases créées avant le stockage de la puissance
+        if "power" not in {column[1] for column in self.conn.execute("PRAGMA table_info(players)")}:
+            self.conn.execute("ALTER TABLE players ADD COLUMN power INTEGER")
+            self.conn.commit()
+        # Bases créées avant la table d'XP cumulée : (niveau, XP, XP max) -> XP totale
+        if "total_experience" not in {column[1] for column in self.conn.execute("PRAGMA table_info(hero_levels)")}:
+            self._migrate_hero_levels()
+        # Lectures à la demande depuis la boucle ; le WAL les laisse avancer pendant une écriture
+        self.reader = sqlite3.connect(path, check_same_thread=False)
+
+    def _migrate_hero_levels(self):
+        rows = [
+            (user_id, hero_id, HeroLevel.from_progress(level, experience).total_experience)
+            for user_id, hero_id, level, experience in self.conn.execute(
+                "SELECT user_id, hero_id, level, experience FROM hero_levels")
+        ]
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.execute("DROP TABLE hero_levels")
+            self.conn.execute("""
+                CREATE TABLE hero_levels (
+                    user_id INTEGER NOT NULL,
+                    hero_id INTEGER NOT NULL,
+                    total_experience INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, hero_id)
+                )""")
+            self.conn.executemany("INSERT INTO hero_levels (user_id, hero_id, total_experience) VALUES (?, ?, ?)", rows)
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def _select_players(self, where: str = "", params: tuple = ()) -> Dict[int, PlayerData]:
+        players = {}
+        conn = self.reader
+        for user_id, gold, emblems, last_daily_claim in conn.execute(
+                f"SELECT user_id, gold, emblems, last_daily_claim FROM players {where}", params):
+            players[user_id] = PlayerData(user_id, gold=gold, emblems=emblems, last_daily_claim=last_daily_claim)
+
+        for user_id, hero_id in conn.execute(f"SELECT user_id, hero_id FROM player_heroes {where}", params):
+            if user_id in players:
+                players[user_id].heroes[hero_id] = HeroInstance(hero_id)
+        for user_id, item_id, quantity in conn.execute(
+                f"SELECT user_id, item_id, quantity FROM player_items {where}", params):
+            if user_id in players:
+                players[user_id].items.add(item_id, quantity)
+        for user_id, chest_name, quantity in conn.execute(
+                f"SELECT user_id, chest_name, quantity FROM player_chests {where}", params):
+            if user_id in players:
+                players[user_id].add_chests(chest_name, quantity)
+        for user_id, hero_id, total_experience in conn.execute(
+                f"SELECT user_id, hero_id, total_experience FROM hero_levels {where}", params):
+            instance = players[user_id].heroes.get(hero_id) if user_id in players else None
+            if instance is not None:
+                instance.level = HeroLevel(total_experience)
+        for user_id, hero_id, slot_index, item_id in conn.execute(
+                f"SELECT user_id, hero_id, slot_index, item_id FROM hero_loadouts {where}", params):
+            instance = players[user_id].heroes.get(hero_id) if user_id in players else None
+            if instance is not None:
+                # La taille définitive est fixée par la classe du héros (HeroBot.fit_loadouts)
+                instance.fit_loadout(slot_index + 1)
+                instance.loadout[slot_index] = item_id
+        return players
+
+    def load_players(self) -> Dict[int, PlayerData]:
+        return self._select_players()
+
+    def load_index(self) -> Dict[int, Optional[int]]:
+        return dict(self.reader.execute("SELECT user_id, power FROM players"))
+
+    def load_player(self, user_id: int) -> Optional[PlayerData]:
+        return self._select_players("WHERE user_id = ?", (user_id,)).get(user_id)
+
+    def write_players(self, rows: List[dict]):
+        with self.conn:  # Une transaction par lot
+            for row in rows:
+                self._upsert_player(row)
+
+    def _upsert_player(self, row: dict):
+        user_id = row['user_id']
+        self.conn.execute(
+            """INSERT INTO players (user_id, gold, emblems, last_daily_claim, power) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(user_id) DO UPDATE SET
+                   gold = excluded.gold,
+                   emblems = excluded.emblems,
+                   last_daily_claim = excluded.last_daily_claim,
+                   power = excluded.power""",
+            (user_id, row['gold'], row['emblems'], row['last_daily_claim'], row.get('power'))
+        )
+
+        # Les tables filles du joueur sont remplacées ; les autres joueurs ne sont pas touchés
+        for table in self.CHILD_TABLES:
+            self.conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+        self.conn.executemany(
+            "INSERT INTO player_heroes (user_id, hero_id) VALUES (?, ?)",
+            [(user_id, hero['hero_id']) for hero in row['heroes']]
+        )
+        self.conn.executemany(
+            "INSERT INTO player_items (user_id, item_id, quantity) VALUES (?, ?, ?)",
+            [(user_id, item_id, count) for item_id, count in Counter(row['items']).items()]
+        )
+        self.conn.executemany(
+            "INSERT INTO player_chests (user_id, chest_name, quantity) VALUES (?, ?, ?)",
+            [(user_id, chest_name, count) for chest_name, count in Counter(row['chests']).items()]
+        )
+        self.conn.executemany(
+            "INSERT INTO hero_levels (user_id, hero_id, total_experience) VALUES (?, ?, ?)",
+            [(user_id, hero['hero_id'], hero['total_experience']) for hero in row['heroes']]
+        )
+        self.conn.executemany(
+            "INSERT INTO hero_loadouts (user_id, hero_id, slot_index, item_id) VALUES (?, ?, ?, ?)",
+            [
+                (user_id, hero['hero_id'], slot_index, item_id)
+                for hero in row['heroes']
+                for slot_index, item_id in enumerate(hero['loadout']) if item_id is not None
+            ]
+        )
+
+    def load_usernames(self) -> Dict[int, tuple]:
+        return {
+            user_id: (name, expires)
+            for user_id, name, expires in self.conn.execute("SELECT user_id, name, expires FROM usernames")
+        }
+
+    def write_usernames(self, entries: Dict[int, tuple]):
+        # Le cache est borné : la table reflète exactement son contenu
+        with self.conn:
+            self.conn.execute("DELETE FROM usernames")
+            self.conn.executemany(
+                "INSERT INTO usernames (user_id, name, expires) VALUES (?, ?, ?)",
+                [(user_id, name, expires) for user_id, (name, expires) in entries.items()]
+            )
+
+    def close(self):
+        self.reader.close()
+        self.conn.close()
+
+def diff_player_events(before: PlayerData, after: PlayerData) -> List[dict]:
+    """Événements économiques qui font passer un joueur de `before` à `after`"""
+    events = []
+
+    def event(kind: str, **data):
+        events.append({'type': kind, 'user_id': after.user_id, **data})
+
+    if after.gold != before.gold:
+        event('gold', delta=after.gold - before.gold)
+    if after.emblems != before.emblems:
+        event('emblems', delta=after.emblems - before.emblems)
+
+    items_before, items_after = before.items.counter(), after.items.counter()
+    granted = list((items_after - items_before).elements())
+    removed = list((items_before - items_after).elements())
+    if granted:
+        event('item_grant', item_ids=granted)
+    if removed:
+        event('item_removed', item_ids=removed)
+
+    chests_before, chests_after = before.chests, after.chests
+    granted = list((chests_after - chests_before).elements())
+    consumed = list((chests_before - chests_after).elements())
+    if granted:
+        event('chest_grant', names=granted)
+    if consumed:
+        event('chest_consumed', names=consumed)
+
+    for hero_id, instance in after.heroes.items():
+        previous = before.heroes.get(hero_id)
+        if previous is None:
+            event('hero_bought', hero_id=hero_id)
+        if previous is None or previous.level != instance.level:
+            event('hero_level', hero_id=hero_id, total_experience=instance.level.total_experience)
+        if (previous.loadout if previous else []) != instance.loadout:
+            event('loadout', hero_id=hero_id, loadout=list(instance.loadout))
+    for hero_id in before.heroes.keys() - after.heroes.keys():
+        event('hero_removed', hero_id=hero_id)
+
+    if after.last_daily_claim != before.last_daily_claim:
+        event('daily_claim', at=after.last_daily_claim)
+    return events
+
+def apply_ledger_event(players: Dict[int, PlayerData], event: dict):
+    """Rejoue un événement du journal sur l'état des joueurs"""
+    user_id = event['user_id']
+    player = players.get(user_id)
+    if player is None:
+        player = players[user_id] = PlayerData(user_id)
+
+    kind = event['type']
+    if kind == 'gold':
+        player.gold += event['delta']
+    elif kind == 'emblems':
+        player.emblems += event['delta']
+    elif kind == 'item_grant':
+        player.add_items(event['item_ids'])
+    elif kind == 'item_removed':
+        for item_id, count in Counter(event['item_ids']).items():
+            player.remove_item(item_id, count)
+    elif kind == 'chest_grant':
+        for name, count in Counter(event['names']).items():
+            player.add_chests(name, count)
+    elif kind == 'chest_consumed':
+        for name, count in Counter(event['names']).items():
+            player.remove_chests(name, count)
+    elif kind == 'hero_bought':
+        player.heroes[event['hero_id']] = HeroInstance(event['hero_id'])
+    elif kind == 'hero_level':
+        instance = player.heroes[event['hero_id']]
+        if 'total_experience' in event:
+            instance.level = HeroLevel(event['total_experience'])
+        else:
+            # Événements écrits avant la table d'XP cumulée
+            instance.level = HeroLevel.from_progress(event['level'], event['experience'])
+        instance.invalidate()
+    elif kind == 'loadout':
+        instance = player.heroes[event['hero_id']]
+        instance.loadout = list(event['loadout'])
+        instance.invalidate()
+    elif kind == 'hero_removed':
+        player.heroes.pop(event['hero_id'], None)
+    elif kind == 'daily_claim':
+        player.last_daily_claim = event['at']
+    else:
+        raise ValueError(f"type d'événement inconnu: {kind}")
+
+class LedgerLockedError(Exception):
+    """Le journal est déjà tenu par un autre processus (bot en marche ou retour arrière)"""
+
+class LedgerStorage(JsonStorage):
+    """Journal append-only des événements économiques, avec instantanés compactés.
+
+    Chaque écriture ajoute seulement les nouveaux événements à events.jsonl
+    (un fsync par lot). Tous les `snapshot_every` événements, l'état complet
+    est écrit dans snapshot.json et le journal courant est archivé ; au
+    démarrage on recharge l'instantané puis on rejoue la fin du journal.
+    Les archives restent disponibles pour l'audit et le retour arrière ; un
+    retour arrière est noté dans annulations.jsonl, et les événements qu'il
+    annule ne sont plus jamais rejoués.
+    """
+
+    records_events = True
+
+    def __init__(self, directory: str = "ledger", snapshot_every: int = 5000,
+                 bootstrap_path: str = PLAYERS_PATH, usernames_path: str = USERNAMES_PATH):
+        super().__init__(bootstrap_path, usernames_path)
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.events_path = os.path.join(directory, "events.jsonl")
+        # Hors du motif events.* : jamais relu comme une archive
+        self.corrupt_path = os.path.join(directory, "events-corrompus.jsonl")
+        self.rollbacks_path = os.path.join(directory, "annulations.jsonl")
+        self.lock_path = os.path.join(directory, "verrou")
+        self._lock_file = None
+        self.snapshot_every = snapshot_every
+        self._events_file = None
+        os.makedirs(directory, exist_ok=True)
+
+        self.seq = 0                   # Dernier numéro d'événement attribué
+        self.snapshot_seq = 0          # Numéro couvert par le dernier instantané
+        self.events_since_snapshot = 0
+
+        # Métriques
+        self.appended_events = 0
+        self.snapshot_count = 0
+        self.replayed_events = 0
+        self.replay_errors = 0
+        self.replay_ms = 0.0
+        self.repaired_bytes = 0
+
+    def next_seq(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def _archive_paths(self) -> List[str]:
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith("events.") and name != "events.jsonl")
+        return [os.path.join(self.directory, name) for name in names]
+
+    def acquire_lock(self) -> bool:
+        """Réserve le journal à ce processus (bot en marche ou retour arrière) ; False s'il est déjà pris.
+
+        Le verrou est libéré par close() ou par la fin du processus, même brutale.
+        """
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def undone_ranges(self) -> List[tuple]:
+        """Retours arrière enregistrés : (until_seq, seq), les événements entre les deux sont annulés"""
+        if not os.path.exists(self.rollbacks_path):
+            return []
+        with open(self.rollbacks_path, 'r', encoding='utf-8') as f:
+            return [(entry['until_seq'], entry['seq']) for entry in map(json.loads, f)]
+
+    @staticmethod
+    def is_undone(seq: int, ranges: List[tuple]) -> bool:
+        return any(until_seq < seq < rollback_seq for until_seq, rollback_seq in ranges)
+
+    def iter_events(self, include_undone: bool = False):
+        """Tous les événements encore sur disque (archives puis journal courant), dans l'ordre"""
+        ranges = [] if include_undone else self.undone_ranges()
+        for path in self._archive_paths() + [self.events_path]:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Dernière ligne tronquée par un arrêt brutal : le lot n'a pas été validé
+                        # (repair_journal l'écarte au démarrage)
+                        break
+                    if not self.is_undone(event['seq'], ranges):
+                        yield event
+
+    def repair_journal(self) -> int:
+        """Coupe le journal courant après sa dernière ligne valide.
+
+        Une ligne tronquée par un arrêt brutal, et tout ce qui la suit, part dans
+        events-corrompus.jsonl : les prochains événements ne sont plus collés au
+        morceau invalide. Renvoie le plus grand numéro lisible dans la partie écartée.
+        """
+        if not os.path.exists(self.events_path):
+            return 0
+        with open(self.events_path, 'rb') as f:
+            data = f.read()
+        valid_end = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            valid_end += len(line)
+        if valid_end == len(data):
+            return 0
+
+        tail = data[valid_end:]
+        with open(self.corrupt_path, 'ab') as f:
+            f.write(tail if tail.endswith(b"\n") else tail + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.events_path, 'r+b') as f:
+            f.truncate(valid_end)
+            os.fsync(f.fileno())
+        self.repaired_bytes += len(tail)
+        print(f"⚠️ Journal tronqué : {len(tail)} octets déplacés dans {self.corrupt_path}")
+
+        highest = 0
+        for line in tail.splitlines():
+            try:
+                highest = max(highest, int(json.loads(line)['seq']))
+            except (ValueError, KeyError, TypeError):
+                pass
+        return highest
+
+    def _load_base(self, until_seq: Optional[int] = None) -> tuple:
+        """État de départ du rejeu (instantané s'il est assez ancien, sinon players.json) : (numéro, puissances)"""
+        self._serialized.clear()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Un instantané pris avant un retour arrière contient des événements annulés
+            if (until_seq is None or data['seq'] <= until_seq) and not self.is_undone(data['seq'], self.undone_ranges()):
+                return data['seq'], self._load_rows(data['players'])
+        if os.path.exists(self.path):
+            # Première mise en service : on part de l'ancien players.json
+            return 0, JsonStorage.load_index(self)
+        return 0, {}
+
+    def replay(self, until_seq: Optional[int] = None) -> Dict[int, Optional[int]]:
+        """Reconstruit l'état des joueurs à partir de l'instantané et du journal.
+
+        Seuls les joueurs présents dans la fin du journal sont désérialisés ;
+        leur puissance stockée est invalidée (None).
+        """
+        start = time.perf_counter()
+        # Rejeu complet (démarrage) : le journal est réparé avant d'y ajouter quoi que ce soit,
+        # ce qui demande d'en être le seul écrivain
+        if until_seq is None and not self.acquire_lock():
+            raise LedgerLockedError(f"{self.directory} est déjà utilisé par un autre processus (bot ou retour arrière)")
+        discarded_seq = self.repair_journal() if until_seq is None else 0
+        base_seq, powers = self._load_base(until_seq)
+        touched: Dict[int, PlayerData] = {}
+        replayed = errors = 0
+        last_seq = base_seq
+        for event in self.iter_events():
+            if event['seq'] <= base_seq:
+                continue
+            if until_seq is not None and event['seq'] > until_seq:
+                break
+            user_id = event['user_id']
+            if user_id not in touched:
+                touched[user_id] = self.load_player(user_id) or PlayerData(user_id)
+            try:
+                apply_ledger_event(touched, event)
+            except (KeyError, ValueError) as e:
+                if until_seq is not None:
+                    # Retour arrière : un état partiellement rejoué ne doit jamais devenir l'instantané
+                    raise ValueError(f"événement {event['seq']} impossible à rejouer: {e}") from e
+                errors += 1
+                print(f"Erreur lors du rejeu de l'événement {event['seq']}: {e}")
+            replayed += 1
+            last_seq = event['seq']
+        self.update_rows([player_to_dict(player) for player in touched.values()])
+        powers.update(dict.fromkeys(touched))
+
+        if until_seq is None:
+            self.snapshot_seq = base_seq
+            # Jamais de numéro réutilisé, même s'il n'apparaît que dans la partie écartée ou annulée
+            self.seq = max([last_seq, discarded_seq] + [seq for _, seq in self.undone_ranges()])
+            self.events_since_snapshot = replayed
+            self.replayed_events = replayed
+            self.replay_errors = errors
+            self.replay_ms = (time.perf_counter() - start) * 1000
+        return powers
+
+    def load_index(self) -> Dict[int, Optional[int]]:
+        return self.replay()
+
+    def load_players(self) -> Dict[int, PlayerData]:
+        return {user_id: self.load_player(user_id) for user_id in self.replay()}
+
+    def rollback(self, until_seq: int) -> int:
+        """Revient à l'état au n° `until_seq` ; renvoie le nombre de joueurs connus à ce moment.
+
+        Le retour arrière prend son propre numéro : il est d'abord noté dans
+        annulations.jsonl, puis un instantané est écrit à ce numéro. Les
+        événements annulés restent archivés pour l'audit mais ne sont plus
+        rejoués, même par un retour arrière plus ancien.
+        """
+        self.replay()
+        if not 0 <= until_seq < self.seq:
+            raise ValueError(f"n° {until_seq} hors du journal (dernier n° : {self.seq})")
+        powers = self.replay(until_seq)  # Lève ValueError si un événement ne se rejoue pas
+        seq = self.next_seq()
+        with open(self.rollbacks_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'until_seq': until_seq, 'seq': seq}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.write_snapshot(seq)
+        return len(powers)
+
+    def snapshot_due(self, incoming: int = 0) -> bool:
+        return self.events_since_snapshot + incoming >= self.snapshot_every
+
+    def append_events(self, events: List[dict]):
+        """Ajoute un lot d'événements au journal, un seul fsync pour tout le lot"""
+        if self._events_file is None:
+            self._events_file = open(self.events_path, 'a', encoding='utf-8')
+        offset = os.fstat(self._events_file.fileno()).st_size  # Le fichier est vidé après chaque lot
+        try:
+            self._events_file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+            self._events_file.flush()
+            os.fsync(self._events_file.fileno())
+        except BaseException:
+            # Lot non validé : on retire ce qui a pu être écrit pour ne pas laisser de ligne tronquée
+            self._events_file.close()
+            self._events_file = None
+            with open(self.events_path, 'r+b') as f:
+                f.truncate(offset)
+            raise
+        self.appended_events += len(events)
+        self.events_since_snapshot += len(events)
+
+    def write_snapshot(self, seq: int, rows: List[dict] = ()):
+        """Écrit l'état complet au numéro `seq` puis archive le journal qu'il recouvre"""
+        self.update_rows(rows)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f'{{"seq": {seq}, "players": [\n')
+            f.write(",\n".join(list(self._serialized.values())))
+            f.write("\n]}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # Les événements archivés sont tous <= seq : ignorés au rejeu, conservés pour l'audit
+        if self._events_file is not None:
+            self._events_file.close()
+            self._events_file = None
+        if os.path.exists(self.events_path):
+            os.replace(self.events_path, os.path.join(self.directory, f"events.{seq:012d}.jsonl"))
+        self.snapshot_seq = seq
+        self.events_since_snapshot = 0
+        self.snapshot_count += 1
+
+    def write_players(self, rows: List[dict]):
+        # Appelé avec l'état complet (save_data, import) : équivaut à un instantané
+        self.write_snapshot(self.seq, rows)
+
+    def close(self):
+        if self._events_file is not None:
+            self._events_file.close()
+            self._events_file = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+def create_storage() -> StorageBackend:
+    """Choisit le stockage selon la variable d'environnement STORAGE_BACKEND (json, sqlite ou ledger)"""
+    backend = os.getenv("STORAGE_BACKEND", "json").lower()
+    if backend == "sqlite":
+        return SQLiteStorage(os.getenv("SQLITE_PATH", "players.db"))
+    if backend == "ledger":
+        return LedgerStorage(os.getenv("LEDGER_DIR", "ledger"), int(os.getenv("LEDGER_SNAPSHOT_EVERY", "5000")))
+    return JsonStorage(PLAYERS_PATH)
+
+def import_players_json(storage: StorageBackend, json_path: str = PLAYERS_PATH) -> int:
+    """Importe en une fois un players.json existant dans le stockage donné"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        players_data = json.load(f)
+    rows = [player_to_dict(player_from_dict(player_data)) for player_data in players_data]
+    storage.write_players(rows)
+    return len(rows)
+
+class WriteBehindSaver:
+    """Persistance différée des joueurs.
+
+    Les commandes marquent les joueurs modifiés comme « sales » au lieu de
+    réécrire tout le stockage. Une tâche de fond regroupe ces modifications et
+    les écrit périodiquement depuis un thread, hors de la boucle d'événements.
+    """
+
+    def __init__(self, bot: 'HeroBot', storage: StorageBackend, interval: float = 2.0, max_pending: int = 500):
+        self.bot = bot
+        self.storage = storage
+        self.interval = interval          # Délai max entre deux écritures groupées (s)
+        self.max_pending = max_pending    # Au-delà, on force une écriture anticipée
+        self.dirty: set = set()
+        # Joueurs du lot en cours d'écriture : encore épinglés en mémoire jusqu'à la fin de l'écriture
+        self.inflight: set = set()
+        self.pending_events: List[dict] = []  # Uniquement pour un stockage événementiel
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # Métriques
+        self.flush_count = 0
+        self.error_count = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.last_batch_size = 0
+        self.max_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.pending_events) if self.storage.records_events else len(self.dirty)
+
+    @property
+    def avg_flush_ms(self) -> float:
+        return self.total_flush_ms / self.flush_count if self.flush_count else 0.0
+
+    def mark_dirty(self, user_id: int):
+        self.dirty.add(user_id)
+        self.max_queue_depth = max(self.max_queue_depth, len(self.dirty))
+        if len(self.dirty) >= self.max_pending:
+            self._wakeup.set()
+
+    def record(self, events: List[dict]):
+        """Met en file des événements économiques, numérotés dans l'ordre de validation"""
+        now = time.time()
+        for event in events:
+            event['seq'] = self.storage.next_seq()
+            event['ts'] = now
+        self.pending_events.extend(events)
+        self.max_queue_depth = max(self.max_queue_depth, len(self.pending_events))
+        if len(self.pending_events) >= self.max_pending:
+            self._wakeup.set()
+
+    def start(self):
+        """Démarre la tâche d'écriture en arrière-plan"""
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break  # stop() fait la dernière écriture
+            await self.flush()
+
+    async def _await_write(self, future):
+        """Attend une écriture lancée dans le thread d'écriture, jusqu'à son terme.
+
+        Si la tâche est annulée entre-temps, le thread continue d'écrire : on attend
+        quand même sa fin (deux écritures ne touchent jamais en même temps le même
+        fichier ou la même connexion), on rend son résultat ou son erreur pour que le
+        lot soit traité normalement, et l'annulation est relancée à l'attente suivante.
+        """
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            while not future.done():
+                try:
+                    await asyncio.wait([future])
+                except asyncio.CancelledError:
+                    pass
+            asyncio.current_task().cancel()
+            return future.result()
+
+    def _write(self, rows: List[dict], usernames: Optional[Dict[int, tuple]]):
+        """Exécuté dans le thread d'écriture"""
+        if rows:
+            self.storage.write_players(rows)
+        if usernames is not None:
+            self.storage.write_usernames(usernames)
+
+    def _write_events(self, events: List[dict], rows: List[dict], snapshot_seq: Optional[int],
+                      usernames: Optional[Dict[int, tuple]]):
+        """Exécuté dans le thread d'écriture : journal d'abord, instantané ensuite"""
+        if events:
+            self.storage.append_events(events)
+        # Forme sérialisée à jour, pour recharger un profil évincé sans rejouer le journal
+        self.storage.update_rows(rows)
+        if snapshot_seq is not None:
+            self.storage.write_snapshot(snapshot_seq)
+        if usernames is not None:
+            self.storage.write_usernames(usernames)
+
+    async def _flush_events(self, usernames: Optional[Dict[int, tuple]]) -> int:
+        """Écriture en mode journal : O(événements), plus un instantané périodique"""
+        events, self.pending_events = self.pending_events, []
+        batch, self.dirty = self.dirty, set()
+        rows = [self.bot.player_row(user_id) for user_id in batch if user_id in self.bot.players]
+        # Numéro pris sur la boucle : l'instantané couvre exactement les événements déjà numérotés
+        snapshot_seq = self.storage.seq if self.storage.snapshot_due(len(events)) else None
+        if not events and not rows and snapshot_seq is None and usernames is None:
+            return 0
+        self.inflight = batch
+        try:
+            await self._await_write(asyncio.get_running_loop().run_in_executor(
+                None, self._write_events, events, rows, snapshot_seq, usernames
+            ))
+        except Exception:
+            # Les événements non écrits repassent en tête de file
+            self.pending_events[:0] = events
+            self.dirty |= batch
+            raise
+        finally:
+            self.inflight = set()
+        return len(events)
+
+    async def flush(self):
+        """Écrit tous les joueurs en attente en une seule opération groupée"""
+        async with self._lock:
+            usernames = self.bot.usernames.take_snapshot()
+            if self.storage.records_events:
+                start = time.perf_counter()
+                try:
+                    batch_size = await self._flush_events(usernames)
+                except Exception as e:
+                    if usernames is not None:
+                        self.bot.usernames.dirty = True
+                    self.error_count += 1
+                    print(f"Erreur lors de l'écriture du journal: {e}")
+                    return
+                if batch_size:
+                    self._record_flush(batch_size, start)
+                self.bot.evict_cold_players()
+                return
+
+            if not self.dirty and usernames is None:
+                self.bot.evict_cold_players()
+                return
+            start = time.perf_counter()
+            batch, self.dirty = self.dirty, set()
+
+            # Copie de l'état sur la boucle : le thread d'écriture ne voit jamais d'objet vivant
+            rows = [self.bot.player_row(user_id) for user_id in batch if user_id in self.bot.players]
+
+            self.inflight = batch
+            try:
+                await self._await_write(asyncio.get_running_loop().run_in_executor(None, self._write, rows, usernames))
+            except Exception as e:
+                # On remet les joueurs en file pour la prochaine tentative
+                self.dirty |= batch
+                if usernames is not None:
+                    self.bot.usernames.dirty = True
+                self.error_count += 1
+                print(f"Erreur lors de la sauvegarde différée: {e}")
+                return
+            finally:
+                self.inflight = set()
+
+            if batch:
+                self._record_flush(len(batch), start)
+            # Les profils froids maintenant écrits peuvent quitter la mémoire
+            self.bot.evict_cold_players()
+
+    def _record_flush(self, batch_size: int, start: float):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.flush_count += 1
+        self.last_batch_size = batch_size
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+        self.bot.metrics.observe_save("differee", elapsed_ms / 1000)
+
+    async def stop(self):
+        """Arrête la tâche de fond une fois son écriture en cours terminée, puis vide la file (arrêt du bot)"""
+        if self._task is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+class PlayerCache:
+    """Profils joueurs en mémoire : LRU borné au-dessus du stockage.
+
+    Seuls les joueurs actifs sont matérialisés. Au-delà de `max_size`, les
+    profils les moins récemment utilisés sont évincés, sauf ceux qui ont des
+    modifications pas encore écrites ou une transaction en cours : ils
+    attendent la prochaine écriture groupée.
+    """
+
+    def __init__(self, max_size: int = 5000):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def __getitem__(self, user_id: int) -> PlayerData:
+        return self._entries[user_id]
+
+    def get(self, user_id: int) -> Optional[PlayerData]:
+        """Accès sans effet sur l'ordre LRU ni sur les métriques"""
+        return self._entries.get(user_id)
+
+    def values(self):
+        return self._entries.values()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def lookup(self, user_id: int) -> Optional[PlayerData]:
+        """Accès d'une commande : compte le succès/échec et rafraîchit la position LRU"""
+        player = self._entries.get(user_id)
+        if player is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+        return player
+
+    def put(self, player: PlayerData):
+        self._entries[player.user_id] = player
+        self._entries.move_to_end(player.user_id)
+
+    def evict(self, pinned) -> int:
+        """Évince les profils les plus froids jusqu'à max_size ; `pinned(user_id)` protège un profil"""
+        excess = len(self._entries) - self.max_size
+        if excess <= 0:
+            return 0
+        victims = []
+        for user_id in self._entries:
+            if len(victims) >= excess:
+                break
+            if not pinned(user_id):
+                victims.append(user_id)
+        for user_id in victims:
+            del self._entries[user_id]
+        self.evictions += len(victims)
+        return len(victims)
+
+# ========== CLASSEMENT ==========
+
+class UsernameCache:
+    """Cache LRU des pseudos Discord, avec durée de vie, sauvegardé avec les joueurs.
+
+    Évite un appel REST fetch_user par ligne du classement.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 24 * 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()  # user_id -> (pseudo, expiration)
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, entries: Dict[int, tuple]):
+        now = time.time()
+        for user_id, (name, expires) in sorted(entries.items(), key=lambda entry: entry[1][1]):
+            if expires > now:
+                self._entries[user_id] = (name, expires)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, user_id: int) -> Optional[str]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] <= time.time():
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[0]
+
+    def put(self, user_id: int, name: str):
+        if self._entries.get(user_id, (None,))[0] != name:
+            self.dirty = True
+        self._entries[user_id] = (name, time.time() + self.ttl)
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.dirty = True
+
+    def take_snapshot(self) -> Optional[Dict[int, tuple]]:
+        """Copie à sauvegarder si le cache a changé depuis la dernière écriture, sinon None"""
+        if not self.dirty:
+            return None
+        self.dirty = False
+        return dict(self._entries)
+
+class PowerLeaderboard:
+    """Classement de puissance maintenu au fil des événements (achat, equip, unequip).
+
+    Les entrées (-puissance, user_id) sont gardées triées : le top N se lit
+    directement et le rang d'un joueur s'obtient en O(log n).
+    """
+
+    def __init__(self):
+        self._ranking = SortedList()
+        self._power: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ranking)
+
+    def update(self, user_id: int, power: int):
+        old_power = self._power.get(user_id)
+        if old_power == power:
+            return
+        if old_power is not None:
+            self._ranking.remove((-old_power, user_id))
+        self._ranking.add((-power, user_id))
+        self._power[user_id] = power
+
+    def remove(self, user_id: int):
+        old_power = self._power.pop(user_id, None)
+        if old_power is not None:
+            self._ranking.remove((-old_power, user_id))
+
+    def power(self, user_id: int) -> Optional[int]:
+        return self._power.get(user_id)
+
+    def user_ids(self) -> List[int]:
+        return list(self._power)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """Position (à partir de 1) du joueur, None s'il n'est pas classé"""
+        power = self._power.get(user_id)
+        if power is None:
+            return None
+        return self._ranking.index((-power, user_id)) + 1
+
+    def page(self, offset: int, count: int) -> List[tuple]:
+        """Renvoie [(user_id, puissance), ...] à partir de la position offset (0 = premier)"""
+        return [(user_id, -neg_power) for neg_power, user_id in islice(self._ranking, offset, offset + count)]
+
+# ========== TRANSACTIONS ==========
+
+class TransactionError(Exception):
+    """Opération refusée à la validation ; le message est destiné au joueur"""
+
+class UserLockManager:
+    """Verrous asyncio par joueur, répartis en shards.
+
+    Les opérations d'un même joueur sont sérialisées, celles de joueurs
+    différents avancent en parallèle. Une entrée est supprimée dès que plus
+    personne ne l'utilise, chaque shard reste donc petit.
+    """
+
+    def __init__(self, shard_count: int = 64):
+        self._shards: List[Dict[int, list]] = [{} for _ in range(shard_count)]
+        self.acquisitions = 0
+        self.contended = 0  # Acquisitions qui ont dû attendre
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def __contains__(self, user_id: int) -> bool:
+        """Vrai si une opération du joueur est en cours ou en attente"""
+        return user_id in self._shards[user_id % len(self._shards)]
+
+    @asynccontextmanager
+    async def lock(self, user_id: int):
+        shard = self._shards[user_id % len(self._shards)]
+        entry = shard.get(user_id)
+        if entry is None:
+            entry = shard[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        self.acquisitions += 1
+        if entry[0].locked():
+            self.contended += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del shard[user_id]
+
+class PlayerTransaction:
+    """Transaction économique sur un joueur : valider, modifier, puis commit ou rollback.
+
+    L'état du joueur est copié à l'ouverture ; toute exception (refus de
+    validation compris) le restaure tel quel.
+    """
+
+    def __init__(self, bot: 'HeroBot', player: PlayerData):
+        self.bot = bot
+        self.player = player
+        self._snapshot = copy.deepcopy(player)
+
+    def require(self, condition: bool, message: str):
+        """Valide une condition ; sinon la transaction est annulée avec ce message"""
+        if not condition:
+            raise TransactionError(message)
+
+    def commit(self):
+        if self.bot.storage.records_events:
+            self.bot.saver.record(diff_player_events(self._snapshot, self.player))
+        self.bot.refresh_power(self.player.user_id)
+        self.bot.mark_dirty(self.player.user_id)
+
+    def rollback(self):
+        for f in fields(PlayerData):
+            setattr(self.player, f.name, getattr(self._snapshot, f.name))
+        # Un index construit pendant la transaction décrit l'état abandonné
+        self.bot.inventory_indexes.invalidate(self.player.user_id)
+
+# ========== ÉQUIPEMENT AUTOMATIQUE ==========
+
+class LoadoutSolver:
+    """Répartition de l'inventaire qui maximise la puissance d'un ou plusieurs héros.
+
+    Chaque héros offre des groupes d'emplacements (type d'emplacement -> nombre,
+    d'après EQUIPMENT_SLOTS_BY_CLASS). Un item typé ne va que dans un groupe de son
+    type, un item sans type dans n'importe quel groupe, et seulement chez un héros
+    de classe compatible. La valeur d'un item ne dépend pas du héros qui le porte :
+    les ensembles d'items plaçables forment un matroïde, donc prendre les items par
+    puissance décroissante en ne gardant que ceux qu'on peut encore placer (quitte à
+    déplacer des items déjà placés, par chemin augmentant) donne l'optimum.
+    """
+
+    def __init__(self, heroes: List[Hero], items_db: Dict[int, Item]):
+        self.heroes = heroes
+        self.items_db = items_db
+        self.capacity: Dict[tuple, int] = {}   # (hero_id, type) -> nombre d'emplacements
+        self.slot_indexes: Dict[tuple, List[int]] = {}
+        # Groupes par classe puis par type ("" : tous les groupes de la classe)
+        self.groups_by_class: Dict[HeroClass, Dict[str, List[tuple]]] = {}
+        for hero in heroes:
+            by_slot = self.groups_by_class.setdefault(hero.hero_class, {})
+            for index, slot in enumerate(EQUIPMENT_SLOTS_BY_CLASS[hero.hero_class]):
+                group = (hero.id, slot)
+                if group not in self.capacity:
+                    self.capacity[group] = 0
+                    by_slot.setdefault(slot, []).append(group)
+                    by_slot.setdefault("", []).append(group)
+                self.capacity[group] += 1
+                self.slot_indexes.setdefault(group, []).append(index)
+        self.total_capacity = sum(self.capacity.values())
+
+    def eligible_groups(self, item: Item) -> List[tuple]:
+        groups = []
+        for hero_class in item.compatible_classes:
+            by_slot = self.groups_by_class.get(hero_class)
+            if by_slot:
+                groups.extend(by_slot.get(item.slot, ()))
+        return groups
+
+    def solve(self, stock: Dict[int, int],
+              current: Optional[Dict[int, List[Optional[int]]]] = None) -> Dict[int, List[Optional[int]]]:
+        """stock : id d'item -> exemplaires disponibles ; current : loadouts actuels des héros.
+        À puissance égale, les items déjà portés restent en place. Renvoie hero_id -> loadout."""
+        current = current or {}
+        worn = {hero_id: set(loadout) for hero_id, loadout in current.items()}
+        worn_anywhere = set().union(*worn.values()) if worn else set()
+        candidates = []
+        for item_id, copies in stock.items():
+            item = self.items_db.get(item_id)
+            if item is None or copies <= 0:
+                continue
+            groups = self.eligible_groups(item)
+            if groups:
+                # Les emplacements du héros qui porte déjà l'item d'abord
+                groups.sort(key=lambda group: item_id not in worn.get(group[0], ()))
+                candidates.append((-item.get_puissance(), item_id not in worn_anywhere, item_id, copies, groups))
+        candidates.sort()
+
+        eligible = {item_id: groups for _, _, item_id, _, groups in candidates}
+        placed: Dict[tuple, Counter] = {group: Counter() for group in self.capacity}
+        load = dict.fromkeys(self.capacity, 0)
+
+        def place(item_id: int, visited: set) -> bool:
+            groups = eligible[item_id]
+            for group in groups:
+                if group not in visited and load[group] < self.capacity[group]:
+                    visited.add(group)
+                    placed[group][item_id] += 1
+                    load[group] += 1
+                    return True
+            for group in groups:
+                if group in visited:
+                    continue
+                visited.add(group)
+                for other in list(placed[group]):
+                    if place(other, visited):
+                        placed[group][other] -= 1
+                        if not placed[group][other]:
+                            del placed[group][other]
+                        placed[group][item_id] += 1
+                        return True
+            return False
+
+        total = 0
+        for _, _, item_id, copies, _ in candidates:
+            if total == self.total_capacity:
+                break
+            for _ in range(copies):
+                if not place(item_id, set()):
+                    break  # Les exemplaires suivants ne se placeraient pas davantage
+                total += 1
+                if total == self.total_capacity:
+                    break
+
+        loadouts = {hero.id: [None] * len(EQUIPMENT_SLOTS_BY_CLASS[hero.hero_class]) for hero in self.heroes}
+        for group, counter in placed.items():
+            hero_id = group[0]
+            loadout = loadouts[hero_id]
+            previous = current.get(hero_id, [])
+            free = []
+            # Un item déjà porté reste sur son emplacement actuel quand c'est possible
+            for index in self.slot_indexes[group]:
+                item_id = previous[index] if index < len(previous) else None
+                if counter[item_id] > 0:
+                    loadout[index] = item_id
+                    counter[item_id] -= 1
+                else:
+                    free.append(index)
+            for index, item_id in zip(free, counter.elements()):
+                loadout[index] = item_id
+        return loadouts
+
+def available_stock(player: PlayerData, excluded_heroes) -> Dict[int, int]:
+    """Exemplaires possédés moins ceux portés par les héros qui ne sont pas réoptimisés"""
+    stock = dict(player.items.items())
+    for hero_id, instance in player.heroes.items():
+        if hero_id in excluded_heroes:
+            continue
+        for item_id in instance.equipped_items:
+            if item_id in stock:
+                stock[item_id] -= 1
+    return stock
+
+# ========== COMBAT ==========
+
+# Statistiques de combat d'un combattant, dans l'ordre des colonnes des tableaux
+COMBAT_STATS = ("pv", "attaque", "defense", "vitesse")
+# Noms de stats acceptés dans items.json (normalisés : sans accents ni casse)
+COMBAT_STAT_ALIASES = {
+    "pv": 0, "vie": 0, "sante": 0,
+    "attaque": 1, "degats": 1, "force": 1,
+    "defense": 2, "armure": 2,
+    "vitesse": 3,
+}
+COMBAT_TEAM_SIZE = 5
+COMBAT_MAX_ROUNDS = 30
+COMBAT_LEVEL_BONUS = 0.05       # +5 % de pv, d'attaque et de défense par niveau au-delà du premier
+COMBAT_BASE_SPEED = 10
+COMBAT_CRIT_CHANCE = 0.10
+COMBAT_CRIT_MULTIPLIER = 1.5
+COMBAT_DAMAGE_SPREAD = (0.85, 1.15)
+COMBAT_SAMPLES = 1000           # combats simulés par !combat pour estimer les chances
+
+def fighter_stats(hero: Hero, level: int, item_ids, items_db: Dict[int, Item]) -> np.ndarray:
+    """Stats de combat (COMBAT_STATS) d'un héros à un niveau donné avec son équipement.
+
+    La rareté du héros donne la base ; chaque item ajoute ses stats et un bonus
+    tiré de sa puissance de rareté (PUISSANCE_ITEM), comme calculer_puissance.
+    """
+    power = PUISSANCE_HEROS.get(hero.rarity, 0)
+    stats = np.array([5.0 * power, power / 2, power / 10, COMBAT_BASE_SPEED])
+    for item_id in item_ids:
+        item = items_db.get(item_id)
+        if item is None:
+            continue
+        item_power = item.get_puissance()
+        stats[:3] += (2.0 * item_power, item_power / 4, item_power / 10)
+        for name, value in item.stats.items():
+            column = COMBAT_STAT_ALIASES.get(normalize_name(name))
+            if column is not None:
+                stats[column] += value
+    stats[:3] *= 1 + COMBAT_LEVEL_BONUS * (max(level, 1) - 1)
+    return stats
+
+def player_team(player: PlayerData, heroes_db: Dict[int, Hero], items_db: Dict[int, Item],
+                size: int = COMBAT_TEAM_SIZE) -> tuple:
+    """Les `size` héros les plus puissants du joueur : (héros, tableau (n, 4) de stats)"""
+    owned = [
+        (instance.puissance(heroes_db[hero_id], items_db), heroes_db[hero_id], instance)
+        for hero_id, instance in player.heroes.items() if hero_id in heroes_db
+    ]
+    owned.sort(key=lambda entry: (-entry[0], entry[1].id))
+    heroes = [hero for _, hero, _ in owned[:size]]
+    stats = [fighter_stats(hero, instance.level.level, instance.equipped_items, items_db) for _, hero, instance in owned[:size]]
+    return heroes, np.array(stats).reshape(-1, len(COMBAT_STATS))
+
+def catalog_team(heroes: List[Hero], level: int, items_db: Dict[int, Item]) -> np.ndarray:
+    """Équipe PvE : héros du catalogue avec leur équipement par défaut, au niveau donné"""
+    stats = [fighter_stats(hero, level, hero.equipped_items, items_db) for hero in heroes]
+    return np.array(stats).reshape(-1, len(COMBAT_STATS))
+
+def pack_teams(teams, size: Optional[int] = None) -> np.ndarray:
+    """Empile des équipes (n, 4) en un tableau (combats, size, 4) ; les places vides ont 0 pv"""
+    size = size or max((len(team) for team in teams), default=0)
+    packed = np.zeros((len(teams), size, len(COMBAT_STATS)))
+    for index, team in enumerate(teams):
+        packed[index, :len(team)] = team[:size]
+    return packed
+
+@dataclass(slots=True)
+class BattleResults:
+    """Issue d'un lot de combats : vainqueur (0 = équipe A, 1 = équipe B, -1 = égalité),
+    tours joués et part des pv restants de chaque équipe"""
+    winners: np.ndarray
+    rounds: np.ndarray
+    remaining: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.winners)
+
+    def wins(self, side: int) -> int:
+        return int(np.count_nonzero(self.winners == side))
+
+    @property
+    def draws(self) -> int:
+        return int(np.count_nonzero(self.winners < 0))
+
+def simulate_battles(side_a: np.ndarray, side_b: np.ndarray, seed=None,
+                     max_rounds: int = COMBAT_MAX_ROUNDS) -> BattleResults:
+    """Résout un lot de combats d'équipes en une fois, tour par tour sur tout le lot.
+
+    side_a et side_b : tableaux (combats, taille d'équipe, 4) de COMBAT_STATS.
+    À chaque tour, chaque combattant vivant frappe un ennemi vivant tiré au hasard ;
+    les coups des deux camps sont simultanés. La vitesse donne une chance de frapper
+    deux fois, la défense réduit les dégâts reçus (100 / (100 + défense)).
+    Sans équipe décimée au bout de max_rounds, la plus grande part de pv restants gagne.
+    """
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    size = max(side_a.shape[1], side_b.shape[1])
+    stats = np.zeros((len(side_a), 2, size, len(COMBAT_STATS)))
+    stats[:, 0, :side_a.shape[1]] = side_a
+    stats[:, 1, :side_b.shape[1]] = side_b
+    battles = len(stats)
+
+    hp = stats[..., 0].copy()
+    attack = stats[..., 1]
+    mitigation = 100.0 / (100.0 + np.maximum(stats[..., 2], 0))
+    double_strike = np.maximum(stats[..., 3], 0) / (np.maximum(stats[..., 3], 0) + 100.0)
+    start_hp = hp.sum(axis=2)
+    rounds = np.zeros(battles, dtype=np.int64)
+    # Position, dans un lot aplati (combats, 2, taille), du premier combattant du camp adverse
+    enemy_base = (np.arange(2 * battles).reshape(battles, 2) ^ 1)[:, :, None] * size
+
+    active = np.flatnonzero((hp > 0).any(axis=2).all(axis=1))
+    for round_number in range(1, max_rounds + 1):
+        if not len(active):
+            break
+        rounds[active] = round_number
+        alive = hp[active] > 0
+        # Cible : l'ennemi vivant de plus haut score aléatoire
+        scores = np.where(alive[:, ::-1, None, :], rng.random((len(active), 2, size, size)), -1.0)
+        targets = enemy_base[active] + scores.argmax(axis=3)
+
+        damage = attack[active] * alive
+        damage *= 1 + (rng.random(damage.shape) < double_strike[active])
+        damage *= np.where(rng.random(damage.shape) < COMBAT_CRIT_CHANCE, COMBAT_CRIT_MULTIPLIER, 1.0)
+        damage *= rng.uniform(*COMBAT_DAMAGE_SPREAD, size=damage.shape)
+        damage *= mitigation.ravel()[targets]
+
+        received = np.bincount(targets.ravel(), weights=damage.ravel(), minlength=hp.size)
+        hp[active] -= received.reshape(hp.shape)[active]
+        active = active[(hp[active] > 0).any(axis=2).all(axis=1)]
+
+    standing = (hp > 0).any(axis=2)
+    # Pv négatifs gardés : deux équipes tombées au même tour sont départagées par les dégâts en trop
+    score = np.divide(hp.sum(axis=2), start_hp, out=np.zeros_like(start_hp), where=start_hp > 0)
+    np.maximum(hp, 0, out=hp)
+    remaining = np.divide(hp.sum(axis=2), start_hp, out=np.zeros_like(start_hp), where=start_hp > 0)
+    score = np.where(standing.any(axis=1)[:, None], remaining, score)
+    winners = np.where(score[:, 0] > score[:, 1], 0, np.where(score[:, 1] > score[:, 0], 1, -1))
+    winners[standing[:, 0] & ~standing[:, 1]] = 0
+    winners[standing[:, 1] & ~standing[:, 0]] = 1
+    return BattleResults(winners, rounds, remaining)
+
+# ========== MÉTRIQUES ==========
+
+class LatencyHistogram:
+    """Histogramme de durées à seuils fixes (secondes), au format des histogrammes Prometheus"""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Dernière case : au-delà du plus grand seuil
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimation par interpolation linéaire dans la case qui contient le quantile"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, count in enumerate(self.counts):
+            upper = self.buckets[index] if index < len(self.buckets) else self.max
+            if count and seen + count >= target:
+                return min(lower + (upper - lower) * (target - seen) / count, self.max)
+            seen += count
+            lower = upper
+        return self.max
+
+    def prometheus_lines(self, name: str, labels: str = "") -> List[str]:
+        prefix = f"{labels}," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+class CommandStats:
+    __slots__ = ('latency', 'errors')
 
-ITEMS_DU_JOUR = []
-DERNIERE_MAJ_ITEMS = None
-ITEMS_DU_JOUR_PATH = "items_du_jour.json"
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
 
-def sauvegarder_items_du_jour():
-    """Sauvegarde les items du jour dans le fichier JSON"""
-    try:
-        item_ids = [item.id for item in ITEMS_DU_JOUR]
-        derniere_maj_str = DERNIERE_MAJ_ITEMS.isoformat() if DERNIERE_MAJ_ITEMS else None
-        data = {
-            'items_ids': item_ids,  # clé corrigée ici, c'était 'items_du_jour' dans ta version, mieux garder 'items_ids'
-            'derniere_maj': derniere_maj_str
+class BotMetrics:
+    """Latence et erreurs par commande, durée des sauvegardes et retard de la boucle d'événements"""
+
+    LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+    def __init__(self):
+        self.commands: Dict[tuple, CommandStats] = {}  # (nom, "prefix" | "slash") -> stats
+        self.saves: Dict[str, LatencyHistogram] = {}   # "differee" | "complete" -> durées
+        self.loop_lag = LatencyHistogram(self.LOOP_LAG_BUCKETS)
+        self.started_at = time.time()
+        self._lag_task: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def observe_command(self, name: str, kind: str, seconds: float, failed: bool = False):
+        stats = self.commands.get((name, kind))
+        if stats is None:
+            stats = self.commands[(name, kind)] = CommandStats()
+        stats.latency.observe(seconds)
+        if failed:
+            stats.errors += 1
+
+    def observe_save(self, mode: str, seconds: float):
+        histogram = self.saves.get(mode)
+        if histogram is None:
+            histogram = self.saves[mode] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def start(self, interval: float = 0.25):
+        """Démarre la mesure du retard de la boucle"""
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._monitor_loop_lag(interval))
+
+    async def _monitor_loop_lag(self, interval: float):
+        # Retard = réveil effectif - réveil prévu ; il grandit quand une tâche bloque la boucle
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(max(0.0, time.perf_counter() - start - interval))
+
+    async def serve(self, bot: 'HeroBot', port: int, host: str = "127.0.0.1"):
+        """Expose /metrics au format texte Prometheus sur un port local"""
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+                path = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+                if path.split(b"?")[0] == b"/metrics":
+                    status, body = "200 OK", self.render_prometheus(bot).encode()
+                else:
+                    status, body = "404 Not Found", b"not found\n"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        self._server = await asyncio.start_server(handle, host, port)
+        print(f"📈 Métriques disponibles sur http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def render_prometheus(self, bot: 'HeroBot') -> str:
+        lines = [
+            "# HELP herobot_command_duration_seconds Durée d'exécution des commandes",
+            "# TYPE herobot_command_duration_seconds histogram",
+        ]
+        for (name, kind), stats in sorted(self.commands.items()):
+            lines += stats.latency.prometheus_lines("herobot_command_duration_seconds", f'command="{name}",type="{kind}"')
+        lines += [
+            "# HELP herobot_command_errors_total Commandes terminées en erreur",
+            "# TYPE herobot_command_errors_total counter",
+        ]
+        for (name, kind), stats in sorted(self.commands.items()):
+            lines.append(f'herobot_command_errors_total{{command="{name}",type="{kind}"}} {stats.errors}')
+        lines += [
+            "# HELP herobot_save_duration_seconds Durée des sauvegardes des joueurs",
+            "# TYPE herobot_save_duration_seconds histogram",
+        ]
+        for mode, histogram in sorted(self.saves.items()):
+            lines += histogram.prometheus_lines("herobot_save_duration_seconds", f'mode="{mode}"')
+        lines += [
+            "# HELP herobot_event_loop_lag_seconds Retard de réveil de la boucle d'événements",
+            "# TYPE herobot_event_loop_lag_seconds histogram",
+            *self.loop_lag.prometheus_lines("herobot_event_loop_lag_seconds"),
+        ]
+
+        gauges = {
+            "herobot_players_resident": ("Profils joueurs en mémoire", len(bot.players)),
+            "herobot_players_known": ("Joueurs classés", len(bot.leaderboard)),
+            "herobot_save_queue_depth": ("Écritures en attente", bot.saver.queue_depth),
+            "herobot_user_locks": ("Verrous de joueurs actifs", len(bot.user_locks)),
+            "herobot_uptime_seconds": ("Temps depuis le démarrage", time.time() - self.started_at),
         }
-        with open(ITEMS_DU_JOUR_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Erreur lors de la sauvegarde des items du jour: {e}")
+        if math.isfinite(bot.latency):
+            gauges["herobot_gateway_latency_seconds"] = ("Latence de la passerelle Discord", bot.latency)
+        for name, (help_text, value) in gauges.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+class HeroCommandTree(app_commands.CommandTree):
+    """Arbre des commandes slash qui chronomètre (et profile si demandé) chaque appel"""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras['metrics_start'] = time.perf_counter()
+        if interaction.type is discord.InteractionType.application_command:
+            interaction.extras['profile'] = self.client.profiler.begin()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        # Commande inconnue ou périmée : l'erreur arrive sans commande résolue, mais la mesure
+        # et le profil démarrés par interaction_check doivent quand même être clos
+        name = interaction.command.qualified_name if interaction.command is not None else "inconnue"
+        self.client.finish_interaction(interaction, name, failed=True)
+        await super().on_error(interaction, error)
+
+# ========== PROFILAGE ==========
+
+class SlowCommandRecord:
+    __slots__ = ('at', 'command', 'arguments', 'seconds', 'profile_path', 'top')
+
+    def __init__(self, at: str, command: str, arguments: str, seconds: float, profile_path: str, top: List[tuple]):
+        self.at = at
+        self.command = command
+        self.arguments = arguments
+        self.seconds = seconds
+        self.profile_path = profile_path
+        self.top = top  # [(fonction, temps propre en s, appels)]
+
+class CommandProfiler:
+    """Profilage cProfile à la demande des commandes qui dépassent un seuil.
+
+    cProfile ne suit qu'un profil à la fois par thread : une invocation qui démarre pendant
+    qu'une autre est profilée n'est pas capturée. Comme la boucle est partagée, le profil
+    d'une commande contient aussi ce que les autres tâches ont exécuté pendant son attente.
+    """
+
+    def __init__(self, directory: str = "profils", threshold: float = 0.5, keep: int = 50, top: int = 8,
+                 log_max_bytes: int = 1_000_000):
+        self.directory = directory
+        self.threshold = threshold  # secondes
+        self.keep = keep            # fichiers .prof conservés
+        self.top = top              # fonctions listées par commande lente
+        self.log_max_bytes = log_max_bytes  # au-delà, le journal passe en .1 (une seule ancienne version)
+        self.enabled = False
+        self.recent = deque(maxlen=20)
+        self._active: Optional[cProfile.Profile] = None
+
+        self.profiled = 0
+        self.captured = 0
+        self.skipped = 0
 
-def maj_items_du_jour(bot):
-    """Met à jour la liste des items du jour, en rechargeant depuis fichier ou générant"""
-    global ITEMS_DU_JOUR, DERNIERE_MAJ_ITEMS
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.directory, "commandes_lentes.log")
+
+    def begin(self) -> Optional[cProfile.Profile]:
+        if not self.enabled:
+            return None
+        if self._active is not None:
+            self.skipped += 1
+            return None
+        profile = cProfile.Profile()
+        self._active = profile
+        profile.enable()
+        return profile
 
-    if os.path.exists(ITEMS_DU_JOUR_PATH):
+    def end(self, profile: Optional[cProfile.Profile], command: str, arguments: str, seconds: float):
+        if profile is None:
+            return
+        profile.disable()
+        if self._active is profile:
+            self._active = None
+        self.profiled += 1
+        if seconds < self.threshold:
+            return
         try:
-            with open(ITEMS_DU_JOUR_PATH, "r", encoding='utf-8') as f:
-                data = json.load(f)
+            self._save(profile, command, arguments, seconds)
+            self.captured += 1
+        except OSError as e:
+            print(f"Erreur lors de l'écriture du profil de {command}: {e}")
 
-            timestamp = data.get("derniere_maj")
-            if timestamp:
-                DERNIERE_MAJ_ITEMS = datetime.fromisoformat(timestamp)
+    def _save(self, profile: cProfile.Profile, command: str, arguments: str, seconds: float):
+        os.makedirs(self.directory, exist_ok=True)
+        now = datetime.now(timezone.utc)
+        safe_name = "".join(c if c.isalnum() else "_" for c in command)
+        path = os.path.join(self.directory, f"{now:%Y%m%d-%H%M%S-%f}_{safe_name}.prof")
+        stats = pstats.Stats(profile)
+        stats.dump_stats(path)
 
-            if DERNIERE_MAJ_ITEMS and datetime.now(timezone.utc) - DERNIERE_MAJ_ITEMS < timedelta(hours=24):
-                item_ids = data.get("items_ids", [])
-                ITEMS_DU_JOUR = [bot.items_db[i] for i in item_ids if i in bot.items_db]
-                return  # Garder les mêmes items, moins de 24h écoulées
-        except Exception as e:
-            print(f"Erreur lors du chargement des items du jour: {e}")
+        # Temps propre (tottime) : où le temps a réellement été passé, hors appels imbriqués
+        top = []
+        for (filename, line, function), (_, calls, own, _, _) in sorted(
+            stats.stats.items(), key=lambda entry: entry[1][2], reverse=True
+        )[:self.top]:
+            location = f"{os.path.basename(filename)}:{line}({function})" if line else function
+            top.append((location, own, calls))
+
+        record = SlowCommandRecord(now.isoformat(timespec="seconds"), command, arguments, seconds, path, top)
+        self.recent.append(record)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(f"{record.at} {command} {arguments} — {seconds * 1000:.0f} ms — {os.path.basename(path)}\n")
+            for location, own, calls in top:
+                f.write(f"    {own * 1000:9.1f} ms  {calls:>8}  {location}\n")
+        self._rotate()
+
+    def _rotate(self):
+        profiles = sorted(name for name in os.listdir(self.directory) if name.endswith(".prof"))
+        for name in profiles[:-self.keep]:
+            os.remove(os.path.join(self.directory, name))
+        if os.path.getsize(self.log_path) > self.log_max_bytes:
+            os.replace(self.log_path, f"{self.log_path}.1")
+
+def interaction_arguments(interaction: discord.Interaction) -> str:
+    return " ".join(f"{name}={value}" for name, value in vars(interaction.namespace).items())
+
+# ========== INVENTAIRE ==========
+
+INVENTORY_PAGE_SIZE = 15
+# 15 lignes de 200 caractères restent loin des 4096 d'une description (et des 6000 d'un embed)
+INVENTORY_LINE_LIMIT = 200
+INVENTORY_SORTS = {
+    "items": ("rarete", "nom", "quantite"),
+    "heros": ("rarete", "nom", "niveau", "puissance"),
+}
+SLOTS_BY_NAME = {normalize_name(slot): slot for slot in KNOWN_SLOTS}
+
+@lru_cache(maxsize=65536)
+def sort_name(name: str) -> str:
+    """normalize_name mémorisé : les noms du catalogue reviennent à chaque construction d'index"""
+    return normalize_name(name)
+
+@dataclass(frozen=True)
+class InventoryQuery:
+    """Filtres et tri d'une vue d'inventaire (None = pas de filtre)"""
+    rarity: Optional[Enum] = None
+    hero_class: Optional[HeroClass] = None
+    slot: Optional[str] = None
+    sort: str = "rarete"
+
+    def facets(self) -> List[tuple]:
+        return [
+            facet for facet in (("rarete", self.rarity), ("classe", self.hero_class), ("emplacement", self.slot))
+            if facet[1] is not None
+        ]
+
+    def describe(self) -> str:
+        parts = [f"{self.rarity.emoji} {self.rarity.display_name}" if self.rarity else None,
+                 self.hero_class.value if self.hero_class else None,
+                 self.slot]
+        return " · ".join(part for part in parts if part)
+
+def parse_inventory_query(text: str, kind: str) -> InventoryQuery:
+    """« épique maître méca tri:quantite » -> InventoryQuery ; ValueError si un mot n'est pas reconnu"""
+    parse_rarity = parse_item_rarity if kind == "items" else parse_hero_rarity
+    values = {}
+    unknown = []
+    words = normalize_name(text).split()
+    index = 0
+    while index < len(words):
+        word = words[index]
+        # Les noms de classe peuvent tenir en deux mots (« maître méca »)
+        pair = " ".join(words[index:index + 2])
+        if len(words) > index + 1 and parse_hero_class(pair):
+            values["hero_class"] = parse_hero_class(pair)
+            index += 2
+            continue
+        if word.startswith("tri:"):
+            if word[4:] not in INVENTORY_SORTS[kind]:
+                raise ValueError(f"Tri inconnu « {word[4:]} » (possibles : {', '.join(INVENTORY_SORTS[kind])})")
+            values["sort"] = word[4:]
+        elif parse_rarity(word):
+            values["rarity"] = parse_rarity(word)
+        elif parse_hero_class(word):
+            values["hero_class"] = parse_hero_class(word)
+        elif kind == "items" and word in SLOTS_BY_NAME:
+            values["slot"] = SLOTS_BY_NAME[word]
+        else:
+            unknown.append(word)
+        index += 1
+    if unknown:
+        raise ValueError(f"Filtre inconnu : {', '.join(unknown)}")
+    return InventoryQuery(**values)
+
+class InventoryIndex:
+    """Inventaire d'un joueur (items ou héros) prêt à filtrer, trier et paginer.
+
+    Construit une fois par version du profil : les entrées (doublons regroupés,
+    objet du catalogue en tête) sont triées une fois pour chaque clé de tri, et
+    chaque rareté, classe ou emplacement a son ensemble de positions. Une requête
+    est résolue une fois puis mémorisée ; une page n'est plus qu'une tranche de
+    liste, et seules les lignes affichées sont mises en forme (puis gardées).
+    """
+    kind = ""
+
+    def __init__(self, entries: list):
+        self.entries = entries
+        # Clé de nom calculée une seule fois, partagée par tous les tris
+        names = [sort_name(entry[0].name) for entry in entries]
+        self.orders: Dict[str, List[int]] = {
+            sort: sorted(range(len(entries)), key=lambda position: key(entries[position], names[position]))
+            for sort, key in self.sort_keys().items()
+        }
+        self.facets: Dict[tuple, set] = {}
+        for position, entry in enumerate(entries):
+            for facet in self.entry_facets(entry):
+                self.facets.setdefault(facet, set()).add(position)
+        self._results: Dict[InventoryQuery, List[int]] = {}
+        self._lines: List[Optional[str]] = [None] * len(entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def sort_keys(self) -> dict:
+        raise NotImplementedError
+
+    def entry_facets(self, entry) -> List[tuple]:
+        raise NotImplementedError
+
+    def format_line(self, entry) -> str:
+        raise NotImplementedError
+
+    def query(self, query: InventoryQuery) -> List[int]:
+        """Positions des entrées retenues par les filtres, dans l'ordre du tri"""
+        result = self._results.get(query)
+        if result is None:
+            wanted = sorted((self.facets.get(facet, set()) for facet in query.facets()), key=len)
+            order = self.orders[query.sort]
+            if wanted:
+                allowed = wanted[0].intersection(*wanted[1:])
+                result = [position for position in order if position in allowed]
+            else:
+                result = order
+            self._results[query] = result
+        return result
+
+    def line(self, position: int) -> str:
+        line = self._lines[position]
+        if line is None:
+            line = self.format_line(self.entries[position])
+            if len(line) > INVENTORY_LINE_LIMIT:
+                line = line[:INVENTORY_LINE_LIMIT - 1] + "…"
+            self._lines[position] = line
+        return line
+
+    def page(self, query: InventoryQuery, page: int) -> tuple:
+        """(lignes de la page, numéro de page ramené dans les bornes, nombre de pages, nombre de résultats)"""
+        result = self.query(query)
+        pages = max(1, -(-len(result) // INVENTORY_PAGE_SIZE))
+        page = min(max(page, 0), pages - 1)
+        start = page * INVENTORY_PAGE_SIZE
+        return [self.line(position) for position in result[start:start + INVENTORY_PAGE_SIZE]], page, pages, len(result)
+
+class ItemInventoryIndex(InventoryIndex):
+    """Entrées (item, exemplaires, exemplaires portés)"""
+    kind = "items"
 
-    # Générer de nouveaux items
-    items_disponibles = list(bot.items_db.values())
-    k = min(5, len(items_disponibles))
-    ITEMS_DU_JOUR = random.sample(items_disponibles, k=k) if k > 0 else []
-    DERNIERE_MAJ_ITEMS = datetime.now(timezone.utc)
-    sauvegarder_items_du_jour()
+    @classmethod
+    def build(cls, player: PlayerData, items_db: Dict[int, Item]) -> 'ItemInventoryIndex':
+        equipped = Counter(item_id for instance in player.heroes.values() for item_id in instance.equipped_items)
+        return cls([
+            (items_db[item_id], count, equipped[item_id])
+            for item_id, count in player.items.items() if item_id in items_db
+        ])
+
+    def sort_keys(self) -> dict:
+        return {
+            "rarete": lambda entry, name: (-entry[0].rarity.rank, name, entry[0].id),
+            "nom": lambda entry, name: (name, entry[0].id),
+            "quantite": lambda entry, name: (-entry[1], -entry[0].rarity.rank, name, entry[0].id),
+        }
+
+    def entry_facets(self, entry) -> List[tuple]:
+        item = entry[0]
+        facets = [("rarete", item.rarity)] + [("classe", hero_class) for hero_class in item.compatible_classes]
+        if item.slot:
+            facets.append(("emplacement", item.slot))
+        return facets
+
+    def format_line(self, entry) -> str:
+        item, count, equipped = entry
+        line = f"{item.rarity.emoji} **{item.name}**" + (f" x{count}" if count > 1 else "")
+        if equipped:
+            line += f" ({equipped} équipé{'s' if equipped > 1 else ''})"
+        if item.slot:
+            line += f" · {item.slot}"
+        if item.stats:
+            line += " · " + ", ".join(f"{k} +{v}" for k, v in item.stats.items())
+        return line
+
+class HeroInventoryIndex(InventoryIndex):
+    """Entrées (héros, instance du joueur, puissance)"""
+    kind = "heros"
+
+    @classmethod
+    def build(cls, player: PlayerData, heroes_db: Dict[int, Hero], items_db: Dict[int, Item]) -> 'HeroInventoryIndex':
+        return cls([
+            (heroes_db[hero_id], instance, instance.puissance(heroes_db[hero_id], items_db))
+            for hero_id, instance in player.heroes.items() if hero_id in heroes_db
+        ])
+
+    def sort_keys(self) -> dict:
+        return {
+            "rarete": lambda entry, name: (-entry[0].rarity.rank, name, entry[0].id),
+            "nom": lambda entry, name: (name, entry[0].id),
+            "niveau": lambda entry, name: (-entry[1].level.total_experience, name, entry[0].id),
+            "puissance": lambda entry, name: (-entry[2], name, entry[0].id),
+        }
+
+    def entry_facets(self, entry) -> List[tuple]:
+        return [("rarete", entry[0].rarity), ("classe", entry[0].hero_class)]
+
+    def format_line(self, entry) -> str:
+        hero, instance, power = entry
+        return (f"{hero.rarity.emoji} **{hero.name}** · {hero.hero_class.value} · niv. {instance.level.level} · "
+                f"{power} ⚡ · équipement {len(instance.equipped_items)}/{len(instance.loadout)}")
+
+class InventoryIndexCache:
+    """Index d'inventaire par (joueur, type), LRU borné.
+
+    Un index est jeté dès que le profil change (HeroBot.mark_dirty) et tous le
+    sont quand le catalogue est remplacé.
+    """
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._indexes: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def get(self, user_id: int, kind: str) -> Optional[InventoryIndex]:
+        index = self._indexes.get((user_id, kind))
+        if index is not None:
+            self._indexes.move_to_end((user_id, kind))
+        return index
+
+    def put(self, user_id: int, index: InventoryIndex):
+        self._indexes[(user_id, index.kind)] = index
+        self._indexes.move_to_end((user_id, index.kind))
+        while len(self._indexes) > self.max_size:
+            self._indexes.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        for kind in INVENTORY_SORTS:
+            self._indexes.pop((user_id, kind), None)
+
+    def clear(self):
+        self._indexes.clear()
+
+# ========== BOUTIQUE ==========
+
+class ShopPages:
+    """Pages statiques de la boutique (héros et coffres), précompilées au chargement du catalogue.
+
+    Chaque page est gardée sous forme de dict d'embed ; un clic de pagination
+    ne fait plus qu'un calcul d'index et un Embed.from_dict.
+    """
+
+    def __init__(self, heroes_db: Dict[int, Hero], chests_db: Dict[str, ChestType]):
+        self.heroes = tuple(heroes_db.values())
+        self.chests = tuple(chest for chest in chests_db.values() if not chest.hidden)
+        self.hero_pages = tuple(self._hero_page(index, hero) for index, hero in enumerate(self.heroes))
+        self.chest_pages = tuple(self._chest_page(index, chest) for index, chest in enumerate(self.chests))
+
+    def _hero_page(self, index: int, hero: Hero) -> dict:
+        # Créez l'embed AVEC la couleur personnalisée du héros
+        embed = discord.Embed(
+            title="🦸 Héros disponibles",
+            color=get_color_from_hex(hero.color)
+        )
+        
+        embed.set_image(url=hero.image)
+        embed.add_field(name="Nom", value=hero.name, inline=True)
+        embed.add_field(name="Classe", value=hero.hero_class.value, inline=True)
+        embed.add_field(name="Prix", value=f"{hero.price} 🏅", inline=True)
+        embed.add_field(name="Rareté", value=f"{hero.rarity.emoji} {hero.rarity.display_name}", inline=True)
+        if hero.description:
+            embed.add_field(name="Description", value=hero.description, inline=False)
+        embed.set_footer(text=f"Héros {index + 1}/{len(self.heroes)}")
+        return embed.to_dict()
+
+    def _chest_page(self, index: int, chest: ChestType) -> dict:
+        embed = discord.Embed(
+            title="🎁 Coffres disponibles",
+            color=get_color_from_hex(chest.color)
+        )
+        
+        embed.add_field(
+            name=f"📦 {chest.name}",
+            value=f"Prix: {chest.price} 🪙\n{chest.description}",
+            inline=False
+        )
+        if chest.image:
+            embed.set_thumbnail(url=chest.image)
+        embed.set_footer(text=f"Coffre {index + 1}/{len(self.chests)}")
+        return embed.to_dict()
+
+    def hero_embed(self, index: int) -> discord.Embed:
+        if not self.hero_pages:
+            return discord.Embed(
+                title="🦸 Héros disponibles",
+                description="Aucun héros disponible",
+                color=discord.Color.red()
+            )
+        return discord.Embed.from_dict(self.hero_pages[index % len(self.hero_pages)])
+
+    def chest_embed(self, index: int) -> discord.Embed:
+        if not self.chest_pages:
+            return discord.Embed(
+                title="🎁 Coffres disponibles",
+                description="Aucun coffre disponible",
+                color=discord.Color.red()
+            )
+        return discord.Embed.from_dict(self.chest_pages[index % len(self.chest_pages)])
 
 class HeroBot(commands.Bot):
     def __init__(self):
         intents = discord.Intents.default()
         intents.message_content = True
-        super().__init__(command_prefix='!', intents=intents)
+        super().__init__(command_prefix='!', intents=intents, tree_cls=HeroCommandTree)
         
         # Bases de données en mémoire
+        self.catalog: Optional[Catalog] = None
+        self._catalog_lock = asyncio.Lock()
+        # Après un rechargement, les puissances stockées des profils non chargés peuvent être périmées
+        self._stored_powers_stale = False
         self.heroes_db: Dict[int, Hero] = {}
         self.items_db: Dict[int, Item] = {}
-        self.players: Dict[int, PlayerData] = {}
+        # Profils chargés à la demande, bornés en mémoire
+        self.players = PlayerCache(int(os.getenv("PLAYER_CACHE_SIZE", "5000")))
         self.chests_db: Dict[str, ChestType] = {}
+
+        # Index dérivés des catalogues
+        self.items_by_rarity: Dict[ItemRarity, List[int]] = {}
+        self.loot_tables: Dict[str, LootTable] = {}
+        self.hero_names = NameIndex([])
+        self.item_names = NameIndex([])
+        self.chest_names = NameIndex([])
+        self.shop_pages: Optional['ShopPages'] = None
+
+        # Classement de puissance matérialisé
+        self.leaderboard = PowerLeaderboard()
+
+        # Index des vues !items et !heros, jetés à chaque modification du profil
+        self.inventory_indexes = InventoryIndexCache()
+
+        # Stockage des joueurs (JSON ou SQLite)
+        self.storage: StorageBackend = create_storage()
+
+        # Pseudos déjà résolus pour l'affichage du classement
+        self.usernames = UsernameCache()
+
+        # Verrous par joueur pour les opérations économiques
+        self.user_locks = UserLockManager()
+
+        # Latences des commandes, sauvegardes et retard de la boucle
+        self.metrics = BotMetrics()
+        self.add_listener(self._record_hybrid_error, 'on_command_error')
+        self.profiler = CommandProfiler(
+            directory=os.getenv("PROFILE_DIR", "profils"),
+            threshold=float(os.getenv("PROFILE_THRESHOLD_MS", "500")) / 1000,
+            keep=int(os.getenv("PROFILE_KEEP", "50")),
+        )
+
+        # Boutique du jour, en mémoire
+        self.daily_shop = DailyShopRotation()
+        self._daily_shop_task: Optional[asyncio.Task] = None
+
+        # Rechargement automatique du catalogue (désactivé si CATALOG_WATCH_INTERVAL vaut 0)
+        watch_interval = float(os.getenv("CATALOG_WATCH_INTERVAL", "0"))
+        self.catalog_watcher = CatalogWatcher(watch_interval) if watch_interval > 0 else None
+        self._catalog_watch_task: Optional[asyncio.Task] = None
         
         # Chargement des données JSON
         self.load_data()
-    
-    def load_data(self):
-        class_mapping = {
-            'GÉNÉRAL': 'GENERAL',
-            'GLADIATEUR': 'GLADIATEUR',
-            'MAGE': 'MAGE',
-            'VOLEUR': 'VOLEUR',
-            'PALADIN': 'PALADIN',
-            'SAGE': 'SAGE',
-            'NÉCROMANCIEN': 'NECROMANCIEN',
-            'MAÎTRE MÉCA': 'MAITRE_MECA'
-        }
-        
-        # Chargement des héros
-        try:
-            with open('heroes.json', 'r', encoding='utf-8') as f:
-                heroes_data = json.load(f)
-                for hero_data in heroes_data:
-                    rarity_name = hero_data['rarity'].upper()
-                    hero_rarity = HeroRarity[rarity_name]
-
-                    hero_class_name = hero_data['hero_class'].upper()
-                    if hero_class_name in class_mapping:
-                        hero_class_name = class_mapping[hero_class_name]
-                    hero_class = HeroClass[hero_class_name]
-
-                    hero = Hero(
-                        id=hero_data['id'],
-                        name=hero_data['name'],
-                        rarity=hero_rarity,
-                        hero_class=hero_class,
-                        image=hero_data['image'],
-                        price=hero_data['price'],
-                        description=hero_data.get('description', ''),
-                        equipped_items=hero_data.get('equipped_items', []),
-                        color=hero_data.get('color', '#5865F2')
-                    )
-                    self.heroes_db[hero.id] = hero
-        except FileNotFoundError:
-            print("Fichier heroes.json non trouvé")
-        except KeyError as e:
-            print(f"Erreur de clé dans heroes.json: {e}")
-        except Exception as e:
-            print(f"Erreur lors du chargement des héros: {e}")
 
-        # Chargement des items
+        # Sauvegarde différée des joueurs
+        self.saver = WriteBehindSaver(self, self.storage, interval=float(os.getenv("SAVE_INTERVAL", "2")))
+
+    async def setup_hook(self):
+        self.saver.start()
+        self._daily_shop_task = asyncio.create_task(self.daily_shop.run(self))
+        if self.catalog_watcher is not None:
+            self._catalog_watch_task = asyncio.create_task(self.catalog_watcher.run(self))
+        self.metrics.start()
+        port = os.getenv("METRICS_PORT")
+        if port:
+            await self.metrics.serve(self, int(port), os.getenv("METRICS_HOST", "127.0.0.1"))
+
+    async def close(self):
+        if self._daily_shop_task is not None:
+            self._daily_shop_task.cancel()
+        if self._catalog_watch_task is not None:
+            self._catalog_watch_task.cancel()
+        await self.metrics.stop()
+        # Vide la file d'écriture avant de couper la connexion
+        await self.saver.stop()
+        self.storage.close()
+        await super().close()
+
+    async def invoke(self, ctx: commands.Context):
+        """Commandes préfixées (et hybrides appelées par message) : chronométrées ici"""
+        profile = self.profiler.begin() if ctx.command is not None else None
+        start = time.perf_counter()
         try:
-            with open('items.json', 'r', encoding='utf-8') as f:
-                items_data = json.load(f)
-                if isinstance(items_data, list):
-                    for item_data in items_data:
-                        rarity_name = item_data['rarity'].upper()
-                        item_rarity = ItemRarity[rarity_name]
-
-                        compatible_classes = []
-                        for class_name in item_data['compatible_classes']:
-                            class_name_upper = class_name.upper()
-                            if class_name_upper in class_mapping:
-                                class_name_upper = class_mapping[class_name_upper]
-                            class_enum = HeroClass[class_name_upper]
-                            compatible_classes.append(class_enum)
-
-                        item = Item(
-                            id=item_data['id'],
-                            name=item_data['name'],
-                            rarity=item_rarity,
-                            compatible_classes=compatible_classes,
-                            image=item_data['image'],
-                            price=item_data['price'],
-                            stats=item_data['stats'],
-                            description=item_data.get('description', '')
-                        )
-                        self.items_db[item.id] = item
-        except FileNotFoundError:
-            print("Fichier items.json non trouvé")
-        except KeyError as e:
-            print(f"Erreur de clé dans items.json: {e}")
-        except Exception as e:
-            print(f"Erreur lors du chargement des items: {e}")
+            await super().invoke(ctx)
+        finally:
+            elapsed = time.perf_counter() - start
+            if ctx.command is not None:
+                self.metrics.observe_command(ctx.command.qualified_name, "prefix", elapsed, failed=ctx.command_failed)
+                self.profiler.end(profile, ctx.command.qualified_name, ctx.message.content, elapsed)
+
+    def finish_interaction(self, interaction: discord.Interaction, name: str, failed: bool = False):
+        """Clôt la mesure (et le profil éventuel) d'une commande slash"""
+        start = interaction.extras.pop('metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        self.metrics.observe_command(name, "slash", elapsed, failed=failed)
+        self.profiler.end(interaction.extras.pop('profile', None), name, interaction_arguments(interaction), elapsed)
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        self.finish_interaction(interaction, command.qualified_name)
+
+    async def _record_hybrid_error(self, ctx: commands.Context, error: commands.CommandError):
+        # Une hybride appelée en slash qui échoue ne passe ni par invoke ni par l'arbre
+        if ctx.interaction is None or ctx.command is None:
+            return
+        self.finish_interaction(ctx.interaction, ctx.command.qualified_name, failed=True)
+    
+    def load_data(self):
+        # Catalogue : instantané compilé s'il est à jour, sinon compilation des fichiers JSON
+        catalog = Catalog.load_snapshot()
+        if catalog is None:
+            catalog = Catalog.from_files()
+            for error in catalog.errors:
+                print(f"Erreur dans le catalogue: {error}")
+        self.install_catalog(catalog)
 
-        # Chargement des joueurs
+        # Index des joueurs : les profils eux-mêmes sont chargés à la demande
+        powers = {}
         try:
-            with open('players.json', 'r', encoding='utf-8') as f:
-                players_data = json.load(f)
-                for player_data in players_data:
-                    player = PlayerData(
-                        user_id=player_data['user_id'],
-                        gold=player_data['gold'],
-                        heroes=player_data['heroes'],
-                        items=player_data['items'],
-                        last_daily_claim=player_data.get('last_daily_claim', None)
-                    )
-                    self.players[player.user_id] = player
+            powers = self.storage.load_index()
         except FileNotFoundError:
             print("Fichier players.json non trouvé")
+        except LedgerLockedError:
+            raise  # Démarrer sans les joueurs reviendrait à écrire par-dessus le journal d'un autre processus
         except Exception as e:
             print(f"Erreur lors du chargement des joueurs: {e}")
 
-        # Chargement des coffres
         try:
-            with open('chests.json', 'r', encoding='utf-8') as f:
-                chests_data = json.load(f)
-                for chest_data in chests_data:
-                    chest = ChestType(
-                        name=chest_data['name'],
-                        rarity_distribution=chest_data['rarity_distribution'],
-                        loot_amount=chest_data['loot_amount'],
-                        image=chest_data['image'],
-                        description=chest_data['description'],
-                        price=chest_data.get('price', 300),
-                        color=chest_data.get('color', '#5865F2'),
-                        hidden=chest_data.get('hidden', False)
-                    )
-                    self.chests_db[chest.name] = chest
-        except FileNotFoundError:
-            print("Fichier chests.json non trouvé")
+            self.usernames.load(self.storage.load_usernames())
         except Exception as e:
-            print(f"Erreur lors du chargement des coffres: {e}")
+            print(f"Erreur lors du chargement des pseudos: {e}")
 
-        # Mise à jour des items du jour après chargement
-        maj_items_du_jour(self)
+        self.rebuild_leaderboard(powers)
+
+        # Items du jour : seule lecture du fichier, au démarrage
+        self.daily_shop.load(self.items_db)
     
     def save_data(self):
-        players_data = []
-        for player in self.players.values():
-            player_dict = asdict(player)
-            # Conversion des hero_levels en dicts
-            hero_levels_dict = {}
-            for hero_id, level_obj in player.hero_levels.items():
-                hero_levels_dict[str(hero_id)] = asdict(level_obj)
-            player_dict['hero_levels'] = hero_levels_dict
-            players_data.append(player_dict)
-        
-        with open('players.json', 'w', encoding='utf-8') as f:
-            json.dump(players_data, f, indent=2, ensure_ascii=False)
-        sauvegarder_items_du_jour()
+        """Sauvegarde complète et synchrone (préférer mark_dirty dans les commandes)"""
+        start = time.perf_counter()
+        self.storage.write_players([self.player_row(player.user_id) for player in list(self.players.values())])
+        self.daily_shop.save()
+        self.metrics.observe_save("complete", time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def transaction(self, user_id: int):
+        """Exécute une opération économique sous le verrou du joueur, avec rollback en cas d'erreur"""
+        async with self.user_locks.lock(user_id):
+            transaction = PlayerTransaction(self, self.get_player(user_id))
+            try:
+                yield transaction
+            except BaseException:
+                transaction.rollback()
+                raise
+            transaction.commit()
+
+    def mark_dirty(self, user_id: int):
+        """Signale qu'un joueur a changé ; il sera écrit lors de la prochaine sauvegarde groupée"""
+        self.saver.mark_dirty(user_id)
+        self.inventory_indexes.invalidate(user_id)
+
+    def inventory_index(self, user_id: int, kind: str) -> InventoryIndex:
+        """Index d'inventaire (« items » ou « heros ») du joueur, reconstruit seulement après un changement"""
+        index = self.inventory_indexes.get(user_id, kind)
+        if index is None:
+            player = self.get_player(user_id)
+            if kind == "items":
+                index = ItemInventoryIndex.build(player, self.items_db)
+            else:
+                index = HeroInventoryIndex.build(player, self.heroes_db, self.items_db)
+            self.inventory_indexes.put(user_id, index)
+        return index
+
+    async def grant_experience(self, user_ids: List[int], amount: int, hero_id: Optional[int] = None,
+                               chunk_size: int = 500) -> tuple:
+        """Donne de l'XP à tous les héros (ou au héros hero_id) de plusieurs joueurs.
+
+        Les joueurs sont traités par lots : un seul calcul vectorisé par lot, puis la
+        main est rendue à la boucle. Un joueur en pleine transaction passe par son
+        verrou pour que son rollback éventuel n'efface pas le gain.
+        Renvoie (nombre de héros, niveaux gagnés).
+        """
+        heroes = level_ups = 0
+        busy = []
+        for start in range(0, len(user_ids), chunk_size):
+            levels = []
+            owners = []
+            for user_id in user_ids[start:start + chunk_size]:
+                if user_id in self.user_locks:
+                    busy.append(user_id)
+                    continue
+                player = self.get_player(user_id)
+                count = len(levels)
+                for owned_id, instance in player.heroes.items():
+                    if hero_id is None or owned_id == hero_id:
+                        levels.append(instance.level)
+                        owners.append((user_id, owned_id))
+                if len(levels) > count:
+                    # Marqué avant le chargement des suivants : un profil modifié n'est jamais évincé
+                    self.mark_dirty(user_id)
+            level_ups += grant_experience_batch(levels, amount)
+            heroes += len(levels)
+
+            if self.storage.records_events:
+                self.saver.record([
+                    {'type': 'hero_level', 'user_id': user_id, 'hero_id': owned_id,
+                     'total_experience': level.total_experience}
+                    for (user_id, owned_id), level in zip(owners, levels)
+                ])
+            await asyncio.sleep(0)
+
+        for user_id in busy:
+            async with self.transaction(user_id) as tx:
+                levels = [
+                    instance.level for owned_id, instance in tx.player.heroes.items()
+                    if hero_id is None or owned_id == hero_id
+                ]
+                level_ups += grant_experience_batch(levels, amount)
+                heroes += len(levels)
+        return heroes, level_ups
+
+    async def run_battles(self, side_a: np.ndarray, side_b: np.ndarray, seed=None) -> BattleResults:
+        """Résout un lot de combats (voir simulate_battles) dans un thread, hors de la boucle d'événements"""
+        return await asyncio.to_thread(simulate_battles, side_a, side_b, seed)
     
     def get_player(self, user_id: int) -> PlayerData:
-        if user_id not in self.players:
-            self.players[user_id] = PlayerData(user_id)
-        return self.players[user_id]
-    
+        player = self.players.lookup(user_id)
+        if player is None:
+            player = self.storage.load_player(user_id)
+            if player is None:
+                # Nouveau joueur : classé seulement à son premier changement enregistré (refresh_power au commit)
+                player = PlayerData(user_id)
+            else:
+                self.fit_player_loadouts(player)
+                if self._stored_powers_stale:
+                    self.leaderboard.update(user_id, self.compute_player_power(player))
+            self.players.put(player)
+            # Le profil qu'on renvoie n'est pas encore marqué modifié : il ne doit pas partir tout de suite
+            self.evict_cold_players(keep=user_id)
+        return player
+
+    def evict_cold_players(self, keep: Optional[int] = None) -> int:
+        """Libère les profils froids déjà écrits (les profils modifiés, en cours d'écriture ou verrouillés restent)"""
+        saver = self.saver
+        return self.players.evict(
+            lambda user_id: user_id == keep or user_id in saver.dirty or user_id in saver.inflight
+            or user_id in self.user_locks
+        )
+
+    def player_row(self, user_id: int) -> dict:
+        """Forme stockée d'un profil chargé, avec sa puissance pour reconstruire le classement"""
+        return player_to_dict(self.players[user_id], self.leaderboard.power(user_id))
+
+    async def resolve_usernames(self, user_ids: List[int]) -> Dict[int, str]:
+        """Pseudos des joueurs : cache d'abord, puis cache Discord, puis appels REST en parallèle"""
+        names = {}
+        misses = []
+        for user_id in user_ids:
+            name = self.usernames.get(user_id)
+            if name is None:
+                user = self.get_user(user_id)
+                if user is not None:
+                    name = user.name
+                    self.usernames.put(user_id, name)
+            if name is None:
+                misses.append(user_id)
+            else:
+                names[user_id] = name
+        self.usernames.hits += len(user_ids) - len(misses)
+        self.usernames.misses += len(misses)
+
+        if misses:
+            users = await asyncio.gather(*(self.fetch_user(user_id) for user_id in misses), return_exceptions=True)
+            for user_id, user in zip(misses, users):
+                if isinstance(user, Exception) or user is None:
+                    names[user_id] = f"Joueur {user_id}"
+                else:
+                    names[user_id] = user.name
+                    self.usernames.put(user_id, user.name)
+        return names
+
+    def compute_player_power(self, player: PlayerData) -> int:
+        total_power = 0
+        for hero_id, instance in player.heroes.items():
+            hero = self.heroes_db.get(hero_id)
+            if hero:
+                total_power += instance.puissance(hero, self.items_db)
+        return total_power
+
+    def fit_player_loadouts(self, player: PlayerData):
+        """Aligne l'équipement des héros d'un joueur sur les emplacements de leur classe.
+
+        Un item retiré du catalogue est déséquipé ; l'exemplaire reste dans l'inventaire
+        (il redevient utilisable si l'item revient au catalogue).
+        """
+        for hero_id, instance in player.heroes.items():
+            hero = self.heroes_db.get(hero_id)
+            if hero:
+                instance.fit_loadout(len(EQUIPMENT_SLOTS_BY_CLASS[hero.hero_class]))
+            for slot_index, item_id in enumerate(instance.loadout):
+                if item_id is not None and item_id not in self.items_db:
+                    instance.loadout[slot_index] = None
+                    instance.invalidate()
+
+    def fit_loadouts(self):
+        """Aligne l'équipement de tous les profils chargés"""
+        for player in self.players.values():
+            self.fit_player_loadouts(player)
+
+    def rebuild_leaderboard(self, powers: Dict[int, Optional[int]]):
+        """Reconstruit le classement depuis les puissances stockées (chargement des données uniquement)"""
+        self.leaderboard = PowerLeaderboard()
+        for user_id, power in powers.items():
+            if power is None:
+                # Puissance jamais stockée (ancien format) ou invalidée par le rejeu : calcul ponctuel
+                player = self.storage.load_player(user_id)
+                if player is None:
+                    continue
+                self.fit_player_loadouts(player)
+                power = self.compute_player_power(player)
+            self.leaderboard.update(user_id, power)
+
+    def refresh_power(self, user_id: int):
+        """Met à jour la puissance d'un joueur dans le classement (seules les instances modifiées sont recalculées)"""
+        player = self.players.get(user_id)
+        if player is not None:
+            self.leaderboard.update(user_id, self.compute_player_power(player))
+
+    def install_catalog(self, catalog: Catalog):
+        """Remplace le catalogue et ses index d'un seul bloc (aucune attente entre deux affectations)"""
+        self.catalog = catalog
+        self.heroes_db = catalog.heroes
+        self.items_db = catalog.items
+        self.chests_db = catalog.chests
+        self.items_by_rarity = catalog.items_by_rarity
+        self.loot_tables = catalog.loot_tables
+        self.hero_names = catalog.hero_names
+        self.item_names = catalog.item_names
+        self.chest_names = catalog.chest_names
+        self.build_shop_pages()
+        self.inventory_indexes.clear()
+
+    async def reload_catalog(self) -> Catalog:
+        """Recompile le catalogue hors de la boucle puis le remplace d'un bloc s'il est valide.
+
+        Le remplacement se fait sans attente : entre deux `await`, une commande voit soit
+        l'ancien catalogue, soit le nouveau. Une commande qui attend entre le tirage (ou
+        la recherche) et l'affichage garde donc la référence lue au départ
+        (`items_db = bot.items_db`). Lève CatalogError sans rien modifier si les fichiers
+        sont invalides.
+        """
+        async with self._catalog_lock:
+            catalog = await asyncio.to_thread(Catalog.from_files)
+            if catalog.errors:
+                raise CatalogError(catalog.errors)
+            self.swap_catalog(catalog)
+            try:
+                await asyncio.to_thread(catalog.save_snapshot)
+            except OSError as e:
+                print(f"Erreur lors de l'écriture du catalogue compilé: {e}")
+            return catalog
+
+    def swap_catalog(self, catalog: Catalog):
+        """Installe un catalogue et réaligne l'état qui en dépend (synchrone : aucune commande ne s'intercale)"""
+        self.install_catalog(catalog)
+        for player in self.players.values():
+            self.fit_player_loadouts(player)
+            for instance in player.heroes.values():
+                instance.invalidate()
+            # Un profil consulté mais jamais enregistré reste hors du classement
+            if self.leaderboard.power(player.user_id) is not None:
+                self.leaderboard.update(player.user_id, self.compute_player_power(player))
+        # Les autres profils sont recalculés à leur prochain chargement
+        self._stored_powers_stale = True
+        self.daily_shop.items = [catalog.items[item.id] for item in self.daily_shop.items if item.id in catalog.items]
+
+    def build_shop_pages(self):
+        """Précompile les pages de la boutique ; à refaire uniquement si le catalogue change"""
+        self.shop_pages = ShopPages(self.heroes_db, self.chests_db)
+
     def generate_loot(self, chest: ChestType) -> 'LootResult':
         loot = LootResult()
-        
-        for _ in range(chest.loot_amount):
-            rarities = list(chest.rarity_distribution.keys())
-            weights = list(chest.rarity_distribution.values())
-            selected_rarity = random.choices(rarities, weights=weights, k=1)[0]
-            
-            try:
-                rarity_enum = ItemRarity[selected_rarity.upper()]
-                available_items = [item for item in self.items_db.values() if item.rarity == rarity_enum]
-                if available_items:
-                    selected_item = random.choice(available_items)
-                    loot.items.append(selected_item.id)
-            except KeyError:
-                continue
+
+        table = self.loot_tables.get(chest.name)
+        if table is None:
+            table = self.loot_tables[chest.name] = LootTable(chest)
+
+        # Chaque tirage est en temps constant, quelle que soit la taille du catalogue
+        for rarity in table.roll(chest.loot_amount):
+            available_items = self.items_by_rarity.get(rarity)
+            if available_items:
+                loot.items.append(random.choice(available_items))
         
         loot.gold = random.randint(50, 200)
         return loot
 
+    def generate_bulk_loot(self, chest: ChestType, count: int) -> BulkLootResult:
+        """Ouvre count coffres identiques en un seul tirage vectorisé"""
+        loot = BulkLootResult(chests_opened=count)
+
+        table = self.loot_tables.get(chest.name)
+        if table is None:
+            table = self.loot_tables[chest.name] = LootTable(chest)
+
+        # Répartition multinomiale de tous les tirages entre raretés, puis entre items
+        rarity_counts = table.roll_counts(count * chest.loot_amount)
+        for rarity, rolls in zip(table.rarities, rarity_counts):
+            available_items = self.items_by_rarity.get(rarity)
+            if not rolls or not available_items:
+                continue
+            picks = np.bincount(LOOT_RNG.integers(0, len(available_items), size=rolls), minlength=len(available_items))
+            for index in np.flatnonzero(picks):
+                loot.items[available_items[index]] += int(picks[index])
+
+        # Même loi que generate_loot : 50 à 200 pièces par coffre
+        loot.gold = int(LOOT_RNG.integers(50, 201, size=count).sum())
+        return loot
+
+# ========== OUTILS HORS LIGNE ==========
+
+def compile_catalog_command(args: List[str]) -> int:
+    """Validation et compilation du catalogue : python bot.py --compile-catalog [--check]"""
+    catalog = Catalog.from_files()
+    for warning in catalog.warnings:
+        print(f"⚠️ {warning}")
+    for error in catalog.errors:
+        print(f"❌ {error}")
+    if catalog.errors:
+        print(f"❌ {len(catalog.errors)} erreur(s) : catalogue non compilé")
+        return 1
+    if "--check" not in args:
+        catalog.save_snapshot()
+        print(f"✅ {len(catalog.heroes)} héros, {len(catalog.items)} items, {len(catalog.chests)} coffres "
+              f"compilés dans {CATALOG_SNAPSHOT_PATH}")
+    return 0
+
+def offline_ledger() -> Optional[LedgerStorage]:
+    """Journal désigné par STORAGE_BACKEND / LEDGER_DIR, ouvert sans rejeu ni réparation"""
+    if os.getenv("STORAGE_BACKEND", "json").lower() != "ledger":
+        print("❌ Ces options demandent STORAGE_BACKEND=ledger")
+        return None
+    return create_storage()
+
+def ledger_audit_command(args: List[str]) -> int:
+    """Historique d'un joueur, en lecture seule : python bot.py --ledger-audit <user_id>"""
+    if len(args) != 1:
+        print("Utilisation : python bot.py --ledger-audit <user_id>")
+        return 1
+    storage = offline_ledger()
+    if storage is None:
+        return 1
+    user_id = int(args[0])
+    ranges = storage.undone_ranges()
+    for event in storage.iter_events(include_undone=True):
+        if event['user_id'] == user_id:
+            if storage.is_undone(event['seq'], ranges):
+                event = {**event, 'annule': True}
+            print(json.dumps(event, ensure_ascii=False))
+    return 0
+
+def ledger_rollback_command(args: List[str]) -> int:
+    """Retour à l'état au n° d'événement donné, bot arrêté : python bot.py --ledger-rollback <seq>
+
+    Les événements ultérieurs restent archivés mais ne sont plus rejoués.
+    """
+    if len(args) != 1:
+        print("Utilisation : python bot.py --ledger-rollback <seq>")
+        return 1
+    storage = offline_ledger()
+    if storage is None:
+        return 1
+    until_seq = int(args[0])
+    try:
+        if not storage.acquire_lock():
+            print("❌ Le bot utilise ce journal : arrête-le avant un retour arrière")
+            return 1
+        count = storage.rollback(until_seq)
+    except ValueError as e:
+        print(f"❌ Retour arrière annulé : {e}")
+        return 1
+    finally:
+        storage.close()
+    print(f"✅ État restauré au n° {until_seq} ({count} joueur(s))")
+    return 0
+
+# Ces outils ne touchent ni aux joueurs ni à la boutique du jour : ils passent avant la création du bot
+OFFLINE_COMMANDS = {
+    "--compile-catalog": compile_catalog_command,
+    "--ledger-audit": ledger_audit_command,
+    "--ledger-rollback": ledger_rollback_command,
+}
+
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in OFFLINE_COMMANDS:
+    sys.exit(OFFLINE_COMMANDS[sys.argv[1]](sys.argv[2:]))
+
 # Création de l'instance globale du bot
 bot = HeroBot()
 
 # ========== COMMANDES SLASH (pour le badge Developer) ==========
 
+# ========== AUTOCOMPLÉTION ==========
+
+def did_you_mean(index: NameIndex, name: str) -> str:
+    """Suffixe de message d'erreur proposant les noms les plus proches"""
+    suggestions = index.suggest(name, limit=3)
+    if not suggestions:
+        return ""
+    return " Vouliez-vous dire : " + ", ".join(f"**{s}**" for s in suggestions) + " ?"
+
+def as_choices(names: List[str]) -> List[app_commands.Choice[str]]:
+    return [app_commands.Choice(name=name, value=name) for name in names[:25]]
+
+async def hero_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    return as_choices(bot.hero_names.suggest(current))
+
+async def item_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    return as_choices(bot.item_names.suggest(current))
+
+async def owned_hero_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    player = bot.get_player(interaction.user.id)
+    names = [
+        name for name in bot.hero_names.suggest(current, limit=100)
+        if bot.hero_names.get(name) in player.heroes
+    ]
+    return as_choices(names)
+
+async def owned_chest_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    player = bot.get_player(interaction.user.id)
+    owned = player.chests
+    choices = [
+        app_commands.Choice(name=f"{name} (x{owned[name]})", value=name)
+        for name in bot.chest_names.suggest(current, limit=100) if owned[name]
+    ]
+    return choices[:25]
+
 @bot.tree.command(name="info", description="Affiche les informations du bot HeroBot")
-async def info_slash(interaction: discord.Interaction):
-    """Commande slash pour afficher les infos du bot"""
+@app_commands.describe(heros="Un de tes héros, pour afficher sa fiche")
+@app_commands.autocomplete(heros=owned_hero_autocomplete)
+async def info_slash(interaction: discord.Interaction, heros: Optional[str] = None):
+    """Commande slash pour afficher les infos du bot, ou la fiche d'un héros"""
     player = bot.get_player(interaction.user.id)
+
+    if heros:
+        hero_id = bot.hero_names.resolve(heros)
+        if hero_id is None or hero_id not in player.heroes:
+            await interaction.response.send_message("❌ Vous ne possédez pas ce héros (vérifie l'orthographe).", ephemeral=True)
+            return
+        await interaction.response.send_message(embed=build_hero_embed(player, hero_id))
+        return
     
     embed = discord.Embed(
         title="🎮 HeroBot - Informations",
@@ -447,7 +3614,7 @@ async def info_slash(interaction: discord.Interaction):
     )
     embed.add_field(name="💰 Ton or", value=f"{player.gold} gold", inline=True)
     embed.add_field(name="🦸 Tes héros", value=f"{len(player.heroes)} héros", inline=True)
-    embed.add_field(name="⚔️ Tes items", value=f"{len(player.items)} items", inline=True)
+    embed.add_field(name="⚔️ Tes items", value=f"{player.item_count} items", inline=True)
     embed.add_field(
         name="📋 Commandes",
         value="Utilise `!help` pour voir toutes les commandes disponibles",
@@ -463,7 +3630,7 @@ async def stats_slash(interaction: discord.Interaction):
     player = bot.get_player(interaction.user.id)
     
     total_heroes = len(player.heroes)
-    total_items = len(player.items)
+    total_items = player.item_count
     
     # Compte des raretés de héros
     hero_rarities = {}
@@ -510,25 +3677,132 @@ async def on_ready():
     except Exception as e:
         print(f'❌ Erreur lors de la synchronisation des commandes slash: {e}')
 
-@bot.command(name='open')
+BULK_OPEN_ALL = ("tout", "tous", "all")
+
+def parse_bulk_open(argument: str):
+    """Découpe « Coffre Commun x50 » / « Coffre Commun tout » / « tout » en (nom, quantité).
+
+    Quantité None : ouverture simple animée ; 0 : tous les coffres possédés.
+    """
+    words = argument.split()
+    if not words:
+        return argument, None
+    last = words[-1].lower()
+    if last in BULK_OPEN_ALL:
+        return " ".join(words[:-1]), 0
+    if len(words) > 1 and last.startswith("x") and last[1:].isdigit() and int(last[1:]) > 0:
+        return " ".join(words[:-1]), int(last[1:])
+    return argument, None
+
+def build_bulk_loot_embed(results: List[tuple]) -> discord.Embed:
+    """Résumé unique d'une ouverture en masse : [(ChestType, BulkLootResult), ...]"""
+    total_chests = sum(loot.chests_opened for _, loot in results)
+    total_gold = sum(loot.gold for _, loot in results)
+    total_emblems = sum(loot.emblems for _, loot in results)
+    items = Counter()
+    for _, loot in results:
+        items.update(loot.items)
+
+    embed = discord.Embed(
+        title="🎁 Ouverture en masse terminée !",
+        description="\n".join(f"📦 **{chest.name}** x{loot.chests_opened}" for chest, loot in results),
+        color=discord.Color.green()
+    )
+    if total_gold > 0:
+        embed.add_field(name="💰 Pièces", value=f"+{total_gold}", inline=True)
+    if total_emblems > 0:
+        embed.add_field(name="🏆 Emblèmes du Triomphe", value=f"+{total_emblems}", inline=True)
+
+    if items:
+        # Items les plus rares en premier, en restant sous la limite de 1024 caractères d'un champ
+        ordered = sorted(items.items(), key=lambda entry: (-bot.items_db[entry[0]].rarity.rank, bot.items_db[entry[0]].name))
+        lines = []
+        length = 0
+        for shown, (item_id, count) in enumerate(ordered):
+            item = bot.items_db[item_id]
+            line = f"{item.rarity.emoji} {item.name} x{count}"
+            if length + len(line) + 1 > 950:
+                lines.append(f"… et {len(ordered) - shown} autre(s) item(s)")
+                break
+            lines.append(line)
+            length += len(line) + 1
+        embed.add_field(name=f"🎒 Items obtenus ({sum(items.values())})", value="\n".join(lines), inline=False)
+
+    embed.set_footer(text=f"{total_chests} coffre(s) ouvert(s)")
+    return embed
+
+async def open_chests_bulk(ctx, chest_name: str, count: int):
+    """Ouverture de plusieurs coffres : un tirage groupé, une mutation, une sauvegarde, un message"""
+    async with bot.transaction(ctx.author.id) as tx:
+        player = tx.player
+        owned = player.chests
+        if chest_name:
+            tx.require(owned[chest_name] > 0, "❌ Vous ne possédez pas ce coffre !")
+            tx.require(chest_name in bot.chests_db, "❌ Coffre introuvable dans la base de données !")
+            available = owned[chest_name]
+            tx.require(count <= available, f"❌ Vous ne possédez que {available} {chest_name}.")
+            to_open = {chest_name: count or available}
+        else:
+            # « !open tout » : tous les coffres connus du joueur
+            to_open = {name: n for name, n in owned.items() if name in bot.chests_db}
+            tx.require(bool(to_open), "❌ Vous n'avez aucun coffre !")
+
+        results = [
+            (bot.chests_db[name], bot.generate_bulk_loot(bot.chests_db[name], n))
+            for name, n in to_open.items()
+        ]
+
+        # Application en une seule fois (sauvegardée au commit de la transaction)
+        for chest, loot in results:
+            player.remove_chests(chest.name, loot.chests_opened)
+            player.gold += loot.gold
+            player.emblems += loot.emblems
+            player.add_items(loot.items)
+
+    # Hors transaction : un envoi qui échoue ne reprend pas le loot
+    await ctx.send(embed=build_bulk_loot_embed(results))
+
+@bot.hybrid_command(name='open', description="Ouvre un coffre (ajoute x<nombre> ou « tout » pour en ouvrir plusieurs)")
+@app_commands.describe(chest_name="Nom du coffre")
+@app_commands.autocomplete(chest_name=owned_chest_autocomplete)
 async def open_chest(ctx, *, chest_name: str):
-    """Ouvre un coffre avec animation"""
-    player = bot.get_player(ctx.author.id)
-    
-    # Vérifier si le joueur a ce coffre
-    if chest_name not in player.chests:
-        await ctx.send("❌ Vous ne possédez pas ce coffre !")
-        return
-    
-    # Trouver le coffre dans la base de données
-    chest = bot.chests_db.get(chest_name)
-    if not chest:
-        await ctx.send("❌ Coffre introuvable dans la base de données !")
-        return
-    
-    # Retirer le coffre de l'inventaire
-    player.chests.remove(chest_name)
-    
+    """Ouvre un coffre avec animation, ou plusieurs d'un coup (« x50 », « tout »)"""
+    chest_name, bulk_count = parse_bulk_open(chest_name)
+    # Nom exact du catalogue, quels que soient la casse et les accents saisis
+    chest_name = bot.chest_names.resolve(chest_name) or chest_name
+
+    try:
+        if bulk_count is not None:
+            await open_chests_bulk(ctx, chest_name, bulk_count)
+        else:
+            await open_single_chest(ctx, chest_name)
+    except TransactionError as e:
+        await ctx.send(str(e))
+
+async def open_single_chest(ctx, chest_name: str):
+    """Ouverture animée d'un seul coffre"""
+    # Le coffre est retiré et le loot acquis sous le verrou, avant l'animation : pas de double
+    # ouverture, et un message qui échoue ensuite ne reprend pas un loot déjà affiché
+    async with bot.transaction(ctx.author.id) as tx:
+        player = tx.player
+
+        # Vérifier si le joueur a ce coffre
+        tx.require(chest_name in player.chests, "❌ Vous ne possédez pas ce coffre !" + did_you_mean(bot.chest_names, chest_name))
+
+        # Trouver le coffre dans la base de données
+        chest = bot.chests_db.get(chest_name)
+        tx.require(chest is not None, "❌ Coffre introuvable dans la base de données !")
+
+        # Retirer le coffre de l'inventaire
+        player.remove_chests(chest_name)
+
+        # Générer le loot et l'ajouter au joueur ; l'affichage utilise le catalogue du tirage
+        loot = bot.generate_loot(chest)
+        items_db = bot.items_db
+        player.gold += loot.gold
+        player.emblems += loot.emblems
+        player.add_items(loot.items)
+
     # Animation d'ouverture
     embed = discord.Embed(
         title="📦 Ouverture du coffre...",
@@ -552,14 +3826,6 @@ async def open_chest(ctx, *, chest_name: str):
         embed.color = color
         await message.edit(embed=embed)
     
-    # Générer le loot
-    loot = bot.generate_loot(chest)
-    
-    # Ajouter le loot au joueur
-    player.gold += loot.gold
-    player.emblems += loot.emblems
-    player.items.extend(loot.items)
-    
     # Affichage des récompenses
     await asyncio.sleep(1)
     
@@ -578,7 +3844,7 @@ async def open_chest(ctx, *, chest_name: str):
     if loot.items:
         items_text = []
         for item_id in loot.items:
-            item = bot.items_db[item_id]
+            item = items_db[item_id]
             items_text.append(f"{item.rarity.emoji} {item.name}")
         
         embed.add_field(
@@ -587,7 +3853,6 @@ async def open_chest(ctx, *, chest_name: str):
             inline=False
         )
     
-    bot.save_data()
     await message.edit(embed=embed)
     
     embed = discord.Embed(
@@ -606,10 +3871,8 @@ async def my_chests(ctx):
         await ctx.send("❌ Vous n'avez aucun coffre !")
         return
     
-    # Compter les coffres par type
-    chest_counts = {}
-    for chest_name in player.chests:
-        chest_counts[chest_name] = chest_counts.get(chest_name, 0) + 1
+    # Coffres déjà comptés par type dans l'inventaire
+    chest_counts = player.chests
     
     embed = discord.Embed(
         title=f"📦 Coffres de {ctx.author.display_name}",
@@ -643,153 +3906,201 @@ async def profile(ctx):
     # Collection
     embed.add_field(
         name="🎒 Collection", 
-        value=f"Héros: {len(player.heroes)} 👥\nItems: {len(player.items)} ⚔️\nCoffres: {len(player.chests)} 📦", 
+        value=f"Héros: {len(player.heroes)} 👥\nItems: {player.item_count} ⚔️\nCoffres: {player.chest_count} 📦", 
         inline=False
     )
 
     # Niveau moyen des héros
-    if player.heroes and player.hero_levels:
-        total_level = sum(player.hero_levels.get(h_id, HeroLevel()).level for h_id in player.heroes)
+    if player.heroes:
+        total_level = sum(instance.level.level for instance in player.heroes.values())
         avg_level = total_level / len(player.heroes)
         embed.add_field(name="📊 Niveau moyen", value=f"{avg_level:.1f}", inline=True)
     
     await ctx.send(embed=embed)
 
-@bot.command()
+@bot.hybrid_command(description="Acheter un héros ou un item")
+@app_commands.describe(hero_name="Héros à acheter", item_name="Item à acheter")
+@app_commands.autocomplete(hero_name=hero_autocomplete, item_name=item_autocomplete)
 async def buy(ctx, hero_name: str = None, item_name: str = None):
-    player = bot.get_player(ctx.author.id)
-    
     if hero_name:
-        # Chercher un héros par nom (insensible à la casse)
-        hero = next((h for h in bot.heroes_db.values() if h.name.lower() == hero_name.lower()), None)
-        if hero:
-            # logique achat héros ici
-            if hero.id in player.heroes:
-                await ctx.send("❌ Vous avez déjà ce héros.")
-                return
-            if player.gold < hero.price:
-                await ctx.send("❌ Pas assez d'or pour ce héros.")
-                return
-            player.gold -= hero.price
-            player.heroes.append(hero.id)
-            bot.save_data()
-            await ctx.send(f"✅ Vous avez acheté le héros {hero.name} pour {hero.price} gold.")
+        # Chercher un héros par nom (casse et accents ignorés)
+        hero_id = bot.hero_names.get(hero_name)
+        hero = bot.heroes_db.get(hero_id) if hero_id is not None else None
+        if not hero:
+            await ctx.send("❌ Héros introuvable." + did_you_mean(bot.hero_names, hero_name))
             return
-        else:
-            await ctx.send("❌ Héros introuvable.")
+
+        try:
+            async with bot.transaction(ctx.author.id) as tx:
+                tx.require(hero.id not in tx.player.heroes, "❌ Vous avez déjà ce héros.")
+                tx.require(tx.player.gold >= hero.price, "❌ Pas assez d'or pour ce héros.")
+                tx.player.gold -= hero.price
+                tx.player.add_hero(hero)
+        except TransactionError as e:
+            await ctx.send(str(e))
             return
+        await ctx.send(f"✅ Vous avez acheté le héros {hero.name} pour {hero.price} gold.")
+        return
     
     if item_name:
-        # Chercher un item par nom (insensible à la casse)
-        item = next((i for i in bot.items_db.values() if i.name.lower() == item_name.lower()), None)
-        if item:
-            # logique achat item ici
-            if item.id in player.items:
-                await ctx.send("❌ Vous avez déjà cet item.")
-                return
-            if player.gold < item.price:
-                await ctx.send("❌ Pas assez d'or pour cet item.")
-                return
-            player.gold -= item.price
-            player.items.append(item.id)
-            bot.save_data()
-            await ctx.send(f"✅ Vous avez acheté l'item {item.name} pour {item.price} gold.")
+        # Chercher un item par nom (casse et accents ignorés)
+        item_id = bot.item_names.get(item_name)
+        item = bot.items_db.get(item_id) if item_id is not None else None
+        if not item:
+            await ctx.send("❌ Item introuvable." + did_you_mean(bot.item_names, item_name))
             return
-        else:
-            await ctx.send("❌ Item introuvable.")
+
+        try:
+            async with bot.transaction(ctx.author.id) as tx:
+                tx.require(item.id not in tx.player.items, "❌ Vous avez déjà cet item.")
+                tx.require(tx.player.gold >= item.price, "❌ Pas assez d'or pour cet item.")
+                tx.player.gold -= item.price
+                tx.player.add_items([item.id])
+        except TransactionError as e:
+            await ctx.send(str(e))
             return
+        await ctx.send(f"✅ Vous avez acheté l'item {item.name} pour {item.price} gold.")
+        return
     
     await ctx.send("❌ Veuillez préciser soit un héros, soit un item à acheter.")
 
+class InventoryView(View):
+    """Vue paginée de !items ou !heros : chaque page est une tranche de l'index mis en cache"""
+
+    TITLES = {"items": "🎒 Items de {name}", "heros": "👥 Héros de {name}"}
+
+    def __init__(self, user, kind: str, query: InventoryQuery):
+        super().__init__(timeout=120)
+        self.user = user
+        self.kind = kind
+        self.query = query
+        self.page = 0
+        self.pages = 1
+
+    def create_page_embed(self) -> discord.Embed:
+        # Index relu à chaque page : il est reconstruit si le profil a changé entre deux clics
+        index = bot.inventory_index(self.user.id, self.kind)
+        lines, self.page, self.pages, total = index.page(self.query, self.page)
+        embed = discord.Embed(
+            title=self.TITLES[self.kind].format(name=self.user.display_name),
+            description="\n".join(lines) or "Aucun résultat pour ces filtres.",
+            color=discord.Color.blue()
+        )
+        footer = f"Page {self.page + 1}/{self.pages} · {total} résultat(s) sur {len(index)} · tri : {self.query.sort}"
+        if self.query.facets():
+            footer += f" · {self.query.describe()}"
+        embed.set_footer(text=footer)
+        self.refresh_buttons()
+        return embed
+
+    def refresh_buttons(self):
+        self.clear_items()
+        if self.pages > 1:
+            self.add_item(InventoryPageButton("⏮️", "debut", self.page > 0))
+            self.add_item(InventoryPageButton("⬅️", "precedent", self.page > 0))
+            self.add_item(InventoryPageButton("➡️", "suivant", self.page < self.pages - 1))
+            self.add_item(InventoryPageButton("⏭️", "fin", self.page < self.pages - 1))
+
+class InventoryPageButton(Button):
+    def __init__(self, emoji: str, target: str, enabled: bool):
+        super().__init__(emoji=emoji, style=discord.ButtonStyle.primary, disabled=not enabled)
+        self.target = target
+
+    async def callback(self, interaction: discord.Interaction):
+        # refresh_buttons() détache ce bouton de la vue : on garde une référence
+        view = self.view
+        if interaction.user != view.user:
+            return await interaction.response.send_message("❌ Ce menu n'est pas pour toi.", ephemeral=True)
+
+        view.page = {
+            "debut": 0,
+            "precedent": view.page - 1,
+            "suivant": view.page + 1,
+            "fin": view.pages - 1,
+        }[self.target]
+        embed = view.create_page_embed()
+        await interaction.response.edit_message(embed=embed, view=view)
+
+async def send_inventory(ctx, kind: str, filters: str):
+    try:
+        query = parse_inventory_query(filters, kind)
+    except ValueError as e:
+        await ctx.send(f"❌ {e}")
+        return
+    view = InventoryView(ctx.author, kind, query)
+    embed = view.create_page_embed()
+    await ctx.send(embed=embed, view=view if view.children else None)
+
 @bot.command(name='heros')
-async def my_heroes(ctx):
-    """Affiche les héros du joueur"""
+async def my_heroes(ctx, *, filtres: str = ""):
+    """Affiche les héros du joueur : !heros [rareté] [classe] [tri:rarete|nom|niveau|puissance]"""
     player = bot.get_player(ctx.author.id)
     
     if not player.heroes:
         await ctx.send("❌ Vous n'avez aucun héros recruté pour le moment.")
         return
     
-    embed = discord.Embed(
-        title=f"👥 Héros de {ctx.author.display_name}",
-        color=discord.Color.blue()
-    )
-    
-    for hero_id in player.heroes:
-        hero = bot.heroes_db[hero_id]
-        equipped_count = len(hero.equipped_items)
-        
-        embed.add_field(
-            name=f"{hero.rarity.emoji} {hero.name}",
-            value=f"Classe: {hero.hero_class.value}\nÉquipement: {equipped_count}/6",
-            inline=True
-        )
-    
-    await ctx.send(embed=embed)
+    await send_inventory(ctx, "heros", filtres)
 
 @bot.command(name='items')
-async def my_items(ctx):
-    """Affiche les items du joueur"""
+async def my_items(ctx, *, filtres: str = ""):
+    """Affiche les items du joueur : !items [rareté] [classe] [emplacement] [tri:rarete|nom|quantite]"""
     player = bot.get_player(ctx.author.id)
     
     if not player.items:
         await ctx.send("❌ Vous n'avez aucun item pour le moment.")
         return
     
-    embed = discord.Embed(
-        title=f"🎒 Items de {ctx.author.display_name}",
-        color=discord.Color.blue()
-    )
-    
-    for item_id in player.items:
-        item = bot.items_db[item_id]
-        classes_str = ", ".join([c.value for c in item.compatible_classes])
-        stats_str = ", ".join([f"{k}: +{v}" for k, v in item.stats.items()])
-        
-        embed.add_field(
-            name=f"{item.rarity.emoji} {item.name}",
-            value=f"Classes: {classes_str}\nStats: {stats_str}",
-            inline=True
-        )
-    
-    await ctx.send(embed=embed)
+    await send_inventory(ctx, "items", filtres)
+
+def item_label(item_id: int, bold: bool = True) -> str:
+    """Nom affiché d'un item, y compris s'il a été retiré du catalogue depuis"""
+    item = bot.items_db.get(item_id)
+    name = item.name if item else f"Item retiré #{item_id}"
+    return f"{item.rarity.emoji if item else '❔'} " + (f"**{name}**" if bold else name)
+
+def hero_label(hero_id: int) -> str:
+    """Nom affiché d'un héros, y compris s'il a été retiré du catalogue depuis"""
+    hero = bot.heroes_db.get(hero_id)
+    return f"{hero.rarity.emoji} **{hero.name}**" if hero else f"❔ **Héros retiré #{hero_id}**"
 
 @bot.command(name='equip')
 async def equip_item(ctx, hero_id: int, item_id: int):
     """Équipe un item sur un héros"""
-    player = bot.get_player(ctx.author.id)
-    
-    # Vérifications
-    if hero_id not in player.heroes:
-        await ctx.send("❌ Vous ne possédez pas ce héros.")
-        return
-    
-    if item_id not in player.items:
-        await ctx.send("❌ Vous ne possédez pas cet item.")
-        return
-    
-    hero = bot.heroes_db[hero_id]
-    item = bot.items_db[item_id]
-    
-    # Vérifier la compatibilité de classe
-    if hero.hero_class not in item.compatible_classes:
-        await ctx.send(f"❌ Cet item n'est pas compatible avec la classe {hero.hero_class.value}.")
-        return
-    
-    # Vérifier si l'item est déjà équipé
-    if item_id in hero.equipped_items:
-        await ctx.send("❌ Cet item est déjà équipé sur ce héros.")
-        return
-    
-    # Vérifier la limite d'équipement
-    if len(hero.equipped_items) >= 6:
-        await ctx.send("❌ Ce héros a déjà 6 items équipés.")
+    try:
+        async with bot.transaction(ctx.author.id) as tx:
+            player = tx.player
+
+            # Vérifications
+            tx.require(hero_id in player.heroes, "❌ Vous ne possédez pas ce héros.")
+            tx.require(item_id in player.items, "❌ Vous ne possédez pas cet item.")
+
+            hero = bot.heroes_db.get(hero_id)
+            item = bot.items_db.get(item_id)
+            tx.require(hero is not None, "❌ Ce héros a été retiré du catalogue.")
+            tx.require(item is not None, "❌ Cet item a été retiré du catalogue.")
+            instance = player.heroes[hero_id]
+
+            # Vérifier la compatibilité de classe
+            tx.require(hero.hero_class in item.compatible_classes,
+                       f"❌ Cet item n'est pas compatible avec la classe {hero.hero_class.value}.")
+
+            # Chaque exemplaire possédé ne peut être porté que par un seul héros
+            if player.equipped_count(item_id) >= player.items[item_id]:
+                if item_id in instance.loadout:
+                    raise TransactionError("❌ Cet item est déjà équipé sur ce héros.")
+                raise TransactionError("❌ Tous vos exemplaires de cet item sont déjà équipés.")
+
+            # Trouver un emplacement libre du bon type
+            slot_index = instance.free_slot(hero, item)
+            tx.require(slot_index is not None, f"❌ Aucun emplacement « {item.slot} » libre sur ce héros.")
+
+            # Équiper l'item
+            instance.equip(slot_index, item_id)
+    except TransactionError as e:
+        await ctx.send(str(e))
         return
     
-    # Équiper l'item
-    hero.equipped_items.append(item_id)
-    bot.save_data()
-    
     embed = discord.Embed(
         title="✅ Item équipé !",
         description=f"{item.rarity.emoji} **{item.name}** équipé sur {hero.rarity.emoji} **{hero.name}**",
@@ -800,53 +4111,131 @@ async def equip_item(ctx, hero_id: int, item_id: int):
 @bot.command(name='unequip')
 async def unequip_item(ctx, hero_id: int, item_id: int):
     """Déséquipe un item d'un héros"""
-    player = bot.get_player(ctx.author.id)
-    
-    if hero_id not in player.heroes:
-        await ctx.send("❌ Vous ne possédez pas ce héros.")
-        return
-    
-    hero = bot.heroes_db[hero_id]
-    
-    if item_id not in hero.equipped_items:
-        await ctx.send("❌ Cet item n'est pas équipé sur ce héros.")
+    try:
+        async with bot.transaction(ctx.author.id) as tx:
+            tx.require(hero_id in tx.player.heroes, "❌ Vous ne possédez pas ce héros.")
+            # Déséquiper l'item
+            tx.require(tx.player.heroes[hero_id].unequip(item_id), "❌ Cet item n'est pas équipé sur ce héros.")
+    except TransactionError as e:
+        await ctx.send(str(e))
         return
-    
-    # Déséquiper l'item
-    hero.equipped_items.remove(item_id)
-    bot.save_data()
-    
-    item = bot.items_db[item_id]
+
+    # La transaction est validée : un héros ou un item retiré du catalogue ne doit plus faire échouer le message
     embed = discord.Embed(
         title="✅ Item déséquipé !",
-        description=f"{item.rarity.emoji} **{item.name}** déséquipé de {hero.rarity.emoji} **{hero.name}**",
+        description=f"{item_label(item_id)} déséquipé de {hero_label(hero_id)}",
         color=discord.Color.green()
     )
     await ctx.send(embed=embed)
 
-@bot.command(name='info')
-async def hero_details(ctx, *, hero_name: str):
-    """Affiche les détails d'un héros possédé par le joueur, en utilisant son nom"""
-    player = bot.get_player(ctx.author.id)
+@bot.command(name='autoequip')
+async def auto_equip(ctx, *, hero_name: str):
+    """Équipe automatiquement les meilleurs items : !autoequip <héros> ou !autoequip tout"""
+    changes = []
+    try:
+        async with bot.transaction(ctx.author.id) as tx:
+            player = tx.player
+            if normalize_name(hero_name) in ("tout", "all", "tous"):
+                hero_ids = [hero_id for hero_id in player.heroes if hero_id in bot.heroes_db]
+                tx.require(hero_ids, "❌ Vous ne possédez aucun héros.")
+            else:
+                hero_id = int(hero_name) if hero_name.isdigit() else bot.hero_names.resolve(hero_name)
+                tx.require(hero_id is not None and hero_id in player.heroes,
+                           "❌ Vous ne possédez pas ce héros (vérifie l'orthographe)." + did_you_mean(bot.hero_names, hero_name))
+                tx.require(hero_id in bot.heroes_db, "❌ Ce héros a été retiré du catalogue.")
+                hero_ids = [hero_id]
 
-    # Recherche d'un héros correspondant par nom (insensible à la casse)
-    hero_id = None
-    for pid in player.heroes:
-        hero = bot.heroes_db.get(pid)
-        if hero and hero.name.lower() == hero_name.lower():
-            hero_id = pid
-            break
+            heroes = [bot.heroes_db[hero_id] for hero_id in hero_ids]
+            current = {hero_id: list(player.heroes[hero_id].loadout) for hero_id in hero_ids}
+            solver = LoadoutSolver(heroes, bot.items_db)
+            loadouts = solver.solve(available_stock(player, set(hero_ids)), current)
 
-    if hero_id is None:
-        await ctx.send("❌ Vous ne possédez pas ce héros (vérifie l'orthographe).")
+            for hero in heroes:
+                instance = player.heroes[hero.id]
+                before = instance.puissance(hero, bot.items_db)
+                if loadouts[hero.id] != instance.loadout:
+                    instance.loadout[:] = loadouts[hero.id]
+                    instance.invalidate()
+                    changes.append((hero, before, instance.puissance(hero, bot.items_db)))
+    except TransactionError as e:
+        await ctx.send(str(e))
+        return
+
+    if not changes:
+        await ctx.send("✅ L'équipement est déjà optimal.")
+        return
+
+    embed = discord.Embed(title="⚙️ Équipement optimisé", color=discord.Color.green())
+    lines = [
+        f"{hero.rarity.emoji} **{hero.name}** : {before} → {after} ({after - before:+d})"
+        for hero, before, after in changes
+    ]
+    embed.description = "\n".join(lines[:25]) + (f"\n… et {len(lines) - 25} autre(s)" if len(lines) > 25 else "")
+    await ctx.send(embed=embed)
+
+@bot.command(name='combat')
+async def combat(ctx, adversaire: discord.User = None):
+    """Combat d'équipes : !combat @joueur (JcJ) ou !combat (contre une équipe du catalogue)"""
+    player = bot.get_player(ctx.author.id)
+    heroes, team = player_team(player, bot.heroes_db, bot.items_db)
+    if not heroes:
+        await ctx.send("❌ Vous n'avez aucun héros pour combattre.")
         return
 
+    if adversaire is not None:
+        if adversaire.id == ctx.author.id:
+            await ctx.send("❌ Vous ne pouvez pas vous combattre vous-même.")
+            return
+        opponent_heroes, opponent_team = player_team(bot.get_player(adversaire.id), bot.heroes_db, bot.items_db)
+        if not opponent_heroes:
+            await ctx.send(f"❌ {adversaire.display_name} n'a aucun héros pour combattre.")
+            return
+        opponent_name = adversaire.display_name
+    else:
+        # Équipe sauvage : autant de héros du catalogue, au niveau moyen de l'équipe du joueur
+        level = round(sum(player.heroes[hero.id].level.level for hero in heroes) / len(heroes))
+        opponent_heroes = random.sample(list(bot.heroes_db.values()), min(len(heroes), len(bot.heroes_db)))
+        opponent_team = catalog_team(opponent_heroes, level, bot.items_db)
+        opponent_name = f"Équipe sauvage (niveau {level})"
+
+    # Le premier combat du lot est celui qu'on raconte, l'ensemble donne les chances de victoire
+    results = await bot.run_battles(
+        np.repeat(team[None], COMBAT_SAMPLES, axis=0),
+        np.repeat(opponent_team[None], COMBAT_SAMPLES, axis=0)
+    )
+    winner = results.winners[0]
+    if winner == 0:
+        title, color = f"🏆 Victoire en {results.rounds[0]} tours !", discord.Color.green()
+    elif winner == 1:
+        title, color = f"💀 Défaite en {results.rounds[0]} tours", discord.Color.red()
+    else:
+        title, color = f"🤝 Égalité après {results.rounds[0]} tours", discord.Color.light_grey()
+
+    embed = discord.Embed(
+        title=f"⚔️ {title}",
+        description=f"**{ctx.author.display_name}** contre **{opponent_name}**",
+        color=color
+    )
+    for name, team_heroes, remaining in (
+        (ctx.author.display_name, heroes, results.remaining[0, 0]),
+        (opponent_name, opponent_heroes, results.remaining[0, 1]),
+    ):
+        lines = [f"{hero.rarity.emoji} {hero.name}" for hero in team_heroes]
+        embed.add_field(name=f"{name} — {remaining:.0%} PV", value="\n".join(lines), inline=True)
+    embed.add_field(
+        name="Chances de victoire",
+        value=f"{results.wins(0) / len(results):.1%} (nuls : {results.draws / len(results):.1%}) sur {len(results)} combats simulés",
+        inline=False
+    )
+    await ctx.send(embed=embed)
+
+def build_hero_embed(player: PlayerData, hero_id: int) -> discord.Embed:
+    """Fiche détaillée d'un héros possédé par le joueur"""
     hero = bot.heroes_db[hero_id]
 
-    # Gestion du niveau du héros
-    if hero_id not in player.hero_levels:
-        player.hero_levels[hero_id] = HeroLevel()
-    hero_level = player.hero_levels[hero_id]
+    # Niveau et équipement propres au joueur
+    instance = player.heroes[hero_id]
+    hero_level = instance.level
 
     try:
         couleur = int(hero.color.lstrip("#"), 16)
@@ -875,19 +4264,34 @@ async def hero_details(ctx, *, hero_name: str):
         inline=False
     )
     
-    embed.add_field(name="Items équipés", value=f"{len(hero.equipped_items)}/6", inline=True)
+    embed.add_field(name="Items équipés", value=f"{len(instance.equipped_items)}/{len(instance.loadout)}", inline=True)
 
-    puissance = hero.calculer_puissance(bot.items_db)
+    puissance = instance.puissance(hero, bot.items_db)
     embed.add_field(name="Puissance", value=f"{puissance} ⚡", inline=True)
 
-    if hero.equipped_items:
+    if instance.equipped_items:
         items_list = []
-        for item_id in hero.equipped_items:
-            item = bot.items_db[item_id]
-            items_list.append(f"{item.rarity.emoji} {item.name}")
+        slots = EQUIPMENT_SLOTS_BY_CLASS[hero.hero_class]
+        for slot_index, item_id in enumerate(instance.loadout):
+            if item_id is None:
+                continue
+            items_list.append(f"{slots[slot_index]} : {item_label(item_id, bold=False)}")
         embed.add_field(name="Équipement", value="\n".join(items_list), inline=False)
 
-    await ctx.send(embed=embed)
+    return embed
+
+@bot.command(name='info')
+async def hero_details(ctx, *, hero_name: str):
+    """Affiche les détails d'un héros possédé par le joueur, en utilisant son nom"""
+    player = bot.get_player(ctx.author.id)
+
+    # Recherche par nom normalisé (casse et accents ignorés)
+    hero_id = bot.hero_names.resolve(hero_name)
+    if hero_id is None or hero_id not in player.heroes:
+        await ctx.send("❌ Vous ne possédez pas ce héros (vérifie l'orthographe)." + did_you_mean(bot.hero_names, hero_name))
+        return
+
+    await ctx.send(embed=build_hero_embed(player, hero_id))
 
 class BoutiqueView(View):
     def __init__(self, user):
@@ -904,79 +4308,28 @@ class BoutiqueView(View):
         self.add_item(NavigationButton("🎁 Coffres", "coffres"))
         self.add_item(NavigationButton("🛡️ Items du jour", "items"))
 
-        if self.current_page == "heros" and len(bot.heroes_db) > 1:
+        if self.current_page == "heros" and len(bot.shop_pages.heroes) > 1:
             self.add_item(PaginationButton("⬅️", -1, "heros"))
             self.add_item(PaginationButton("➡️", 1, "heros"))
-        elif self.current_page == "coffres":
-            # Compter seulement les coffres non cachés
-            visible_chests = [chest for chest in bot.chests_db.values() if not chest.hidden]
-            if len(visible_chests) > 1:
-                self.add_item(PaginationButton("⬅️", -1, "coffres"))
-                self.add_item(PaginationButton("➡️", 1, "coffres"))
+        elif self.current_page == "coffres" and len(bot.shop_pages.chests) > 1:
+            # Seuls les coffres non cachés sont paginés
+            self.add_item(PaginationButton("⬅️", -1, "coffres"))
+            self.add_item(PaginationButton("➡️", 1, "coffres"))
 
     async def create_page_embed(self):
         if self.current_page == "heros":
-            heroes_list = list(bot.heroes_db.values())
-            if heroes_list:
-                self.hero_index = min(self.hero_index, len(heroes_list) - 1)
-                hero = heroes_list[self.hero_index]
-                
-                # Créez l'embed AVEC la couleur personnalisée du héros
-                embed = discord.Embed(
-                    title="🦸 Héros disponibles",
-                    color=get_color_from_hex(hero.color)
-                )
-                
-                embed.set_image(url=hero.image)
-                embed.add_field(name="Nom", value=hero.name, inline=True)
-                embed.add_field(name="Classe", value=hero.hero_class.value, inline=True)
-                embed.add_field(name="Prix", value=f"{hero.price} 🏅", inline=True)
-                embed.add_field(name="Rareté", value=f"{hero.rarity.emoji} {hero.rarity.display_name}", inline=True)
-                if hero.description:
-                    embed.add_field(name="Description", value=hero.description, inline=False)
-                embed.set_footer(text=f"Héros {self.hero_index + 1}/{len(heroes_list)}")
-            else:
-                embed = discord.Embed(
-                    title="🦸 Héros disponibles",
-                    description="Aucun héros disponible",
-                    color=discord.Color.red()
-                )
+            embed = bot.shop_pages.hero_embed(self.hero_index)
 
         elif self.current_page == "coffres":
-            # Filtrer les coffres non cachés
-            chests_list = [chest for chest in bot.chests_db.values() if not chest.hidden]
-            if chests_list:
-                self.chest_index = min(self.chest_index, len(chests_list) - 1)
-                chest = chests_list[self.chest_index]
-                
-                embed = discord.Embed(
-                    title="🎁 Coffres disponibles",
-                    color=get_color_from_hex(chest.color)
-                )
-                
-                embed.add_field(
-                    name=f"📦 {chest.name}",
-                    value=f"Prix: {chest.price} 🪙\n{chest.description}",
-                    inline=False
-                )
-                if hasattr(chest, 'image') and chest.image:
-                    embed.set_thumbnail(url=chest.image)
-                embed.set_footer(text=f"Coffre {self.chest_index + 1}/{len(chests_list)}")
-            else:
-                embed = discord.Embed(
-                    title="🎁 Coffres disponibles",
-                    description="Aucun coffre disponible",
-                    color=discord.Color.red()
-                )
+            embed = bot.shop_pages.chest_embed(self.chest_index)
 
         elif self.current_page == "items":
             embed = discord.Embed(
                 title="🛡️ Items du jour",
                 color=discord.Color.teal()
             )
-            maj_items_du_jour(bot)
-            if ITEMS_DU_JOUR:
-                for item in ITEMS_DU_JOUR:
+            if bot.daily_shop.items:
+                for item in bot.daily_shop.items:
                     stats_str = ", ".join([f"{k}: +{v}" for k, v in item.stats.items()])
                     embed.add_field(
                         name=f"{item.rarity.emoji} {item.name}",
@@ -1005,15 +4358,17 @@ class NavigationButton(Button):
         self.page = page
 
     async def callback(self, interaction: discord.Interaction):
-        if interaction.user != self.view.user:
+        # refresh_buttons() détache ce bouton de la vue : on garde une référence
+        view = self.view
+        if interaction.user != view.user:
             return await interaction.response.send_message("❌ Ce menu n'est pas pour toi.", ephemeral=True)
 
-        self.view.current_page = self.page
-        self.view.hero_index = 0
-        self.view.chest_index = 0
-        self.view.refresh_buttons()
-        embed = await self.view.create_page_embed()
-        await interaction.response.edit_message(embed=embed, view=self.view)
+        view.current_page = self.page
+        view.hero_index = 0
+        view.chest_index = 0
+        view.refresh_buttons()
+        embed = await view.create_page_embed()
+        await interaction.response.edit_message(embed=embed, view=view)
 
 class PaginationButton(Button):
     def __init__(self, emoji: str, direction: int, target_page: str):
@@ -1022,33 +4377,29 @@ class PaginationButton(Button):
         self.target_page = target_page
 
     async def callback(self, interaction: discord.Interaction):
-        if interaction.user != self.view.user:
+        # refresh_buttons() détache ce bouton de la vue : on garde une référence
+        view = self.view
+        if interaction.user != view.user:
             return await interaction.response.send_message("❌ Ce menu n'est pas pour toi.", ephemeral=True)
 
-        if self.target_page == "heros":
-            heroes_list = list(bot.heroes_db.values())
-            self.view.hero_index = (self.view.hero_index + self.direction) % len(heroes_list)
-        elif self.target_page == "coffres":
-            chests_list = list(bot.chests_db.values())
-            self.view.chest_index = (self.view.chest_index + self.direction) % len(chests_list)
+        pages = bot.shop_pages
+        if self.target_page == "heros" and pages.heroes:
+            view.hero_index = (view.hero_index + self.direction) % len(pages.heroes)
+        elif self.target_page == "coffres" and pages.chests:
+            view.chest_index = (view.chest_index + self.direction) % len(pages.chests)
 
-        self.view.refresh_buttons()
-        embed = await self.view.create_page_embed()
-        await interaction.response.edit_message(embed=embed, view=self.view)
+        view.refresh_buttons()
+        embed = await view.create_page_embed()
+        await interaction.response.edit_message(embed=embed, view=view)
 
-@bot.command(name="leaderboard")
-async def leaderboard(ctx):
-    ranking = []
-    for player in bot.players.values():
-        total_power = 0
-        for hero_id in player.heroes:
-            hero = bot.heroes_db.get(hero_id)
-            if hero:
-                total_power += hero.calculer_puissance(bot.items_db)
-        ranking.append((player.user_id, total_power))
+LEADERBOARD_PAGE_SIZE = 10
 
-    ranking.sort(key=lambda x: x[1], reverse=True)
-    top = ranking[:10]
+@bot.command(name="leaderboard")
+async def leaderboard(ctx, page: int = 1):
+    total_pages = max(1, -(-len(bot.leaderboard) // LEADERBOARD_PAGE_SIZE))
+    page = min(max(page, 1), total_pages)
+    offset = (page - 1) * LEADERBOARD_PAGE_SIZE
+    top = bot.leaderboard.page(offset, LEADERBOARD_PAGE_SIZE)
 
     embed = discord.Embed(
         title="🏆 Classement des joueurs par puissance 🏆",
@@ -1058,47 +4409,39 @@ async def leaderboard(ctx):
     if not top:
         embed.description = "Aucun joueur enregistré."
     else:
+        usernames = await bot.resolve_usernames([user_id for user_id, _ in top])
         desc = ""
-        for rank, (user_id, power) in enumerate(top, start=1):
-            user = await bot.fetch_user(user_id)
-            username = user.name if user else f"Joueur {user_id}"
-            desc += f"**{rank}. {username}** — {power} ⚡\n"
+        for rank, (user_id, power) in enumerate(top, start=offset + 1):
+            desc += f"**{rank}. {usernames[user_id]}** — {power} ⚡\n"
         embed.description = desc
+        embed.set_footer(text=f"Page {page}/{total_pages} — !leaderboard <page>")
 
     await ctx.send(embed=embed)
 
-@bot.command(name="daily")
-async def daily(ctx):
-    player = bot.get_player(ctx.author.id)
-    now = datetime.now(timezone.utc)
-
-    if player.last_daily_claim:
-        last_claim = datetime.fromisoformat(player.last_daily_claim)
-        if now - last_claim < timedelta(hours=24):
-            remaining = timedelta(hours=24) - (now - last_claim)
-            hours, remainder = divmod(remaining.seconds, 3600)
-            minutes = remainder // 60
-            # Formatage du temps restant sans afficher 0j
-            time_parts = []
-            if remaining.days > 0:
-                time_parts.append(f"{remaining.days}j")
-            if hours > 0:
-                time_parts.append(f"{hours}h")
-            if minutes > 0:
-                time_parts.append(f"{minutes}min")
-
-            time_str = " ".join(time_parts) if time_parts else "moins d'une minute"
-            await ctx.send(f"⏳ Tu dois encore attendre {time_str} avant de réclamer ton prochain coffre.")
-            return
+@bot.command(name="rank")
+async def rank(ctx, membre: discord.User = None):
+    """Affiche la position d'un joueur dans le classement de puissance"""
+    target = membre or ctx.author
+    position = bot.leaderboard.rank(target.id)
+    if position is None:
+        await ctx.send(f"❌ {target.display_name} n'est pas encore classé.")
+        return
 
-    chest_name = "Coffre Journalier"
-    chest = bot.chests_db.get(chest_name)
+    power = bot.leaderboard.power(target.id)
+    await ctx.send(f"🏆 **{target.display_name}** est **#{position}** sur {len(bot.leaderboard)} avec {power} ⚡")
 
-    if not chest:
-        await ctx.send("⚠️ Coffre journalier introuvable.")
+@bot.command(name="daily")
+async def daily(ctx):
+    try:
+        # Le verrou est tenu jusqu'à l'écriture de last_daily_claim : pas de double réclamation
+        async with bot.transaction(ctx.author.id) as tx:
+            chest, loot = claim_daily(tx)
+            items_db = bot.items_db  # Catalogue du tirage, gardé pour l'affichage après les attentes
+    except TransactionError as e:
+        await ctx.send(str(e))
         return
 
-    # Animation d'ouverture
+    # Affichage hors transaction : un envoi qui échoue ne reprend pas une récompense déjà acquise
     embed = discord.Embed(
         title="🎁 Récompense journalière !",
         description="🔓 Récupération de votre coffre quotidien...",
@@ -1109,15 +4452,6 @@ async def daily(ctx):
     message = await ctx.send(embed=embed)
     await asyncio.sleep(1.5)
 
-    # Générer et appliquer le loot
-    loot = bot.generate_loot(chest)
-    player.gold += loot.gold
-    player.emblems += loot.emblems
-    player.items.extend(loot.items)
-    player.last_daily_claim = now.isoformat()
-
-    bot.save_data()
-
     # Affichage des récompenses
     embed = discord.Embed(
         title="🎁 Coffre journalier ouvert !",
@@ -1135,7 +4469,7 @@ async def daily(ctx):
     if loot.items:
         items_text = []
         for item_id in loot.items:
-            item = bot.items_db[item_id]
+            item = items_db[item_id]
             items_text.append(f"{item.rarity.emoji} {item.name}")
         
         embed.add_field(
@@ -1147,13 +4481,234 @@ async def daily(ctx):
     embed.set_footer(text="Revenez demain pour votre prochaine récompense !")
     await message.edit(embed=embed)
 
+def claim_daily(tx: PlayerTransaction) -> tuple:
+    """Vérifie le délai puis applique le loot du coffre journalier ; renvoie (coffre, loot)"""
+    player = tx.player
+    now = datetime.now(timezone.utc)
+
+    if player.last_daily_claim:
+        last_claim = datetime.fromisoformat(player.last_daily_claim)
+        if now - last_claim < timedelta(hours=24):
+            remaining = timedelta(hours=24) - (now - last_claim)
+            hours, remainder = divmod(remaining.seconds, 3600)
+            minutes = remainder // 60
+            # Formatage du temps restant sans afficher 0j
+            time_parts = []
+            if remaining.days > 0:
+                time_parts.append(f"{remaining.days}j")
+            if hours > 0:
+                time_parts.append(f"{hours}h")
+            if minutes > 0:
+                time_parts.append(f"{minutes}min")
+
+            time_str = " ".join(time_parts) if time_parts else "moins d'une minute"
+            raise TransactionError(f"⏳ Tu dois encore attendre {time_str} avant de réclamer ton prochain coffre.")
+
+    chest_name = "Coffre Journalier"
+    chest = bot.chests_db.get(chest_name)
+
+    tx.require(chest is not None, "⚠️ Coffre journalier introuvable.")
+
+    # Générer et appliquer le loot
+    loot = bot.generate_loot(chest)
+    player.gold += loot.gold
+    player.emblems += loot.emblems
+    player.add_items(loot.items)
+    player.last_daily_claim = now.isoformat()
+    return chest, loot
+
 @bot.command(name="shop")
 async def shop(ctx):
-    maj_items_du_jour(bot)
+    bot.daily_shop.ensure_fresh(bot.items_db)
     view = BoutiqueView(ctx.author)
     embed = await view.create_page_embed()
     await ctx.send(embed=embed, view=view)
 
+@bot.command(name="persistance")
+@commands.is_owner()
+async def persistance_stats(ctx):
+    """Affiche l'état de la sauvegarde différée (réservé au propriétaire)"""
+    saver = bot.saver
+    embed = discord.Embed(
+        title="💾 Sauvegarde différée",
+        color=discord.Color.dark_grey()
+    )
+    embed.add_field(name="File d'attente", value=f"{saver.queue_depth} joueur(s) (max {saver.max_queue_depth})", inline=True)
+    embed.add_field(name="Écritures", value=f"{saver.flush_count} (erreurs: {saver.error_count})", inline=True)
+    embed.add_field(name="Dernier lot", value=f"{saver.last_batch_size} joueur(s)", inline=True)
+    embed.add_field(
+        name="Latence d'écriture",
+        value=f"Dernière: {saver.last_flush_ms:.1f} ms\nMoyenne: {saver.avg_flush_ms:.1f} ms\nMax: {saver.max_flush_ms:.1f} ms",
+        inline=False
+    )
+    players = bot.players
+    embed.add_field(
+        name="🧠 Profils en mémoire",
+        value=(
+            f"{len(players)}/{players.max_size} chargés sur {len(bot.leaderboard)} joueurs\n"
+            f"Taux de succès: {players.hit_rate:.1%} ({players.hits} / {players.misses} chargements)\n"
+            f"Évictions: {players.evictions}"
+        ),
+        inline=False
+    )
+    storage = bot.storage
+    if storage.records_events:
+        embed.add_field(
+            name="📜 Journal",
+            value=(
+                f"Événements écrits: {storage.appended_events} (n° {storage.seq})\n"
+                f"Depuis l'instantané: {storage.events_since_snapshot}/{storage.snapshot_every} "
+                f"({storage.snapshot_count} instantané(s))\n"
+                f"Rejeu au démarrage: {storage.replayed_events} événements en {storage.replay_ms:.0f} ms "
+                f"(erreurs: {storage.replay_errors})"
+            ),
+            inline=False
+        )
+    embed.set_footer(text=f"Intervalle: {saver.interval}s — écriture anticipée à {saver.max_pending} en attente")
+    await ctx.send(embed=embed)
+
+@bot.command(name="metrics")
+@commands.is_owner()
+async def metrics_stats(ctx):
+    """Latence des commandes, des sauvegardes et de la boucle (réservé au propriétaire)"""
+    metrics = bot.metrics
+    embed = discord.Embed(
+        title="📈 Métriques",
+        color=discord.Color.dark_grey()
+    )
+
+    by_total = sorted(metrics.commands.items(), key=lambda entry: entry[1].latency.sum, reverse=True)
+    lines = []
+    for (name, kind), stats in by_total[:15]:
+        latency = stats.latency
+        lines.append(
+            f"`{name}` ({kind}) ×{latency.count} — p50 {latency.quantile(0.5) * 1000:.0f} ms, "
+            f"p99 {latency.quantile(0.99) * 1000:.0f} ms, max {latency.max * 1000:.0f} ms"
+            + (f", ❌ {stats.errors}" if stats.errors else "")
+        )
+    embed.add_field(
+        name="⌛ Commandes (temps cumulé décroissant)",
+        value="\n".join(lines) or "Aucune commande exécutée",
+        inline=False
+    )
+
+    saves = [
+        f"{mode.capitalize()}: ×{histogram.count}, moyenne {histogram.mean * 1000:.1f} ms, max {histogram.max * 1000:.1f} ms"
+        for mode, histogram in sorted(metrics.saves.items())
+    ]
+    embed.add_field(name="💾 Sauvegardes", value="\n".join(saves) or "Aucune sauvegarde", inline=False)
+
+    lag = metrics.loop_lag
+    embed.add_field(
+        name="🔁 Retard de la boucle",
+        value=f"p50 {lag.quantile(0.5) * 1000:.1f} ms, p99 {lag.quantile(0.99) * 1000:.1f} ms, max {lag.max * 1000:.1f} ms",
+        inline=False
+    )
+    port = os.getenv("METRICS_PORT")
+    embed.set_footer(text=f"Export Prometheus: {'port ' + port if port else 'désactivé (METRICS_PORT)'}")
+    await ctx.send(embed=embed)
+
+@bot.command(name="recharger")
+@commands.is_owner()
+async def reload_catalog(ctx):
+    """Recharge héros, items et coffres depuis les fichiers JSON sans redémarrer (réservé au propriétaire)"""
+    previous = bot.catalog
+    try:
+        catalog = await bot.reload_catalog()
+    except CatalogError as e:
+        details = "\n".join(e.errors[:10])
+        if len(e.errors) > 10:
+            details += f"\n… et {len(e.errors) - 10} autre(s)"
+        await ctx.send(f"❌ Catalogue invalide, l'ancien reste en place ({len(e.errors)} erreur(s)) :\n```{details[:1800]}```")
+        return
+
+    embed = discord.Embed(title="🔄 Catalogue rechargé", color=discord.Color.green())
+    for label, old, new in (
+        ("Héros", previous.heroes, catalog.heroes),
+        ("Items", previous.items, catalog.items),
+        ("Coffres", previous.chests, catalog.chests),
+    ):
+        added = len(new.keys() - old.keys())
+        removed = old.keys() - new.keys()
+        value = f"{len(new)} (+{added}, -{len(removed)})"
+        if removed:
+            value += "\n⚠️ Retiré(s) : " + ", ".join(str(key) for key in sorted(removed, key=str)[:10])
+        embed.add_field(name=label, value=value, inline=True)
+    if catalog.warnings:
+        embed.add_field(name="Avertissements", value=f"{len(catalog.warnings)} (voir `python bot.py --compile-catalog --check`)", inline=False)
+    embed.set_footer(text=f"{len(bot.players)} profil(s) chargé(s) recalculé(s) ; les autres le seront à leur prochain chargement")
+    await ctx.send(embed=embed)
+
+@bot.command(name="xp")
+@commands.is_owner()
+async def experience_event(ctx, montant: int, *, heros: str = None):
+    """Événement d'XP : !xp <montant> [héros] donne l'XP à tous les joueurs, ou aux joueurs mentionnés (réservé au propriétaire)"""
+    if montant <= 0:
+        await ctx.send("❌ Le montant doit être positif.")
+        return
+
+    # Catalogue lu une fois : un rechargement pendant la distribution ne doit pas perdre le héros
+    catalog = bot.catalog
+    hero_id = None
+    if heros:
+        # Les mentions font partie du texte : on ne garde que le nom du héros
+        hero_name = " ".join(word for word in heros.split() if not word.startswith("<@"))
+        if hero_name:
+            hero_id = catalog.hero_names.resolve(hero_name)
+            if hero_id is None:
+                await ctx.send("❌ Héros introuvable." + did_you_mean(catalog.hero_names, hero_name))
+                return
+
+    mentions = [member.id for member in ctx.message.mentions]
+    user_ids = mentions or bot.leaderboard.user_ids()
+    start = time.perf_counter()
+    hero_count, level_ups = await bot.grant_experience(user_ids, montant, hero_id)
+    elapsed = time.perf_counter() - start
+
+    target = catalog.heroes[hero_id].name if hero_id is not None else "tous les héros"
+    embed = discord.Embed(
+        title="✨ Événement d'expérience",
+        description=(
+            f"+{montant} XP pour {target} de {len(user_ids)} joueur(s)\n"
+            f"{hero_count} héros concernés, {level_ups} niveau(x) gagné(s)"
+        ),
+        color=discord.Color.gold()
+    )
+    embed.set_footer(text=f"Distribué en {elapsed * 1000:.0f} ms")
+    await ctx.send(embed=embed)
+
+@bot.command(name="profilage")
+@commands.is_owner()
+async def profiling(ctx, mode: str = None, seuil_ms: int = None):
+    """Active/désactive le profilage des commandes lentes : !profilage on [seuil_ms] | off (réservé au propriétaire)"""
+    profiler = bot.profiler
+    if mode is not None:
+        mode = mode.lower()
+        if mode not in ("on", "off"):
+            await ctx.send("❌ Utilisation : `!profilage on [seuil_ms]` ou `!profilage off`")
+            return
+        profiler.enabled = mode == "on"
+        if seuil_ms is not None:
+            profiler.threshold = max(0, seuil_ms) / 1000
+
+    embed = discord.Embed(
+        title=f"🔬 Profilage {'activé' if profiler.enabled else 'désactivé'}",
+        description=(
+            f"Seuil: {profiler.threshold * 1000:.0f} ms — {profiler.captured} profil(s) lent(s) "
+            f"sur {profiler.profiled} invocation(s) profilée(s), {profiler.skipped} ignorée(s) (profil déjà en cours)"
+        ),
+        color=discord.Color.dark_grey()
+    )
+    for record in list(profiler.recent)[-5:][::-1]:
+        lines = [f"`{own * 1000:.1f} ms` {location}" for location, own, _ in record.top[:5]]
+        embed.add_field(
+            name=f"{record.command} — {record.seconds * 1000:.0f} ms ({record.at})",
+            value=(f"`{record.arguments[:100]}`\n" + "\n".join(lines))[:1024],
+            inline=False
+        )
+    embed.set_footer(text=f"Profils: {profiler.directory}/ ({profiler.keep} conservés) — journal: {profiler.log_path}")
+    await ctx.send(embed=embed)
+
 @bot.command(name='aide')
 async def help_command(ctx):
     """Affiche l'aide"""
@@ -1166,14 +4721,18 @@ async def help_command(ctx):
         "`!profil` - Affiche votre profil",
         "`!shop` - Affiche la boutique",
         "`!buy <item>` - Acheter un item/coffre/héros" 
-        "`!heros` - Affiche vos héros",
-        "`!items` - Affiche vos items",
+        "`!heros [rareté] [classe] [tri:niveau]` - Affiche vos héros",
+        "`!items [rareté] [classe] [emplacement] [tri:quantite]` - Affiche vos items",
         "`!equip <hero_id> <item_id>` - Équipe un item",
         "`!unequip <hero_id> <item_id>` - Déséquipe un item",
+        "`!autoequip <héros>` / `!autoequip tout` - Équipe automatiquement les meilleurs items",
+        "`!combat [@joueur]` - Combat d'équipes contre un joueur ou une équipe sauvage",
         "`!info <hero_id>` - Détails d'un héros",
         "`!open <nom du coffre>` - Ouvrir un coffre spécifique",
+        "`!open <nom du coffre> x<nombre>` / `!open tout` - Ouvrir plusieurs coffres d'un coup",
         "`!daily` - Récupérer son coffre journalier",
-        "`!leaderboard` - Consulter le classement des joueurs"
+        "`!leaderboard [page]` - Consulter le classement des joueurs",
+        "`!rank [@joueur]` - Voir sa position dans le classement"
         ]
     
     embed.add_field(
@@ -1186,5 +4745,12 @@ async def help_command(ctx):
 
 # Remplace 'YOUR_BOT_TOKEN' par ton token Discord
 if __name__ == "__main__":
-    token = os.getenv("DISCORD_TOKEN")
-    bot.run(token)
+    if len(sys.argv) > 1 and sys.argv[1] == "--import-json":
+        # Import unique : python bot.py --import-json [players.json]
+        json_path = sys.argv[2] if len(sys.argv) > 2 else PLAYERS_PATH
+        count = import_players_json(bot.storage, json_path)
+        bot.storage.close()
+        print(f"✅ {count} joueur(s) importé(s) depuis {json_path}")
+    else:
+        token = os.getenv("DISCORD_TOKEN")
+        bot.run(token)